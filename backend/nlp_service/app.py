@@ -1,24 +1,112 @@
 """spaCy microservice using FastAPI.
 
 Endpoints:
-- POST /parse  -> returns tokens, lemmas, ents, noun_chunks, sentences, deps, intent (rule-based)
-- POST /classify -> returns { intent, confidence } (placeholder rule-based classifier)
+- POST /parse  -> returns tokens, lemmas, ents, noun_chunks, sentences, deps, intent (rule-based);
+                  pass `fields` to get (and compute) only a subset; `?layout=columnar` and
+                  `Accept: application/msgpack` opt in to compact responses (see `response_format.py`)
+- POST /classify -> returns { intent, confidence } from the linear intent model or the trained textcat
+                    (rule-based fallback)
+- POST /parse/batch -> runs a list of texts through `nlp.pipe`; per-item results/errors in `/parse` shape
+- POST /query -> entities and intent; plus ranked `products` (candidate product ids) when the
+                 catalog index is enabled. `text` is the NFC-normalized input the entity
+                 offsets refer to
+- POST /query/batch -> batch variant of `/query`
+- POST /catalog/refresh -> apply catalog changes to the product index now
+- POST /parse/stream -> NDJSON in, NDJSON out; texts are processed in bounded chunks as they arrive
+- GET  /health -> model status plus result-cache hit/miss counters (`ok` is false if no model is loaded)
+- GET  /ready -> 200 once the model is loaded and warmed up, 503 before; startup timing breakdown
+- POST /reload -> load `SPACY_MODEL` again in the background and hot-swap it (`?wait=true` to block)
+- GET  /reload/status -> reload generation, load duration and last error
+- GET  /metrics -> Prometheus metrics (request counts/latency, queue depth, input lengths, errors, load times)
+- GET/POST /debug/profile -> per-stage (tokenizer / component / serialize) p50/p95/p99; toggle profiling
+- GET  /debug/cprofile -> cProfile snapshot of the pipeline hot loop over a sample workload
 
 Design notes:
-- spaCy operations are CPU-bound and blocking; to avoid blocking the event loop we run them in threadpool via `run_in_executor`.
+- spaCy operations are CPU-bound and blocking; to avoid blocking the event loop we run them in an
+  inference backend (see `backends.py`): a thread pool (`NLP_BACKEND=thread`, default) or a pool of
+  worker processes that each load `SPACY_MODEL` (`NLP_BACKEND=process`, sized by `NLP_WORKERS`);
+  the API process itself then only loads the tokenizer and vocab.
 - Endpoints validate input and return JSON with consistent shape.
 - Errors return 5xx with a helpful message.
-- For production, run with uvicorn/gunicorn and consider model preloading and worker sizing.
+- With `NLP_MICROBATCH=1`, concurrent single-text requests are coalesced into small `nlp.pipe`
+  batches (see `microbatch.py`), trading up to `NLP_MICROBATCH_MAX_WAIT_US` of latency for throughput.
+- Only the pipeline components needed for the requested fields run; `/query` and `/classify`
+  default to the lean `entities`/`intent` path.
+- Results are cached in-process (LRU + TTL, see `result_cache.py`) keyed by normalized text and
+  a fingerprint of the loaded model; the cache is cleared whenever the model is (re)loaded.
+  Texts are NFC-normalized before inference, so character offsets (`/parse` included) index
+  the NFC form of the input; `/query` returns that form as `text`.
+- Model (re)loads run off the event loop: the new pipeline is loaded and warmed in a thread, then
+  swapped in atomically. Requests already running keep the pipeline they started with.
+- `NLP_SERVE_FIELDS` limits the fields this instance serves; components none of them need are not
+  even loaded. Warm-up pushes `NLP_WARMUP_SIZE` texts from `training_data.py` through the batched and
+  single-text paths (and the backend) before `/ready` turns green, so load balancers and rolling
+  restarts never route users to a cold instance.
+- `/classify` serves from the distilled linear model (`intent_linear.npz` next to the spaCy model,
+  see `intent_linear.py`) when present: a few NumPy row lookups inline on the event loop, no spaCy
+  call. `NLP_CLASSIFY_BACKEND=textcat` forces the spaCy textcat, `linear` requires the linear model.
+- For production, run `python serve.py`: the pipeline is loaded once in a master process and
+  forked into N uvicorn workers that share its memory copy-on-write (see `serve.py`).
+- With `NLP_CATALOG_FIXTURE` or a database URL (`NLP_CATALOG_DSN`, default `DATABASE_URL`), the
+  service keeps an inverted index of active products (see `catalog_index.py`), refreshed
+  incrementally every `NLP_CATALOG_REFRESH_S` seconds, and `/query` ranks products for the
+  extracted PRODUCT / CATEGORY / CONDITION entities.
+- Entity/intent-only requests (`/query`, lean `/parse` fields) go through a confidence-gated
+  cascade first (see `cascade.py`): the rule layer in `query_rules.py` answers texts fully covered
+  by the training keyword lists and the price grammar ("laptops under 500"), and the intent rules
+  and the linear model answer "hi" / "help me" style texts above their tuned thresholds. Only the
+  rest runs the pipeline. Results carry `cascade: {tier, confidence}`; `/health` reports the
+  share per tier. `NLP_CASCADE=0` / `NLP_RULES_SHORTCIRCUIT=0` turn the cascade / rule layer off.
+- Concurrent single-text requests for the same normalized text and fields share one in-flight
+  inference (see `singleflight.py`); a caller that goes away does not cancel it for the others.
+  `NLP_SINGLEFLIGHT=0` turns this off.
+- Bounded-memory mode (see `recycler.py`): with `NLP_RECYCLE_DOCS`, `NLP_RECYCLE_STRINGS` or
+  `NLP_RECYCLE_RSS_MB` set, the pipeline is replaced by a fresh copy of the same model (from an
+  in-memory snapshot, or `SPACY_MODEL` with `NLP_RECYCLE_SOURCE=disk`) once it has processed that
+  many docs or its StringStore / the process RSS crosses the limit, so new token strings do not
+  grow memory forever. The swap works like a reload: requests already running finish on the old
+  pipeline, and the result cache stays valid. Process workers recycle their own pipelines between
+  batches. `/health` and `/metrics` report StringStore size, RSS and recycle events.
 """
 
-from fastapi import FastAPI, HTTPException, Request
+from fastapi import FastAPI, HTTPException, Request, Response
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-from typing import List, Dict, Any
-import spacy
+from typing import List, Dict, Any, Optional
 import asyncio
+import gc
+import json
 import logging
 import os
+import time
+
+import metrics
+from backends import create_backend
+from catalog_index import create_catalog_index
+from microbatch import MicroBatcher
+from profiling import StageProfiler, cprofile_snapshot
+from query_rules import QueryRules
+from procstats import rss_mb
+from recycler import RecyclePolicy, memory_usage, restore_snapshot, take_snapshot
+from cascade import Cascade, load_thresholds, DEFAULT_THRESHOLDS
+from inference import (
+    CLASSIFY_FIELDS,
+    PARSE_FIELDS,
+    QUERY_FIELDS,
+    guess_intent_from_text,
+    load_pipeline,
+    load_vocab,
+    pipeline_features,
+    resolve_fields,
+    run_pipeline,
+    warm_up,
+    warmup_texts,
+)
+from intent_linear import MODEL_FILENAME as INTENT_MODEL_FILENAME, LinearIntentModel
+from response_format import NotAcceptable, encode, negotiated, to_columnar
+from result_cache import ResultCache, model_fingerprint, normalize_text, normalize_for_classify
+from singleflight import SingleFlight
 
 
 # Setup logger
@@ -28,12 +116,24 @@ logger = logging.getLogger("nlp_service")
 
 class ParseRequest(BaseModel):
     text: str
+    fields: Optional[List[str]] = None
 
 
 class ClassifyRequest(BaseModel):
     text: str
 
 
+class ProfileRequest(BaseModel):
+    enabled: bool
+    reset: bool = False
+
+
+class BatchParseRequest(BaseModel):
+    texts: List[str]
+    batch_size: Optional[int] = None
+    fields: Optional[List[str]] = None
+
+
 app = FastAPI(title="spaCy NLP microservice")
 app.add_middleware(
     CORSMiddleware,
@@ -48,154 +148,717 @@ app.add_middleware(
 # but allow override via the `SPACY_MODEL` environment variable.
 SPACY_MODEL = os.environ.get("SPACY_MODEL", "models/best")
 nlp = None
+MODEL_FINGERPRINT = None
+
+# /classify backend: `auto` (linear model if present, else textcat), `linear` or `textcat`.
+CLASSIFY_BACKEND = os.environ.get("NLP_CLASSIFY_BACKEND", "auto")
+intent_model: Optional[LinearIntentModel] = None
+
+# Fields this instance serves (comma-separated, default all). Components none of them
+# need are excluded at load time.
+SERVE_FIELDS = resolve_fields(
+    [f.strip() for f in os.environ.get("NLP_SERVE_FIELDS", "").split(",") if f.strip()] or None
+)
+# Sample texts pushed through a freshly loaded pipeline before it serves traffic.
+WARMUP_SIZE = int(os.environ.get("NLP_WARMUP_SIZE", 64))
+
+# Result cache shared by /parse, /query and /classify (NLP_CACHE_MAX=0 disables it).
+result_cache = ResultCache(
+    max_size=int(os.environ.get("NLP_CACHE_MAX", 10000)),
+    ttl_seconds=float(os.environ.get("NLP_CACHE_TTL_S", 300)),
+)
+
+# Identical concurrent requests share one inference (NLP_SINGLEFLIGHT=0 disables it).
+singleflight = (
+    SingleFlight(on_collapse=metrics.SINGLEFLIGHT_COLLAPSED.inc)
+    if os.environ.get("NLP_SINGLEFLIGHT", "1").lower() in ("1", "true", "yes")
+    else None
+)
+
+# Batch endpoints: default `nlp.pipe` batch size and the largest accepted request.
+BATCH_SIZE = int(os.environ.get("NLP_BATCH_SIZE", 64))
+BATCH_MAX_TEXTS = int(os.environ.get("NLP_BATCH_MAX_TEXTS", 10000))
+
+# Streaming endpoint: texts per `nlp.pipe` chunk, and how many parsed-but-unprocessed
+# chunks may queue up behind the one being processed (bounds memory per stream).
+STREAM_CHUNK_SIZE = int(os.environ.get("NLP_STREAM_CHUNK_SIZE", 256))
+STREAM_WINDOW = int(os.environ.get("NLP_STREAM_WINDOW", 2))
+
+# Inference backend: `thread` (shared `nlp`, GIL-bound) or `process` (one pipeline per
+# worker process). NLP_WORKERS sizes the pool; unset means the executor default for
+# threads and one process per CPU for processes.
+NLP_BACKEND = os.environ.get("NLP_BACKEND", "thread")
+NLP_WORKERS = int(os.environ["NLP_WORKERS"]) if os.environ.get("NLP_WORKERS") else None
+
+# Bounded-memory mode (off unless a NLP_RECYCLE_* limit is set, see recycler.py). Process
+# workers get a copy of the policy and recycle their own pipelines.
+recycle_policy = RecyclePolicy.from_env()
+_pipeline_snapshot = None
+_recycle_task: Optional[asyncio.Task] = None
+
+inference_backend = create_backend(
+    NLP_BACKEND,
+    get_nlp=lambda: nlp,
+    workers=NLP_WORKERS,
+    start_method=os.environ.get("NLP_MP_START_METHOD", "spawn"),
+    fields=SERVE_FIELDS,
+    recycle_policy=recycle_policy,
+)
+# Only the thread backend serves from the API process' own `nlp`.
+RECYCLE_LOCAL = recycle_policy.enabled and inference_backend.kind == "thread"
+
+# Micro-batching of concurrent single-text requests (off by default).
+MICROBATCH_ENABLED = os.environ.get("NLP_MICROBATCH", "0").lower() in ("1", "true", "yes")
+microbatcher = (
+    MicroBatcher(
+        inference_backend.run,
+        max_batch_size=int(os.environ.get("NLP_MICROBATCH_MAX_SIZE", 32)),
+        max_wait_us=int(os.environ.get("NLP_MICROBATCH_MAX_WAIT_US", 2000)),
+    )
+    if MICROBATCH_ENABLED
+    else None
+)
+
+# Opt-in per-stage profiling (NLP_PROFILE=1, or toggle at runtime via POST /debug/profile).
+stage_profiler = StageProfiler(window=int(os.environ.get("NLP_PROFILE_WINDOW", 2000)))
+stage_profiler.enabled = os.environ.get("NLP_PROFILE", "0").lower() in ("1", "true", "yes")
+inference_backend.profiler = stage_profiler
+
+# Early-exit cascade for entity/intent-only requests (see cascade.py and query_rules.py).
+# NLP_CASCADE_THRESHOLDS (JSON) overrides the thresholds tuned into the model's cascade.json.
+query_rules = (
+    QueryRules() if os.environ.get("NLP_RULES_SHORTCIRCUIT", "1").lower() in ("1", "true", "yes") else None
+)
+CASCADE_THRESHOLDS = (
+    json.loads(os.environ["NLP_CASCADE_THRESHOLDS"]) if os.environ.get("NLP_CASCADE_THRESHOLDS") else None
+)
+cascade = (
+    Cascade(CASCADE_THRESHOLDS or DEFAULT_THRESHOLDS, query_rules)
+    if os.environ.get("NLP_CASCADE", "1").lower() in ("1", "true", "yes")
+    else None
+)
+
+# Product catalog index for /query (off unless a fixture or database is configured).
+CATALOG_REFRESH_S = float(os.environ.get("NLP_CATALOG_REFRESH_S", 60))
+CATALOG_TOP_K = int(os.environ.get("NLP_CATALOG_TOP_K", 20))
+try:
+    catalog_index = create_catalog_index(
+        dsn=os.environ.get("NLP_CATALOG_DSN") or os.environ.get("DATABASE_URL"),
+        fixture=os.environ.get("NLP_CATALOG_FIXTURE"),
+    )
+except RuntimeError as e:
+    logger.warning(f"Catalog index disabled: {e}")
+    catalog_index = None
+_catalog_task: Optional[asyncio.Task] = None
+
+metrics.bind_gauge(metrics.INFERENCE_IN_FLIGHT, lambda: inference_backend.stats()["in_flight"])
+metrics.bind_gauge(metrics.EXECUTOR_QUEUE_DEPTH, inference_backend.queue_depth)
+metrics.bind_gauge(metrics.CACHE_ENTRIES, lambda: result_cache.stats()["size"])
+metrics.bind_gauge(metrics.VOCAB_STRINGS, lambda: len(nlp.vocab.strings) if nlp is not None else 0)
+metrics.bind_gauge(metrics.PROCESS_RSS_MB, lambda: rss_mb() or 0)
+if singleflight is not None:
+    metrics.bind_gauge(metrics.SINGLEFLIGHT_IN_FLIGHT, lambda: singleflight.stats()["in_flight"])
+if catalog_index is not None:
+    metrics.bind_gauge(metrics.CATALOG_PRODUCTS, lambda: catalog_index.stats()["products"])
+
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        # Label by route template so label cardinality stays bounded.
+        route = request.scope.get("route")
+        endpoint = getattr(route, "path", "unmatched")
+        metrics.observe_request(endpoint, request.method, status, started)
+
+
+# Model (re)load bookkeeping, reported by /reload/status and /health.
+reload_status: Dict[str, Any] = {
+    "generation": 0,
+    "state": "idle",  # idle | loading | failed
+    "model": SPACY_MODEL,
+    "fingerprint": None,
+    "loaded_at": None,
+    "load_duration_s": None,
+    "last_error": None,
+    "timings": None,
+}
+# Readiness, reported by /ready. `ready` turns on after the startup warm-up or a later
+# successful (re)load, and off while the last load attempt has failed.
+readiness: Dict[str, Any] = {
+    "ready": False,
+    "started_at": time.time(),
+    "ready_at": None,
+    "timings": {},
+    "fingerprint": None,
+    "error": None,
+}
+_reload_lock = asyncio.Lock()
+_reload_task: Optional[asyncio.Task] = None
+
+
+def _load_pipeline(model_path: str):
+    """Load and warm a pipeline. Runs in a worker thread, never on the event loop.
+
+    Returns `(nlp, fingerprint, timings, snapshot)` with per-step durations in seconds.
+    `snapshot` is the freshly loaded pipeline for later recycles (None unless the API
+    process recycles from a snapshot). With the process backend only the workers run
+    the pipeline, so this process loads just the tokenizer and vocab.
+    """
+    started = time.perf_counter()
+    if inference_backend.kind == "process":
+        new_nlp = load_vocab(model_path, SERVE_FIELDS)
+        timings = {"load_s": round(time.perf_counter() - started, 4)}
+        return new_nlp, model_fingerprint(new_nlp, model_path), timings, None
+    new_nlp = load_pipeline(model_path, SERVE_FIELDS)
+    loaded = time.perf_counter()
+    snapshot = take_snapshot(new_nlp) if RECYCLE_LOCAL and recycle_policy.source == "snapshot" else None
+    step = time.perf_counter()
+    warm_up(new_nlp, SERVE_FIELDS, limit=WARMUP_SIZE, batch_size=BATCH_SIZE)
+    warmed = time.perf_counter()
+    timings = {"load_s": round(loaded - started, 4), "warmup_s": round(warmed - step, 4)}
+    if snapshot is not None:
+        timings["snapshot_s"] = round(step - loaded, 4)
+    return new_nlp, model_fingerprint(new_nlp, model_path), timings, snapshot
+
+
+def _load_intent_model(model_path: str) -> Optional[LinearIntentModel]:
+    """Load the linear intent model saved next to the spaCy model, if any."""
+    if CLASSIFY_BACKEND == "textcat":
+        return None
+    path = os.path.join(model_path, INTENT_MODEL_FILENAME)
+    if not os.path.exists(path):
+        if CLASSIFY_BACKEND == "linear":
+            raise FileNotFoundError(f"NLP_CLASSIFY_BACKEND=linear but {path} does not exist")
+        return None
+    return LinearIntentModel.load(path)
+
+
+async def reload_model(reload_backend: bool = True, trigger: str = "reload") -> Dict[str, Any]:
+    """Load `SPACY_MODEL` in the background and atomically swap it in.
+
+    The current pipeline keeps serving while the new one loads. The swap is a plain
+    rebinding of `nlp`, so requests that already picked up the old object finish on it.
+    Only one reload runs at a time; a failed reload leaves the old model in place.
+    """
+    async with _reload_lock:
+        loop = asyncio.get_running_loop()
+        reload_status["state"] = "loading"
+        started = time.perf_counter()
+        try:
+            new_nlp, fingerprint, timings, snapshot = await loop.run_in_executor(None, _load_pipeline, SPACY_MODEL)
+            step = time.perf_counter()
+            new_intent_model = await loop.run_in_executor(None, _load_intent_model, SPACY_MODEL)
+            timings["intent_model_s"] = round(time.perf_counter() - step, 4)
+            if reload_backend:
+                step = time.perf_counter()
+                await inference_backend.reload(SPACY_MODEL)
+                timings["backend_reload_s"] = round(time.perf_counter() - step, 4)
+        except Exception as e:
+            reload_status.update(state="failed", last_error=str(e))
+            metrics.observe_error("model_load", e)
+            _set_ready(False, error=str(e))
+            raise
+
+        _install_model(new_nlp, fingerprint, new_intent_model, timings, started, trigger, snapshot)
+        return dict(reload_status)
+
+
+def _install_model(new_nlp, fingerprint: str, new_intent_model: Optional[LinearIntentModel],
+                   timings: Dict[str, float], started: float, trigger: str, snapshot=None) -> None:
+    """Swap in a loaded pipeline and record the (re)load."""
+    global nlp, MODEL_FINGERPRINT, intent_model, _pipeline_snapshot
+    nlp = new_nlp
+    MODEL_FINGERPRINT = fingerprint
+    intent_model = new_intent_model
+    _pipeline_snapshot = snapshot
+    recycle_policy.reset()
+    if cascade is not None and CASCADE_THRESHOLDS is None:
+        cascade.thresholds = load_thresholds(SPACY_MODEL)
+    result_cache.clear()
+    reload_status.update(
+        generation=reload_status["generation"] + 1,
+        state="idle",
+        model=SPACY_MODEL,
+        fingerprint=fingerprint,
+        loaded_at=time.time(),
+        load_duration_s=round(time.perf_counter() - started, 3),
+        last_error=None,
+        timings=timings,
+    )
+    metrics.MODEL_LOAD_SECONDS.labels(trigger).observe(reload_status["load_duration_s"])
+    metrics.MODEL_GENERATION.set(reload_status["generation"])
+    # At startup `startup_event` marks the instance ready once the backend is warm too.
+    if trigger not in ("startup", "preload"):
+        _set_ready(True)
+
+
+def _set_ready(ready: bool, error: Optional[str] = None) -> None:
+    readiness.update(ready=ready, fingerprint=MODEL_FINGERPRINT if ready else readiness["fingerprint"], error=error)
+    if ready:
+        readiness["ready_at"] = time.time()
+    metrics.READY.set(1 if ready else 0)
+
+
+def preload_model() -> None:
+    """Load and warm `SPACY_MODEL` synchronously, outside any event loop.
+
+    Used by `serve.py` to load the pipeline once in the pre-fork master; workers forked
+    afterwards share its memory, and their `startup_event` keeps the preloaded pipeline.
+    """
+    started = time.perf_counter()
+    new_nlp, fingerprint, timings, snapshot = _load_pipeline(SPACY_MODEL)
+    step = time.perf_counter()
+    new_intent_model = _load_intent_model(SPACY_MODEL)
+    timings["intent_model_s"] = round(time.perf_counter() - step, 4)
+    _install_model(new_nlp, fingerprint, new_intent_model, timings, started, "preload", snapshot)
+
+
+def _fresh_pipeline() -> Any:
+    """A new copy of the serving model, warmed up. Runs in a worker thread."""
+    if _pipeline_snapshot is not None:
+        new_nlp = restore_snapshot(_pipeline_snapshot)
+        warm_up(new_nlp, SERVE_FIELDS, limit=WARMUP_SIZE, batch_size=BATCH_SIZE)
+        return new_nlp
+    new_nlp, fingerprint, _, _ = _load_pipeline(SPACY_MODEL)
+    if fingerprint != MODEL_FINGERPRINT:
+        raise RuntimeError(f"'{SPACY_MODEL}' changed on disk (fingerprint {fingerprint}); use /reload to switch models")
+    return new_nlp
+
+
+async def _recycle_pipeline(reason: str) -> None:
+    """Replace the pipeline with a fresh copy of the same model.
+
+    Swapped in like a reload, so requests that already picked up the old pipeline finish
+    on it. The model is unchanged, so `MODEL_FINGERPRINT` and the result cache stay valid.
+    A reload that wins the lock first makes the recycle unnecessary.
+    """
+    global nlp, _recycle_task
+    generation = reload_status["generation"]
+    try:
+        async with _reload_lock:
+            if reload_status["generation"] != generation:
+                return
+            started = time.perf_counter()
+            before = memory_usage(nlp)
+            new_nlp = await asyncio.to_thread(_fresh_pipeline)
+            nlp = new_nlp
+            await asyncio.to_thread(gc.collect)
+            event = recycle_policy.recycled(reason, before, memory_usage(new_nlp), time.perf_counter() - started)
+        _record_recycle(event)
+    except Exception as e:
+        logger.exception("Failed to recycle the spaCy pipeline; keeping the current one")
+        metrics.observe_error("recycle", e)
+    finally:
+        _recycle_task = None
+
+
+def _note_docs(count: int) -> None:
+    """Count docs run through the pipeline; with the thread backend, start a recycle of
+    the shared pipeline once a limit is crossed."""
+    global _recycle_task
+    metrics.PIPELINE_DOCS.inc(count)
+    if not RECYCLE_LOCAL:
+        return
+    recycle_policy.note(count)
+    if _recycle_task is not None or _reload_lock.locked():
+        return
+    reason = recycle_policy.due(nlp)
+    if reason is not None:
+        _recycle_task = asyncio.create_task(_recycle_pipeline(reason))
+
+
+def _record_recycle(event: Dict[str, Any]) -> None:
+    metrics.PIPELINE_RECYCLES.labels(event["reason"]).inc()
+    metrics.PIPELINE_RECYCLE_SECONDS.observe(event["duration_s"])
+    where = f"worker {event['worker']}" if "worker" in event else "API process"
+    logger.info(
+        f"Recycled the spaCy pipeline in {where} ({event['reason']} limit, {event['docs']} docs): "
+        f"strings {event['before']['strings']} -> {event['after']['strings']}, "
+        f"rss {event['before']['rss_mb']} -> {event['after']['rss_mb']} MB, {event['duration_s']}s"
+    )
+
+
+def recycle_stats() -> Dict[str, Any]:
+    """Bounded-memory mode for /health; process workers report their own recycles."""
+    if inference_backend.kind == "thread":
+        return recycle_policy.stats(nlp)
+    backend = inference_backend.stats()
+    stats = recycle_policy.stats()
+    del stats["docs_since_recycle"]
+    return {
+        **stats,
+        "recycles": sum(w["recycles"] for w in backend["per_worker"]),
+        "last_recycle": backend["last_recycle"],
+    }
+
+
+inference_backend.on_run = _note_docs
+if recycle_policy.enabled and not RECYCLE_LOCAL:
+    inference_backend.on_recycle = _record_recycle
+
+
+async def _reload_in_background():
+    try:
+        status = await reload_model()
+        logger.info(
+            f"spaCy model reloaded (generation {status['generation']}, fingerprint {status['fingerprint']}, "
+            f"{status['load_duration_s']}s)"
+        )
+    except Exception:
+        logger.exception("Failed to reload spaCy model")
+
+
+async def _warm_backend() -> None:
+    """Send one warm-up batch through the inference backend (executor threads / workers)."""
+    texts = warmup_texts(WARMUP_SIZE)
+    if texts:
+        await inference_backend.run(texts, SERVE_FIELDS, BATCH_SIZE, warmup=True)
+
+
+async def refresh_catalog() -> Dict[str, Any]:
+    """Apply catalog changes to the product index (in a thread: it queries the database)."""
+    started = time.perf_counter()
+    try:
+        stats = await asyncio.to_thread(catalog_index.refresh)
+        metrics.CATALOG_REFRESHES.labels("ok").inc()
+        return stats
+    except Exception:
+        metrics.CATALOG_REFRESHES.labels("failed").inc()
+        raise
+    finally:
+        metrics.CATALOG_REFRESH_SECONDS.observe(time.perf_counter() - started)
+
+
+async def _catalog_refresh_loop() -> None:
+    while True:
+        try:
+            stats = await refresh_catalog()
+            if stats["full"] or stats["changed"] or stats["removed"]:
+                logger.info(f"Catalog index refreshed: {stats}")
+        except Exception:
+            logger.exception("Catalog index refresh failed; keeping the current index")
+        await asyncio.sleep(CATALOG_REFRESH_S)
 
 
 @app.on_event("startup")
 async def startup_event():
-    global nlp
+    global nlp, _catalog_task
+    if catalog_index is not None:
+        _catalog_task = asyncio.create_task(_catalog_refresh_loop())
     try:
-        # Loading synchronously is acceptable at startup
-        logger.info(f"Loading spaCy model '{SPACY_MODEL}'...")
-        nlp = spacy.load(SPACY_MODEL)
-        logger.info("spaCy model loaded")
+        logger.info(f"Loading spaCy model '{SPACY_MODEL}' (fields {list(SERVE_FIELDS)})...")
+        started = time.perf_counter()
+        await inference_backend.start(SPACY_MODEL)
+        backend_start_s = time.perf_counter() - started
+        if nlp is None:
+            await reload_model(reload_backend=False, trigger="startup")
+        else:
+            logger.info(f"Using preloaded pipeline (fingerprint {MODEL_FINGERPRINT})")
+        step = time.perf_counter()
+        await _warm_backend()
+        timings = {
+            "backend_start_s": round(backend_start_s, 4),
+            **(reload_status["timings"] or {}),
+            "backend_warmup_s": round(time.perf_counter() - step, 4),
+            "total_s": round(time.perf_counter() - started, 4),
+        }
+        for stage, seconds in timings.items():
+            metrics.STARTUP_STAGE_SECONDS.labels(stage.rsplit("_s", 1)[0]).set(seconds)
+        readiness["timings"] = timings
+        _set_ready(True)
+        logger.info(
+            f"spaCy model loaded and warm (fingerprint {MODEL_FINGERPRINT}, backend {inference_backend.kind}, "
+            f"startup {timings})"
+        )
     except Exception as e:
         logger.exception("Failed to load spaCy model")
         # If model fails to load, we still start the server but endpoints will raise
         nlp = None
+        _set_ready(False, error=str(e))
 
 
-async def parse_text_sync(text: str) -> Dict[str, Any]:
-    """Run spaCy processing in a threadpool to avoid blocking the event loop.
+@app.on_event("shutdown")
+async def shutdown_event():
+    if _catalog_task is not None:
+        _catalog_task.cancel()
+    inference_backend.shutdown()
 
-    Returns a JSON-serializable dict with tokens, lemma_, ents, noun_chunks, deps, sentences.
+
+class NDJSONStreamingResponse(StreamingResponse):
+    """`StreamingResponse` that leaves `receive` to the body iterator.
+
+    The stock response listens for client disconnects on older ASGI servers, which
+    would swallow the request body chunks `/parse/stream` is still reading. Here
+    the request stream itself reports the disconnect.
     """
-    if nlp is None:
-        raise RuntimeError("spaCy model not loaded")
 
-    loop = asyncio.get_running_loop()
+    media_type = "application/x-ndjson"
 
-    def _process():
-        doc = nlp(text)
-        # tokens
-        tokens = [
-            {
-                "text": token.text,
-                "lemma": token.lemma_,
-                "pos": token.pos_,
-                "tag": token.tag_,
-                "dep": token.dep_,
-                "is_stop": token.is_stop,
-            }
-            for token in doc
-        ]
+    async def __call__(self, scope, receive, send) -> None:
+        await self.stream_response(send)
 
-        # entities
-        ents = [
-            {"text": ent.text, "label": ent.label_, "start_char": ent.start_char, "end_char": ent.end_char}
-            for ent in doc.ents
-        ]
 
-        # noun chunks (requires a parser or senter in the pipeline)
-        noun_chunks = []
-        if "parser" in nlp.pipe_names or "senter" in nlp.pipe_names:
-            try:
-                noun_chunks = [nc.text for nc in doc.noun_chunks]
-            except Exception:
-                noun_chunks = []
-
-        # sentences (requires parser or senter); fall back to the whole text
-        sentences = []
-        if "parser" in nlp.pipe_names or "senter" in nlp.pipe_names:
-            try:
-                sentences = [sent.text for sent in doc.sents]
-            except Exception:
-                sentences = [doc.text]
-        else:
-            sentences = [doc.text]
-
-        # dependency information (requires parser)
-        deps = []
-        if "parser" in nlp.pipe_names:
-            try:
-                deps = [
-                    {"token": token.text, "head": token.head.text, "dep": token.dep_}
-                    for token in doc
-                ]
-            except Exception:
-                deps = []
-
-        # If the loaded model includes a trained textcat, use its scores for intent.
-        # Otherwise, fall back to the rule-based guess.
-        if getattr(doc, "cats", None):
-            try:
-                best_label, best_score = max(doc.cats.items(), key=lambda kv: kv[1])
-                intent = {"name": best_label, "confidence": float(best_score)}
-            except Exception:
-                intent = guess_intent_from_text(text.lower())
+def _decode_stream_line(line: bytes) -> Dict[str, Any]:
+    """Parse one NDJSON input line: a JSON string, or an object with `text` (and optional `id`)."""
+    try:
+        value = json.loads(line)
+    except ValueError as e:
+        return {"text": "", "error": f"Invalid JSON: {e}"}
+    if isinstance(value, str):
+        return {"text": value}
+    if isinstance(value, dict) and isinstance(value.get("text"), str):
+        entry = {"text": value["text"]}
+        if "id" in value:
+            entry["id"] = value["id"]
+        return entry
+    return {"text": "", "error": "Each line must be a JSON string or an object with a 'text' field"}
+
+
+async def _read_stream_chunks(request: Request, queue: asyncio.Queue, chunk_size: int) -> None:
+    """Split the request body into chunks of decoded lines and feed them to `queue`.
+
+    `queue` is bounded, so reading pauses while the consumer is behind. Ends with a
+    `None` sentinel, or with the exception that stopped reading.
+    """
+    try:
+        buffer = b""
+        chunk: List[Dict[str, Any]] = []
+        async for data in request.stream():
+            buffer += data
+            *lines, buffer = buffer.split(b"\n")
+            for line in lines:
+                if line.strip():
+                    chunk.append(_decode_stream_line(line))
+                if len(chunk) >= chunk_size:
+                    await queue.put(chunk)
+                    chunk = []
+        if buffer.strip():
+            chunk.append(_decode_stream_line(buffer))
+        if chunk:
+            await queue.put(chunk)
+        await queue.put(None)
+    except Exception as e:
+        await queue.put(e)
+
+
+async def _stream_parse_results(request: Request, fields: tuple, chunk_size: int):
+    queue: asyncio.Queue = asyncio.Queue(maxsize=STREAM_WINDOW)
+    reader = asyncio.create_task(_read_stream_chunks(request, queue, chunk_size))
+    index = 0
+    try:
+        while True:
+            chunk = await queue.get()
+            if chunk is None:
+                break
+            if isinstance(chunk, Exception):
+                raise chunk
+            items = await parse_texts_sync(
+                [entry["text"] for entry in chunk], batch_size=chunk_size, fields=fields, use_cache=False
+            )
+            lines = []
+            for entry, item in zip(chunk, items):
+                if "error" in entry:
+                    item = {"ok": False, "error": entry["error"]}
+                    metrics.observe_error("/parse/stream", "InvalidLine")
+                out = {"index": index, **item}
+                if "id" in entry:
+                    out["id"] = entry["id"]
+                lines.append(json.dumps(out))
+                index += 1
+            yield "\n".join(lines) + "\n"
+    finally:
+        reader.cancel()
+
+
+def cascade_result(text: str, fields: tuple) -> Optional[Dict[str, Any]]:
+    """The requested fields from a cheap cascade tier, or None if the pipeline has to run."""
+    if cascade is None:
+        return None
+    result = cascade.answer(text, fields, intent_model)
+    if result is not None:
+        metrics.CASCADE_ANSWERS.labels(result["cascade"]["tier"]).inc()
+    return result
+
+
+def _from_model(result: Dict[str, Any], fields: tuple) -> Dict[str, Any]:
+    """Tag a freshly computed pipeline result with the cascade's model tier."""
+    if cascade is None or not cascade.eligible(fields):
+        return result
+    metrics.CASCADE_ANSWERS.labels("model").inc()
+    return cascade.record_model(result)
+
+
+def cache_get(key) -> Optional[Dict[str, Any]]:
+    """Look `key` up in the result cache, counting the hit or miss."""
+    if not result_cache.enabled:
+        return None
+    cached = result_cache.get(key)
+    (metrics.CACHE_MISSES if cached is None else metrics.CACHE_HITS).inc()
+    return cached
+
+
+async def parse_text_sync(text: str, fields: tuple = PARSE_FIELDS) -> Dict[str, Any]:
+    """Run spaCy processing in the inference backend to avoid blocking the event loop.
+
+    Returns a JSON-serializable dict with the requested `fields` (by default tokens,
+    entities, noun_chunks, sentences, deps and intent). Components that none of the
+    requested fields need are disabled for the call.
+    """
+    if nlp is None:
+        raise RuntimeError("spaCy model not loaded")
+
+    text = normalize_text(text)
+    metrics.observe_input(text)
+    early = cascade_result(text, fields)
+    if early is not None:
+        return early
+    key = ("parse", text, fields, MODEL_FINGERPRINT)
+    cached = cache_get(key)
+    if cached is not None:
+        return cached
+
+    async def compute() -> Dict[str, Any]:
+        if microbatcher is not None:
+            item = await microbatcher.submit(text, fields)
         else:
-            intent = guess_intent_from_text(text.lower())
-
-        return {
-            "tokens": tokens,
-            "entities": ents,
-            "noun_chunks": noun_chunks,
-            "sentences": sentences,
-            "deps": deps,
-            "intent": intent,
-        }
+            [item] = await inference_backend.run([text], fields, 1)
+        if not item["ok"]:
+            raise RuntimeError(item["error"])
+        result = _from_model(item["result"], fields)
+        result_cache.set(key, result)
+        return result
 
-    return await loop.run_in_executor(None, _process)
+    if singleflight is not None:
+        return await singleflight.do(key, compute)
+    return await compute()
 
 
-def guess_intent_from_text(text: str) -> Dict[str, Any]:
-    """A tiny rule-based intent detector as a placeholder.
+async def parse_texts_sync(
+    texts: List[str], batch_size: int = BATCH_SIZE, fields: tuple = PARSE_FIELDS, use_cache: bool = True
+) -> List[Dict[str, Any]]:
+    """Run a list of texts through `nlp.pipe` in the inference backend.
 
-    Replace this with a proper textcat classifier or an external model for production.
-    Returns {'name': str, 'confidence': float, 'action': optional_action}
+    Returns one item per input text, in order. Each item is either
+    `{"ok": True, "result": {...}}` (same `result` shape as `/parse`) or
+    `{"ok": False, "error": "..."}` so one bad text does not fail the whole batch.
+    Bulk callers pass `use_cache=False` so one-off texts do not evict hot entries.
     """
-    # Order matters: more specific checks first
-    if any(kw in text for kw in ["find", "search", "looking for", "show me", "do you have"]):
-        return {"name": "search_product", "confidence": 0.75, "action": "search"}
-    if any(kw in text for kw in ["price", "how much", "cost"]):
-        return {"name": "ask_price", "confidence": 0.7}
-    if any(kw in text for kw in ["hello", "hi", "hey"]):
-        return {"name": "greeting", "confidence": 0.9}
-    if any(kw in text for kw in ["order", "buy", "purchase"]):
-        return {"name": "purchase_intent", "confidence": 0.7, "action": "purchase"}
-    # fallback
-    return {"name": "unknown", "confidence": 0.5}
+    if nlp is None:
+        raise RuntimeError("spaCy model not loaded")
+
+    texts = [normalize_text(text) if text else text for text in texts]
+    fingerprint = MODEL_FINGERPRINT
+    items: List[Dict[str, Any]] = [None] * len(texts)
+    valid = []
+    for i, text in enumerate(texts):
+        if not text or not text.strip():
+            items[i] = {"ok": False, "error": "Empty text is not allowed"}
+            metrics.observe_error("batch_item", "EmptyText")
+            continue
+        metrics.observe_input(text)
+        early = cascade_result(text, fields)
+        if early is not None:
+            items[i] = {"ok": True, "result": early}
+            continue
+        cached = cache_get(("parse", text, fields, fingerprint)) if use_cache else None
+        if cached is not None:
+            items[i] = {"ok": True, "result": cached}
+        else:
+            valid.append(i)
+
+    if not valid:
+        return items
+
+    done = await inference_backend.run([texts[i] for i in valid], fields, batch_size)
+    for i, item in zip(valid, done):
+        if item["ok"]:
+            item = {"ok": True, "result": _from_model(item["result"], fields)}
+        else:
+            metrics.observe_error("batch_item", "InferenceError")
+        items[i] = item
+
+    for i in valid:
+        if use_cache and items[i]["ok"]:
+            result_cache.set(("parse", texts[i], fields, fingerprint), items[i]["result"])
+    return items
 
 
 @app.post("/reload")
-async def reload():
+async def reload(wait: bool = False):
     """Reload the spaCy model from `SPACY_MODEL`. Useful when swapping the `models/best` folder.
 
-    This endpoint intentionally reloads synchronously (at low frequency) because model
-    loading is CPU-bound and should be performed rarely.
+    The new pipeline is loaded and warmed off the event loop while the current one keeps
+    serving, then swapped in atomically. By default this returns immediately; poll
+    `/reload/status` for the outcome, or pass `?wait=true` to block until the swap.
     """
-    global nlp, SPACY_MODEL
+    global _reload_task
+    if wait:
+        try:
+            logger.info(f"Reloading spaCy model '{SPACY_MODEL}'...")
+            status = await reload_model()
+            logger.info(f"spaCy model reloaded (fingerprint {MODEL_FINGERPRINT})")
+            return {"ok": True, "model": SPACY_MODEL, "fingerprint": MODEL_FINGERPRINT, "status": status}
+        except Exception as e:
+            logger.exception("Failed to reload spaCy model")
+            raise HTTPException(status_code=500, detail=str(e))
+
+    if _reload_task is None or _reload_task.done():
+        logger.info(f"Reloading spaCy model '{SPACY_MODEL}' in the background...")
+        reload_status["state"] = "loading"
+        _reload_task = asyncio.create_task(_reload_in_background())
+        accepted = True
+    else:
+        accepted = False  # a reload is already running; it will pick up the same SPACY_MODEL
+    return {"ok": True, "accepted": accepted, "model": SPACY_MODEL, "status": dict(reload_status)}
+
+
+@app.get("/reload/status")
+async def reload_status_endpoint():
+    return {"ok": True, "status": dict(reload_status)}
+
+
+def _negotiate(request: Request, layout: Optional[str]) -> bool:
+    """Whether the client opted in to a columnar layout and/or MessagePack."""
     try:
-        logger.info(f"Reloading spaCy model '{SPACY_MODEL}'...")
-        nlp = spacy.load(SPACY_MODEL)
-        logger.info("spaCy model reloaded")
-        return {"ok": True, "model": SPACY_MODEL}
-    except Exception as e:
-        logger.exception("Failed to reload spaCy model")
-        raise HTTPException(status_code=500, detail=str(e))
+        return negotiated(request.headers.get("accept"), layout)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def _encode(request: Request, body: Dict[str, Any]) -> Response:
+    try:
+        return encode(body, request.headers.get("accept"))
+    except NotAcceptable as e:
+        raise HTTPException(status_code=406, detail=str(e))
 
 
 @app.post("/parse")
-async def parse(req: ParseRequest):
+async def parse(req: ParseRequest, request: Request, layout: Optional[str] = None):
     try:
+        opted_in = _negotiate(request, layout)
         if not req.text or not req.text.strip():
             raise HTTPException(status_code=400, detail="Empty text is not allowed")
 
-        result = await parse_text_sync(req.text)
+        try:
+            fields = resolve_fields(req.fields, SERVE_FIELDS)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+        result = await parse_text_sync(req.text, fields)
+        if opted_in:
+            return _encode(request, {"ok": True, "result": to_columnar(result) if layout == "columnar" else result})
         return {"ok": True, "result": result}
     except HTTPException:
         raise
     except Exception as e:
         logger.exception("/parse failed")
+        metrics.observe_error("/parse", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
@@ -205,20 +868,119 @@ async def classify(req: ClassifyRequest):
         if not req.text or not req.text.strip():
             raise HTTPException(status_code=400, detail="Empty text is not allowed")
 
-        # Placeholder classification using the same rule-based logic
-        intent = guess_intent_from_text(req.text.lower())
-        return {"ok": True, "intent": intent}
+        # The linear model is cheap enough to run inline. Otherwise only the textcat
+        # runs (via the lean `intent` field); without a model we fall back to the rules.
+        text = normalize_for_classify(req.text)
+        model = intent_model
+        if model is not None:
+            metrics.observe_input(text)
+            intent = model.classify(text)
+            tier = {"tier": "linear", "confidence": intent["confidence"]}
+        elif nlp is not None:
+            result = await parse_text_sync(text, CLASSIFY_FIELDS)
+            intent = result["intent"]
+            tier = result.get("cascade", {"tier": "model", "confidence": intent.get("confidence")})
+        else:
+            intent = guess_intent_from_text(text)
+            tier = {"tier": "rules", "confidence": intent["confidence"]}
+        return {"ok": True, "intent": intent, "cascade": tier}
     except HTTPException:
         raise
     except Exception as e:
         logger.exception("/classify failed")
+        metrics.observe_error("/classify", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get("/metrics")
+async def metrics_endpoint():
+    body, content_type = metrics.render()
+    return Response(content=body, media_type=content_type)
+
+
+@app.get("/debug/profile")
+async def get_profile():
+    """Per-stage timing breakdown collected while profiling is enabled."""
+    return {"ok": True, "profile": stage_profiler.summary()}
+
+
+@app.post("/debug/profile")
+async def set_profile(req: ProfileRequest):
+    stage_profiler.enabled = req.enabled
+    if req.reset:
+        stage_profiler.reset()
+    return {"ok": True, "profile": stage_profiler.summary()}
+
+
+@app.get("/debug/cprofile", response_class=PlainTextResponse)
+async def cprofile(n: int = 200, fields: Optional[str] = None, sort: str = "cumulative", limit: int = 40):
+    """Run `n` sample texts (from the training data) through the pipeline under cProfile.
+
+    Runs in this process even with the process backend (the code path is the same); the
+    API process then has no pipeline of its own, so a temporary one is loaded first.
+    """
+    if nlp is None:
+        raise HTTPException(status_code=503, detail="spaCy model not loaded")
+    if not 1 <= n <= 5000:
+        raise HTTPException(status_code=400, detail="n must be between 1 and 5000")
+    try:
+        resolved = resolve_fields(fields.split(",") if fields else None, SERVE_FIELDS)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    from training_data import TEXTCAT_TRAINING_DATA
+
+    samples = [text for text, _ in TEXTCAT_TRAINING_DATA]
+    texts = [samples[i % len(samples)] for i in range(n)]
+    loop = asyncio.get_running_loop()
+
+    def profile() -> str:
+        pipeline = load_pipeline(SPACY_MODEL, SERVE_FIELDS) if inference_backend.kind == "process" else nlp
+        return cprofile_snapshot(run_pipeline, pipeline, texts, resolved, BATCH_SIZE, sort=sort, limit=limit)
+
+    return await loop.run_in_executor(None, profile)
+
+
+@app.get("/ready")
+async def ready():
+    """Readiness probe: 200 once the model is loaded and warmed up, 503 until then.
+
+    Unlike `/health` (liveness), route traffic to an instance only when this is green.
+    A failed startup turns green after a successful `/reload`; a failed reload turns it
+    red (with the error) until the next successful one.
+    """
+    body = {
+        "ok": readiness["ready"] and nlp is not None,
+        "ready": readiness["ready"] and nlp is not None,
+        "model_fingerprint": readiness["fingerprint"],
+        "error": readiness["error"],
+        "uptime_s": round(time.time() - readiness["started_at"], 3),
+        "startup": readiness["timings"],
+    }
+    return JSONResponse(body, status_code=200 if body["ready"] else 503)
+
+
 @app.get("/health")
 async def health():
     # Basic healthcheck to ensure model loaded
-    return {"ok": True, "model_loaded": nlp is not None}
+    return {
+        "ok": nlp is not None,
+        "ready": readiness["ready"],
+        "model_loaded": nlp is not None,
+        "serve_fields": list(SERVE_FIELDS),
+        "model_fingerprint": MODEL_FINGERPRINT,
+        "model_generation": reload_status["generation"],
+        "classify_backend": "linear" if intent_model is not None else ("textcat" if nlp is not None else "rules"),
+        "reload_state": reload_status["state"],
+        "cache": result_cache.stats(),
+        "singleflight": {"enabled": True, **singleflight.stats()} if singleflight is not None else {"enabled": False},
+        "backend": inference_backend.stats(),
+        "microbatch": microbatcher.stats() if microbatcher is not None else {"enabled": False},
+        "rules": {"enabled": True, **query_rules.stats()} if query_rules is not None else {"enabled": False},
+        "cascade": {"enabled": True, **cascade.stats()} if cascade is not None else {"enabled": False},
+        "catalog": {"enabled": True, **catalog_index.stats()} if catalog_index is not None else {"enabled": False},
+        "recycle": recycle_stats(),
+    }
 
 
 @app.post("/query")
@@ -231,31 +993,152 @@ async def query(req: ParseRequest):
       "text": "...",
       "entities": [...],
       "intent": {name, confidence},
-      "features": {"has_parser": bool, "has_textcat": bool}
+      "features": {"has_parser": bool, "has_textcat": bool},
+      "cascade": {"tier": "rules" | "linear" | "model", "confidence": float},
+      "products": [{"product_id": int, "score": float}, ...]  # only with the catalog index
     }
     """
     try:
         if not req.text or not req.text.strip():
             raise HTTPException(status_code=400, detail="Empty text is not allowed")
 
-        result = await parse_text_sync(req.text)
+        # Entity offsets refer to the normalized text, so that is the text echoed back.
+        text = normalize_text(req.text)
+        result = await parse_text_sync(text, QUERY_FIELDS)
+        return build_query_response(text, result)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception("/query failed")
+        metrics.observe_error("/query", e)
+        raise HTTPException(status_code=500, detail=str(e))
 
-        features = {
-            "has_parser": bool(nlp and "parser" in nlp.pipe_names),
-            "has_textcat": bool(nlp and "textcat" in nlp.pipe_names),
-        }
 
-        return {
-            "ok": True,
-            "text": req.text,
-            "entities": result.get("entities", []),
-            "intent": result.get("intent", {}),
-            "features": features,
-        }
+def build_query_response(text: str, result: Dict[str, Any]) -> Dict[str, Any]:
+    """Project a full parse result down to the compact `/query` shape."""
+    response = {
+        "ok": True,
+        "text": text,
+        "entities": result.get("entities", []),
+        "intent": result.get("intent", {}),
+        "features": pipeline_features(nlp),
+    }
+    if "cascade" in result:
+        response["cascade"] = result["cascade"]
+    if catalog_index is not None:
+        response["products"] = catalog_index.search(response["entities"], CATALOG_TOP_K)
+    return response
+
+
+@app.post("/catalog/refresh")
+async def catalog_refresh():
+    """Apply catalog changes now instead of waiting for the next periodic refresh."""
+    if catalog_index is None:
+        raise HTTPException(status_code=404, detail="Catalog index is not enabled")
+    try:
+        stats = await refresh_catalog()
+        return {"ok": True, "refresh": stats, "catalog": catalog_index.stats()}
+    except Exception as e:
+        logger.exception("/catalog/refresh failed")
+        metrics.observe_error("/catalog/refresh", e)
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+def _validate_batch(req: BatchParseRequest) -> int:
+    """Check batch request limits and return the `nlp.pipe` batch size to use."""
+    if not req.texts:
+        raise HTTPException(status_code=400, detail="Empty batch is not allowed")
+    if len(req.texts) > BATCH_MAX_TEXTS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Batch of {len(req.texts)} texts exceeds the limit of {BATCH_MAX_TEXTS}",
+        )
+    if req.batch_size is None:
+        return BATCH_SIZE
+    if req.batch_size < 1:
+        raise HTTPException(status_code=422, detail="batch_size must be a positive integer")
+    return req.batch_size
+
+
+@app.post("/parse/batch")
+async def parse_batch(req: BatchParseRequest, request: Request, layout: Optional[str] = None):
+    """Parse many texts in one request using `nlp.pipe`.
+
+    Response shape:
+    {
+      "ok": True,
+      "count": N,
+      "errors": number of failed items,
+      "results": [{"ok": True, "result": {...}} | {"ok": False, "error": "..."}, ...]
+    }
+    Supports the same `layout` / `Accept` negotiation as `/parse`.
+    """
+    try:
+        opted_in = _negotiate(request, layout)
+        batch_size = _validate_batch(req)
+        try:
+            fields = resolve_fields(req.fields, SERVE_FIELDS)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+        items = await parse_texts_sync(req.texts, batch_size=batch_size, fields=fields)
+        errors = sum(1 for item in items if not item["ok"])
+        if opted_in:
+            if layout == "columnar":
+                items = [{"ok": True, "result": to_columnar(item["result"])} if item["ok"] else item for item in items]
+            return _encode(request, {"ok": True, "count": len(items), "errors": errors, "results": items})
+        return {"ok": True, "count": len(items), "errors": errors, "results": items}
     except HTTPException:
         raise
     except Exception as e:
-        logger.exception("/query failed")
+        logger.exception("/parse/batch failed")
+        metrics.observe_error("/parse/batch", e)
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/parse/stream")
+async def parse_stream(request: Request, fields: Optional[str] = None, chunk_size: Optional[int] = None):
+    """Parse newline-delimited JSON texts as they arrive and stream NDJSON results back.
+
+    Each input line is a JSON string or `{"text": "...", "id": ...}`. Texts are collected
+    into chunks of `chunk_size` (default `NLP_STREAM_CHUNK_SIZE`) and run through
+    `nlp.pipe`. At most `NLP_STREAM_WINDOW` chunks are buffered ahead of the one being
+    processed, so memory stays flat however large the upload is.
+
+    Each output line is `{"index": n, "ok": True, "result": {...}}` (same `result` shape
+    as `/parse`, plus `id` when given), or `{"index": n, "ok": False, "error": "..."}`.
+    Results come back in input order. Clients should read the response while uploading.
+    """
+    if nlp is None:
+        raise HTTPException(status_code=503, detail="spaCy model not loaded")
+    try:
+        resolved = resolve_fields(fields.split(",") if fields else None, SERVE_FIELDS)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    chunk_size = STREAM_CHUNK_SIZE if chunk_size is None else chunk_size
+    if not 1 <= chunk_size <= BATCH_MAX_TEXTS:
+        raise HTTPException(status_code=400, detail=f"chunk_size must be between 1 and {BATCH_MAX_TEXTS}")
+
+    return NDJSONStreamingResponse(_stream_parse_results(request, resolved, chunk_size))
+
+
+@app.post("/query/batch")
+async def query_batch(req: BatchParseRequest):
+    """Batch variant of `/query`; each successful item has the `/query` response shape."""
+    try:
+        batch_size = _validate_batch(req)
+        items = await parse_texts_sync(req.texts, batch_size=batch_size, fields=QUERY_FIELDS)
+        results = [
+            build_query_response(normalize_text(text), item["result"]) if item["ok"] else item
+            for text, item in zip(req.texts, items)
+        ]
+        errors = sum(1 for item in results if not item["ok"])
+        return {"ok": True, "count": len(results), "errors": errors, "results": results}
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception("/query/batch failed")
+        metrics.observe_error("/query/batch", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
@@ -0,0 +1,168 @@
+"""
+Synthetic training data from templates and the keyword lists in `training_data.py`.
+
+Templates like "find {condition} {product} under {price}" are filled with
+`PRODUCT_KEYWORDS`, `CATEGORY_KEYWORDS`, `CONDITION_KEYWORDS` and prices. Entity offsets are
+computed while the text is rendered, so they are always aligned, and every example
+also carries the template's intent as `cats`.
+
+Everything is a generator: examples are produced on demand, shuffled through a
+bounded buffer when read back from disk, and turned into `Example`s one minibatch
+at a time by `train_model.py --augment N`, so a corpus of millions of examples never
+has to fit in memory.
+
+Usage:
+    python augment.py --count 1000000 --output synthetic.jsonl   # export (streamed)
+    python augment.py --count 5                                  # preview
+    python train_model.py --augment 20000                        # mix into each epoch
+"""
+
+from string import Formatter
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+import argparse
+import json
+import random
+import sys
+
+from training_data import CATEGORY_KEYWORDS, CONDITION_KEYWORDS, PRODUCT_KEYWORDS, make_cats
+
+
+PRICE_VALUES = [5, 10, 15, 20, 25, 30, 40, 50, 60, 75, 80, 100, 120, 150, 200, 250, 300, 400, 500, 750, 1000]
+
+# Slot name -> entity label. Slots not listed here are filled but not annotated.
+SLOT_LABELS = {"product": "PRODUCT", "category": "CATEGORY", "price": "PRICE", "price2": "PRICE",
+               "condition": "CONDITION"}
+
+# (intent, template)
+TEMPLATES: List[Tuple[str, str]] = [
+    ("search_product", "find {product}"),
+    ("search_product", "find {product} under {price}"),
+    ("search_product", "show me {product} below {price} dollars"),
+    ("search_product", "looking for {condition} {product}"),
+    ("search_product", "looking for {product} in {category}"),
+    ("search_product", "I need a {condition} {product} under {price}"),
+    ("search_product", "do you have any {product}"),
+    ("search_product", "search for {product} in {category} above {price}"),
+    ("search_product", "cheap {product} less than {price}"),
+    ("search_product", "{category} between {price} and {price2}"),
+    ("search_product", "any {condition} {product} for around {price}"),
+    ("search_product", "browse {category}"),
+    ("search_product", "show me {category} under {price}"),
+    ("ask_price", "how much is the {product}"),
+    ("ask_price", "what is the price of the {condition} {product}"),
+    ("ask_price", "how much does a {product} cost"),
+    ("get_recommendations", "recommend a good {product}"),
+    ("get_recommendations", "what {product} do you suggest under {price}"),
+    ("get_recommendations", "best {category} for students"),
+]
+
+
+def render(template: str, values: Dict[str, Any]) -> Tuple[str, List[Tuple[int, int, str]]]:
+    """Fill `template` and return `(text, entities)` with character offsets."""
+    text, entities = "", []
+    for literal, field, _, _ in Formatter().parse(template):
+        text += literal
+        if field is None:
+            continue
+        value = str(values[field])
+        start = len(text)
+        text += value
+        if field in SLOT_LABELS:
+            entities.append((start, len(text), SLOT_LABELS[field]))
+    return text, entities
+
+
+def generate(count: Optional[int] = None, seed: int = 0,
+             templates: List[Tuple[str, str]] = TEMPLATES) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """Yield `count` synthetic examples (forever if `count` is None) in training-data format."""
+    rng = random.Random(seed)
+    produced = 0
+    while count is None or produced < count:
+        intent, template = rng.choice(templates)
+        low, high = sorted(rng.sample(PRICE_VALUES, 2))
+        text, entities = render(template, {
+            "product": rng.choice(PRODUCT_KEYWORDS),
+            "category": rng.choice(CATEGORY_KEYWORDS),
+            "condition": rng.choice(CONDITION_KEYWORDS),
+            "price": low,
+            "price2": high,
+        })
+        yield text, {"entities": entities, "cats": make_cats(intent)}
+        produced += 1
+
+
+def shuffle_buffer(items: Iterable, size: int = 10000, seed: int = 0) -> Iterator:
+    """Approximately shuffle a stream while holding at most `size` items."""
+    rng = random.Random(seed)
+    buffer = []
+    for item in items:
+        if len(buffer) < size:
+            buffer.append(item)
+            continue
+        index = rng.randrange(size)
+        yield buffer[index]
+        buffer[index] = item
+    rng.shuffle(buffer)
+    yield from buffer
+
+
+def mix(real: List, synthetic: Iterator, synthetic_count: int, seed: int = 0) -> Iterator:
+    """Uniformly interleave the (shuffled) `real` list with `synthetic_count` streamed items.
+
+    Each next item comes from either source with probability proportional to what is
+    left in it, which is a uniform random merge without materializing the stream.
+    """
+    rng = random.Random(seed)
+    real_left, synthetic_left = len(real), synthetic_count
+    real_iter = iter(real)
+    while real_left or synthetic_left:
+        if rng.randrange(real_left + synthetic_left) < real_left:
+            real_left -= 1
+            yield next(real_iter)
+        else:
+            synthetic_left -= 1
+            yield next(synthetic)
+
+
+def read_jsonl(path, repeat: bool = False) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """Stream examples back from a file written by `augment.py --output` (forever with `repeat`)."""
+    while True:
+        with open(path) as f:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    annotations = record["annotations"]
+                    annotations["entities"] = [tuple(ent) for ent in annotations.get("entities", [])]
+                    yield record["text"], annotations
+        if not repeat:
+            return
+
+
+def synthetic_stream(source: Optional[str] = None, seed: int = 0,
+                     buffer_size: int = 10000) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """Endless examples: freshly generated, or a JSONL export cycled through a shuffle buffer."""
+    if source:
+        return shuffle_buffer(read_jsonl(source, repeat=True), size=buffer_size, seed=seed)
+    return generate(None, seed=seed)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Generate synthetic Campus Shop training data")
+    parser.add_argument("--count", type=int, default=10, help="number of examples")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="JSONL file to write (default: print to stdout)")
+    args = parser.parse_args(argv)
+
+    out = open(args.output, "w") if args.output else sys.stdout
+    try:
+        for text, annotations in generate(args.count, seed=args.seed):
+            out.write(json.dumps({"text": text, "annotations": annotations}) + "\n")
+    finally:
+        if args.output:
+            out.close()
+            print(f"✅ Wrote {args.count} examples to {args.output}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,333 @@
+"""Inference backends: where `nlp.pipe` actually runs.
+
+- `thread`  (default): a thread pool sharing the API process' `nlp` object. Cheap and
+  simple, but the threads compete for the GIL so one API process stays near one core.
+- `process`: a pool of worker processes, each loading (and warming) `SPACY_MODEL` once at start.
+  Requests go to the worker with the fewest in-flight batches, and `/reload` reloads
+  every worker (one at a time, so the pool keeps serving) before the new model is live.
+  With a `recycler.RecyclePolicy`, a worker that crosses a limit is recycled (its
+  pipeline replaced with a fresh copy) right after returning the batch that crossed it,
+  drained like a reloading worker.
+
+Both backends expose the same coroutine API (`start`, `run`, `reload`, `stats`,
+`shutdown`), so `app.py` does not care which one is active. `run(..., warmup=True)`
+marks warm-up batches, which do not count towards the recycle limits.
+"""
+
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, List, Optional, Set
+import asyncio
+import gc
+import itertools
+import logging
+import multiprocessing
+import os
+import time
+
+from inference import PARSE_FIELDS, load_pipeline, run_pipeline, warm_up
+from recycler import RecyclePolicy, memory_usage, restore_snapshot, take_snapshot
+
+
+logger = logging.getLogger("nlp_service")
+
+
+class ThreadBackend:
+    """Run inference on the API process' own pipeline in a thread pool."""
+
+    kind = "thread"
+
+    def __init__(self, get_nlp: Callable[[], Any], max_workers: Optional[int] = None):
+        self._get_nlp = get_nlp
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="nlp")
+        self.in_flight = 0
+        # Optional `profiling.StageProfiler`; timings are collected while it is enabled.
+        self.profiler = None
+        # Optional callback with the number of docs each call processed.
+        self.on_run: Optional[Callable[[int], None]] = None
+
+    async def start(self, model_path: str) -> None:
+        # The API process loads the model itself; nothing to warm here.
+        return None
+
+    async def run(self, texts: List[str], fields: tuple, batch_size: int,
+                  warmup: bool = False) -> List[Dict[str, Any]]:
+        nlp = self._get_nlp()
+        if nlp is None:
+            raise RuntimeError("spaCy model not loaded")
+        loop = asyncio.get_running_loop()
+        timings = [] if self.profiler is not None and self.profiler.enabled else None
+        self.in_flight += 1
+        try:
+            items = await loop.run_in_executor(
+                self._executor, run_pipeline, nlp, texts, fields, batch_size, timings
+            )
+        finally:
+            self.in_flight -= 1
+        if timings:
+            self.profiler.record(timings)
+        if self.on_run is not None and not warmup:
+            self.on_run(len(texts))
+        return items
+
+    async def reload(self, model_path: str) -> None:
+        # The API process swaps its own `nlp`; the threads pick it up on the next call.
+        return None
+
+    def queue_depth(self) -> int:
+        """Calls submitted to the pool that no thread has picked up yet."""
+        return self._executor._work_queue.qsize()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "kind": self.kind,
+            "workers": self.max_workers,
+            "in_flight": self.in_flight,
+            "queue_depth": self.queue_depth(),
+        }
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False)
+
+
+# -----------------------------------------------------------------------------
+# Process backend. The worker-side functions must be importable at module level
+# so they can be pickled by `ProcessPoolExecutor`.
+# -----------------------------------------------------------------------------
+
+_worker_nlp = None
+_worker_fields: tuple = PARSE_FIELDS
+_worker_model_path: Optional[str] = None
+_worker_policy: Optional[RecyclePolicy] = None
+_worker_snapshot = None
+
+
+def _worker_init(model_path: str, fields: tuple = PARSE_FIELDS, policy: Optional[RecyclePolicy] = None) -> None:
+    global _worker_nlp, _worker_fields, _worker_model_path, _worker_policy, _worker_snapshot
+    _worker_fields = fields
+    _worker_model_path = model_path
+    new_nlp = load_pipeline(model_path, fields)
+    _worker_policy = policy if policy is not None and policy.enabled else None
+    _worker_snapshot = (
+        take_snapshot(new_nlp) if _worker_policy is not None and _worker_policy.source == "snapshot" else None
+    )
+    warm_up(new_nlp, fields)
+    if _worker_policy is not None:
+        _worker_policy.reset()
+    _worker_nlp = new_nlp
+
+
+def _worker_ping() -> int:
+    return os.getpid()
+
+
+def _worker_run(texts: List[str], fields: tuple, batch_size: int, profile: bool = False, count: bool = True):
+    """Returns `(items, timings, recycle_reason)`.
+
+    Timings are only collected when `profile` is set; `recycle_reason` is None unless
+    this batch pushed the worker's pipeline over a recycle limit (`count=False` batches
+    never do).
+    """
+    if _worker_nlp is None:
+        raise RuntimeError("spaCy model not loaded in worker")
+    timings = [] if profile else None
+    items = run_pipeline(_worker_nlp, texts, fields, batch_size, timings)
+    reason = None
+    if _worker_policy is not None and count:
+        _worker_policy.note(len(texts))
+        reason = _worker_policy.due(_worker_nlp)
+    return items, timings, reason
+
+
+def _worker_recycle(reason: str) -> Dict[str, Any]:
+    """Replace the worker's pipeline with a fresh copy. Runs as its own task."""
+    global _worker_nlp
+    started = time.perf_counter()
+    before = memory_usage(_worker_nlp)
+    if _worker_snapshot is not None:
+        new_nlp = restore_snapshot(_worker_snapshot)
+    else:
+        new_nlp = load_pipeline(_worker_model_path, _worker_fields)
+    warm_up(new_nlp, _worker_fields)
+    _worker_nlp = new_nlp
+    gc.collect()
+    return _worker_policy.recycled(reason, before, memory_usage(new_nlp), time.perf_counter() - started)
+
+
+def _worker_reload(model_path: str) -> int:
+    _worker_init(model_path, _worker_fields, _worker_policy)
+    return os.getpid()
+
+
+class _Worker:
+    """One single-process executor plus its in-flight counter."""
+
+    def __init__(self, index: int, model_path: str, mp_context, fields: tuple = PARSE_FIELDS,
+                 policy: Optional[RecyclePolicy] = None):
+        self.index = index
+        self.in_flight = 0
+        self.pid: Optional[int] = None
+        self.recycles = 0
+        self.recycling = False
+        self.executor = ProcessPoolExecutor(
+            max_workers=1, mp_context=mp_context, initializer=_worker_init, initargs=(model_path, fields, policy)
+        )
+
+
+class ProcessBackend:
+    """Run inference in a pool of worker processes, one pipeline per process."""
+
+    kind = "process"
+
+    def __init__(self, workers: int, start_method: str = "spawn", fields: tuple = PARSE_FIELDS,
+                 recycle_policy: Optional[RecyclePolicy] = None):
+        self.size = max(1, workers)
+        self.fields = fields
+        self.recycle_policy = recycle_policy
+        self._mp_context = multiprocessing.get_context(start_method)
+        self._workers: List[_Worker] = []
+        self._model_path: Optional[str] = None
+        # Tie-breaker so equally loaded workers are used round-robin.
+        self._rr = itertools.count()
+        # Optional `profiling.StageProfiler`; workers send their timings back with results.
+        self.profiler = None
+        # Optional callbacks: docs per call, and each recycle event a worker reports.
+        self.on_run: Optional[Callable[[int], None]] = None
+        self.on_recycle: Optional[Callable[[Dict[str, Any]], None]] = None
+        self.last_recycle: Optional[Dict[str, Any]] = None
+        # Running recycles; the event loop only keeps weak references to tasks.
+        self._recycle_tasks: Set[asyncio.Task] = set()
+
+    async def start(self, model_path: str) -> None:
+        """Spawn the workers and wait until each one has loaded the model."""
+        self._model_path = model_path
+        self._workers = [
+            _Worker(i, model_path, self._mp_context, self.fields, self.recycle_policy) for i in range(self.size)
+        ]
+        loop = asyncio.get_running_loop()
+        pids = await asyncio.gather(
+            *(loop.run_in_executor(w.executor, _worker_ping) for w in self._workers)
+        )
+        for worker, pid in zip(self._workers, pids):
+            worker.pid = pid
+        logger.info(f"Started {self.size} inference worker process(es): {pids}")
+
+    def _pick_worker(self) -> _Worker:
+        if not self._workers:
+            raise RuntimeError("Inference workers not started")
+        tick = next(self._rr)
+        return min(self._workers, key=lambda w: (w.in_flight, (w.index - tick) % self.size))
+
+    async def run(self, texts: List[str], fields: tuple, batch_size: int,
+                  warmup: bool = False) -> List[Dict[str, Any]]:
+        worker = self._pick_worker()
+        loop = asyncio.get_running_loop()
+        profile = self.profiler is not None and self.profiler.enabled
+        worker.in_flight += 1
+        try:
+            items, timings, reason = await loop.run_in_executor(
+                worker.executor, _worker_run, texts, fields, batch_size, profile, not warmup
+            )
+        except BrokenProcessPool:
+            # The worker died (OOM kill, segfault). Replace it so later requests succeed.
+            logger.error(f"Inference worker {worker.index} (pid {worker.pid}) died; restarting it")
+            self._restart_worker(worker)
+            raise RuntimeError("Inference worker crashed")
+        finally:
+            worker.in_flight -= 1
+        if timings:
+            self.profiler.record(timings)
+        if self.on_run is not None and not warmup:
+            self.on_run(len(texts))
+        # One worker at a time, so the rest of the pool keeps serving; a deferred
+        # worker is still over its limit and asks again after a later batch.
+        if reason is not None and not any(w.recycling for w in self._workers):
+            worker.recycling = True
+            task = asyncio.create_task(self._recycle_worker(worker, reason))
+            self._recycle_tasks.add(task)
+            task.add_done_callback(self._recycle_tasks.discard)
+        return items
+
+    async def _recycle_worker(self, worker: _Worker, reason: str) -> None:
+        """Recycle one worker's pipeline after the batch that triggered it has returned.
+
+        Like `reload`, the worker counts as busy meanwhile, so least-loaded routing
+        steers new batches to the rest of the pool.
+        """
+        loop = asyncio.get_running_loop()
+        worker.in_flight += 1
+        try:
+            event = await loop.run_in_executor(worker.executor, _worker_recycle, reason)
+        except Exception:
+            logger.exception(f"Failed to recycle the pipeline of inference worker {worker.index}")
+            return
+        finally:
+            worker.in_flight -= 1
+            worker.recycling = False
+        worker.recycles += 1
+        self.last_recycle = {"worker": worker.index, "pid": worker.pid, **event}
+        if self.on_recycle is not None:
+            self.on_recycle(self.last_recycle)
+
+    def _restart_worker(self, worker: _Worker) -> None:
+        worker.executor.shutdown(wait=False)
+        replacement = _Worker(worker.index, self._model_path, self._mp_context, self.fields, self.recycle_policy)
+        self._workers[worker.index] = replacement
+
+    async def reload(self, model_path: str) -> None:
+        """Reload the model in every worker and return once all of them are done.
+
+        Workers are reloaded one at a time so the rest of the pool keeps serving. The
+        reloading worker counts as busy, so least-loaded routing steers new batches
+        away from it, and since each worker runs its tasks in order the reload starts
+        only after the batches already queued on it have finished.
+        """
+        self._model_path = model_path
+        loop = asyncio.get_running_loop()
+        for worker in list(self._workers):
+            worker.in_flight += 1
+            try:
+                worker.pid = await loop.run_in_executor(worker.executor, _worker_reload, model_path)
+            finally:
+                worker.in_flight -= 1
+        logger.info(f"Reloaded '{model_path}' in {len(self._workers)} inference worker process(es)")
+
+    def queue_depth(self) -> int:
+        """Calls waiting behind another call on their worker (each runs one at a time)."""
+        return sum(max(0, w.in_flight - 1) for w in self._workers)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "kind": self.kind,
+            "workers": self.size,
+            "in_flight": sum(w.in_flight for w in self._workers),
+            "queue_depth": self.queue_depth(),
+            "per_worker": [
+                {"index": w.index, "pid": w.pid, "in_flight": w.in_flight, "recycles": w.recycles}
+                for w in self._workers
+            ],
+            "last_recycle": self.last_recycle,
+        }
+
+    def shutdown(self) -> None:
+        for worker in self._workers:
+            worker.executor.shutdown(wait=False, cancel_futures=True)
+
+
+def create_backend(kind: str, get_nlp: Callable[[], Any], workers: Optional[int] = None,
+                   start_method: str = "spawn", fields: tuple = PARSE_FIELDS,
+                   recycle_policy: Optional[RecyclePolicy] = None):
+    """Build the backend selected by `NLP_BACKEND` (`thread` or `process`).
+
+    `fields` are the served fields; process workers load only the components they need.
+    `recycle_policy` is copied into every process worker, which then recycles its own
+    pipeline; with threads the API process recycles the shared one (see `app.py`).
+    """
+    if kind == "thread":
+        return ThreadBackend(get_nlp, max_workers=workers)
+    if kind == "process":
+        return ProcessBackend(
+            workers or os.cpu_count() or 1, start_method=start_method, fields=fields, recycle_policy=recycle_policy
+        )
+    raise ValueError(f"Unknown inference backend '{kind}'; expected 'thread' or 'process'")
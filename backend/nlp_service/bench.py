@@ -0,0 +1,288 @@
+"""
+Load/benchmark harness for the NLP service.
+
+Builds a reproducible query mix from `training_data.py` (intent examples, NER
+examples and keyword-based synthetic queries), drives the service endpoints at a
+fixed concurrency and reports throughput, latency percentiles and RSS as JSON.
+
+Usage:
+    # In-process (imports app.py, no server needed; set SPACY_MODEL as usual)
+    python bench.py run --requests 2000 --concurrency 16 --output bench.json
+
+    # Against a running server (pass its pid to sample the server's RSS)
+    python bench.py run --target http://127.0.0.1:5001 --server-pid 12345
+
+    # Flag regressions against a stored baseline (non-zero exit on regression)
+    python bench.py compare bench_baseline.json bench.json --tolerance 0.10
+    python bench.py run --baseline bench_baseline.json
+
+Pass `--no-cache` with the in-process target to measure the model rather than the
+result cache.
+"""
+
+from pathlib import Path
+from typing import Any, Dict, List
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import sys
+import time
+
+from procstats import rss_mb
+from profiling import percentile
+from training_data import CATEGORY_KEYWORDS, NER_TRAINING_DATA, PRODUCT_KEYWORDS, TEXTCAT_TRAINING_DATA
+
+
+ENDPOINTS = ["parse", "query", "classify", "parse/batch", "query/batch"]
+BATCH_ENDPOINTS = {"parse/batch", "query/batch"}
+
+SYNTHETIC_TEMPLATES = [
+    "find {product}",
+    "show me {product} under {price}",
+    "looking for {product} below {price}",
+    "do you have {product} in {category}",
+    "how much is the {product}",
+    "cheap {product}",
+    "{category} under {price}",
+]
+
+
+def build_query_mix(size: int, seed: int = 0) -> List[str]:
+    """A reproducible mix of realistic queries.
+
+    Roughly half intent examples, a quarter NER examples and a quarter synthetic
+    keyword queries, shuffled with `seed`.
+    """
+    rng = random.Random(seed)
+    intent_texts = [text for text, _ in TEXTCAT_TRAINING_DATA]
+    ner_texts = [text for text, _ in NER_TRAINING_DATA]
+    texts = []
+    for i in range(size):
+        bucket = i % 4
+        if bucket in (0, 1):
+            texts.append(rng.choice(intent_texts))
+        elif bucket == 2:
+            texts.append(rng.choice(ner_texts))
+        else:
+            texts.append(
+                rng.choice(SYNTHETIC_TEMPLATES).format(
+                    product=rng.choice(PRODUCT_KEYWORDS),
+                    category=rng.choice(CATEGORY_KEYWORDS),
+                    price=rng.choice([10, 20, 30, 50, 100, 200, 500, 1000]),
+                )
+            )
+    rng.shuffle(texts)
+    return texts
+
+
+def summarize(latencies: List[float], errors: int, duration: float, texts: int) -> Dict[str, Any]:
+    values = sorted(latencies)
+    requests = len(values) + errors
+    return {
+        "requests": requests,
+        "errors": errors,
+        "texts": texts,
+        "duration_s": round(duration, 4),
+        "throughput_rps": round(requests / duration, 2) if duration else 0.0,
+        "texts_per_s": round(texts / duration, 2) if duration else 0.0,
+        "latency_ms": {
+            "mean": round(1000 * sum(values) / len(values), 3) if values else None,
+            "p50": round(1000 * percentile(values, 50), 3) if values else None,
+            "p95": round(1000 * percentile(values, 95), 3) if values else None,
+            "p99": round(1000 * percentile(values, 99), 3) if values else None,
+            "max": round(1000 * values[-1], 3) if values else None,
+        },
+    }
+
+
+async def drive(client, endpoint: str, texts: List[str], concurrency: int, batch_size: int) -> Dict[str, Any]:
+    """Send `texts` to one endpoint with at most `concurrency` requests in flight."""
+    if endpoint in BATCH_ENDPOINTS:
+        payloads = [{"texts": texts[i:i + batch_size]} for i in range(0, len(texts), batch_size)]
+    else:
+        payloads = [{"text": text} for text in texts]
+
+    queue: asyncio.Queue = asyncio.Queue()
+    for payload in payloads:
+        queue.put_nowait(payload)
+
+    latencies: List[float] = []
+    errors = 0
+
+    async def worker():
+        nonlocal errors
+        while True:
+            try:
+                payload = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            started = time.perf_counter()
+            try:
+                response = await client.post(f"/{endpoint}", json=payload)
+                ok = response.status_code == 200
+            except Exception:
+                ok = False
+            if ok:
+                latencies.append(time.perf_counter() - started)
+            else:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    duration = time.perf_counter() - started
+    return summarize(latencies, errors, duration, texts=len(texts))
+
+
+async def run_benchmark(args) -> Dict[str, Any]:
+    import httpx
+
+    texts = build_query_mix(args.requests, seed=args.seed)
+    warmup = build_query_mix(args.warmup, seed=args.seed + 1) if args.warmup else []
+    endpoints = args.endpoints.split(",")
+    unknown = sorted(set(endpoints) - set(ENDPOINTS))
+    if unknown:
+        raise SystemExit(f"Unknown endpoint(s) {unknown}; expected a subset of {ENDPOINTS}")
+
+    app_module = None
+    server_pid = args.server_pid
+    if args.target == "inprocess":
+        if args.no_cache:
+            os.environ["NLP_CACHE_MAX"] = "0"
+        import app as app_module
+
+        await app_module.startup_event()
+        if app_module.nlp is None:
+            raise SystemExit(f"Failed to load model '{app_module.SPACY_MODEL}'")
+        transport = httpx.ASGITransport(app=app_module.app)
+        client = httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=args.timeout)
+        server_pid = None  # same process
+    else:
+        client = httpx.AsyncClient(base_url=args.target, timeout=args.timeout)
+
+    rss_start = rss_mb(server_pid)
+    rss_peak = rss_start or 0.0
+    results = {}
+    try:
+        async with client:
+            for endpoint in endpoints:
+                if warmup:
+                    await drive(client, endpoint, warmup, args.concurrency, args.batch_size)
+                results[endpoint] = await drive(client, endpoint, texts, args.concurrency, args.batch_size)
+                rss_peak = max(rss_peak, rss_mb(server_pid) or 0.0)
+                print(
+                    f"  /{endpoint:<12} {results[endpoint]['texts_per_s']:>10.1f} texts/s  "
+                    f"p50 {results[endpoint]['latency_ms']['p50']} ms  "
+                    f"p99 {results[endpoint]['latency_ms']['p99']} ms  "
+                    f"errors {results[endpoint]['errors']}",
+                    file=sys.stderr,
+                )
+    finally:
+        if app_module is not None:
+            await app_module.shutdown_event()
+
+    return {
+        "meta": {
+            "timestamp": time.time(),
+            "target": args.target,
+            "model": os.environ.get("SPACY_MODEL", "models/best"),
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "batch_size": args.batch_size,
+            "seed": args.seed,
+            "cache": not args.no_cache,
+            "python": platform.python_version(),
+            "cpu_count": os.cpu_count(),
+        },
+        "results": results,
+        "rss_mb": {
+            "start": round(rss_start, 1) if rss_start else None,
+            "end": round(rss_mb(server_pid) or 0.0, 1) or None,
+            "peak": round(rss_peak, 1) or None,
+        },
+    }
+
+
+def compare_reports(baseline: Dict[str, Any], current: Dict[str, Any], tolerance: float) -> List[str]:
+    """Return human-readable regressions of `current` against `baseline`.
+
+    Throughput may not drop, and p95/p99 latency may not rise, by more than `tolerance`
+    (a fraction, e.g. 0.10 for 10%).
+    """
+    regressions = []
+    for endpoint, base in baseline.get("results", {}).items():
+        cur = current.get("results", {}).get(endpoint)
+        if cur is None:
+            continue
+        if base["texts_per_s"] and cur["texts_per_s"] < base["texts_per_s"] * (1 - tolerance):
+            regressions.append(
+                f"/{endpoint}: throughput {cur['texts_per_s']} texts/s < baseline {base['texts_per_s']}"
+            )
+        for pct in ("p95", "p99"):
+            b, c = base["latency_ms"].get(pct), cur["latency_ms"].get(pct)
+            if b and c and c > b * (1 + tolerance):
+                regressions.append(f"/{endpoint}: {pct} latency {c} ms > baseline {b} ms")
+        if cur["errors"] > base["errors"]:
+            regressions.append(f"/{endpoint}: {cur['errors']} errors (baseline {base['errors']})")
+    return regressions
+
+
+def print_regressions(regressions: List[str], tolerance: float) -> int:
+    if regressions:
+        print(f"❌ {len(regressions)} regression(s) beyond {tolerance:.0%}:")
+        for line in regressions:
+            print(f"  - {line}")
+        return 1
+    print(f"✅ No regressions beyond {tolerance:.0%}")
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the Campus Shop NLP service")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run = sub.add_parser("run", help="run the benchmark and write a JSON report")
+    run.add_argument("--target", default="inprocess", help="'inprocess' or a base URL like http://127.0.0.1:5001")
+    run.add_argument("--endpoints", default="parse,query,classify,parse/batch,query/batch")
+    run.add_argument("--requests", type=int, default=1000, help="texts sent to each endpoint")
+    run.add_argument("--concurrency", type=int, default=16)
+    run.add_argument("--batch-size", type=int, default=32, help="texts per request for batch endpoints")
+    run.add_argument("--warmup", type=int, default=50, help="texts sent per endpoint before measuring")
+    run.add_argument("--seed", type=int, default=0)
+    run.add_argument("--timeout", type=float, default=30.0)
+    run.add_argument("--no-cache", action="store_true", help="disable the result cache (in-process only)")
+    run.add_argument("--server-pid", type=int, help="pid of the server process, to report its RSS")
+    run.add_argument("--output", help="write the JSON report here (default: stdout)")
+    run.add_argument("--baseline", help="compare against this report after running")
+    run.add_argument("--tolerance", type=float, default=0.10)
+
+    cmp = sub.add_parser("compare", help="compare two reports and flag regressions")
+    cmp.add_argument("baseline")
+    cmp.add_argument("current")
+    cmp.add_argument("--tolerance", type=float, default=0.10)
+
+    args = parser.parse_args(argv)
+
+    if args.command == "compare":
+        baseline = json.loads(Path(args.baseline).read_text())
+        current = json.loads(Path(args.current).read_text())
+        return print_regressions(compare_reports(baseline, current, args.tolerance), args.tolerance)
+
+    report = asyncio.run(run_benchmark(args))
+    body = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(body + "\n")
+        print(f"Report written to {args.output}", file=sys.stderr)
+    else:
+        print(body)
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text())
+        return print_regressions(compare_reports(baseline, report, args.tolerance), args.tolerance)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,166 @@
+"""Confidence-gated cascade in front of the spaCy pipeline.
+
+Entity/intent-only requests (`/query`, lean `/parse` fields, the textcat path of
+`/classify`) try cheap tiers first and only run the pipeline when none of them is
+confident enough:
+
+1. rules: a text fully covered by `query_rules.py` ("laptops under 500") is answered
+   with its entities; otherwise the keyword intent rules of `intent_rules.py` vote.
+2. linear: the distilled `intent_linear.npz` model, when the loaded model has one.
+3. model: the full pipeline.
+
+Tiers 1 and 2 only produce an intent, so a request that asks for entities exits
+early only for intents that never carry entities (`ENTITYLESS_INTENTS`: "hi",
+"help me"). Those exits are skipped whenever the text also mentions a product /
+category / condition keyword or matches a second intent rule ("hi, I need a used
+calculator", "hello, where is my order"): the model decides mixed messages.
+Thresholds are per tier and per predicted intent; an intent without a threshold
+never exits at that tier.
+
+Thresholds come from `NLP_CASCADE_THRESHOLDS` (JSON) when set, else from `cascade.json`
+next to the model (written by `python evaluate.py <model> --tune-cascade`, which picks
+for every tier and intent the lowest confidence that loses no accuracy against the
+full model on the evaluation data). Without either only tier 1's fully covered
+queries exit early (`DEFAULT_THRESHOLDS` is empty).
+"""
+
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import json
+import math
+
+from intent_rules import default_engine
+from query_rules import QueryRules
+
+
+FILENAME = "cascade.json"
+TIERS = ("rules", "linear")
+ENTITYLESS_INTENTS = frozenset({"greeting", "help"})
+CASCADE_FIELDS = {"entities", "intent"}
+# Untuned thresholds are guesses, so no intent exits early until cascade.json exists.
+DEFAULT_THRESHOLDS: Dict[str, Dict[str, float]] = {}
+
+
+def load_thresholds(model_path, fallback: Optional[Dict[str, Dict[str, float]]] = None) -> Dict[str, Dict[str, float]]:
+    """Thresholds from `<model_path>/cascade.json`, or `fallback` (default `DEFAULT_THRESHOLDS`)."""
+    path = Path(model_path) / FILENAME
+    if path.exists():
+        return json.loads(path.read_text())["thresholds"]
+    return fallback if fallback is not None else DEFAULT_THRESHOLDS
+
+
+class Cascade:
+    """Answers entity/intent requests from the cheap tiers when they are confident enough."""
+
+    def __init__(self, thresholds: Dict[str, Dict[str, float]], query_rules=None,
+                 entityless: frozenset = ENTITYLESS_INTENTS):
+        self.thresholds = thresholds
+        self.query_rules = query_rules
+        # Keyword lookup for `_mixed`, even when the rule layer itself is off.
+        self.keywords = query_rules if query_rules is not None else QueryRules()
+        self.entityless = entityless
+        self.answered = {tier: 0 for tier in ("rules", "linear", "model")}
+
+    def eligible(self, fields: tuple) -> bool:
+        return set(fields) <= CASCADE_FIELDS
+
+    def answer(self, text: str, fields: tuple, intent_model=None) -> Optional[Dict[str, Any]]:
+        """The requested `fields` plus `cascade: {tier, confidence}`, or None to run the model."""
+        if not self.eligible(fields):
+            return None
+        if self.query_rules is not None:
+            match = self.query_rules.match(text)
+            if match is not None:
+                return self._result(fields, match["entities"], match["intent"], "rules")
+
+        tiers: List[Tuple[str, Optional[Callable[[str], Dict[str, Any]]]]] = [
+            ("rules", default_engine().classify),
+            ("linear", intent_model.classify if intent_model is not None else None),
+        ]
+        for tier, classify in tiers:
+            if classify is None or not self.thresholds.get(tier):
+                continue
+            intent = classify(text)
+            threshold = self.thresholds[tier].get(intent["name"])
+            if threshold is None or intent["confidence"] < threshold:
+                continue
+            if intent["name"] in self.entityless:
+                if self._mixed(text):
+                    continue
+            elif "entities" in fields:
+                continue
+            return self._result(fields, [], intent, tier)
+        return None
+
+    def _mixed(self, text: str) -> bool:
+        """True if a "hi" / "help" style text also asks for something else."""
+        return self.keywords.mentions_keyword(text) or len(default_engine().match_all(text)) > 1
+
+    def _result(self, fields: tuple, entities, intent: Dict[str, Any], tier: str) -> Dict[str, Any]:
+        self.answered[tier] += 1
+        result = {field: entities if field == "entities" else intent for field in fields}
+        result["cascade"] = {"tier": tier, "confidence": intent["confidence"]}
+        return result
+
+    def record_model(self, result: Dict[str, Any]) -> Dict[str, Any]:
+        """Tag a pipeline result as answered by the model tier."""
+        self.answered["model"] += 1
+        confidence = result.get("intent", {}).get("confidence")
+        return {**result, "cascade": {"tier": "model", "confidence": confidence}}
+
+    def stats(self) -> Dict[str, Any]:
+        total = sum(self.answered.values())
+        return {
+            "thresholds": self.thresholds,
+            "answered": dict(self.answered),
+            "early_exit_share": round(1 - self.answered["model"] / total, 4) if total else 0.0,
+        }
+
+
+def tune_thresholds(records: List[Dict[str, Any]], tiers=TIERS,
+                    entityless: frozenset = ENTITYLESS_INTENTS) -> Dict[str, Dict[str, float]]:
+    """Per tier and intent, the lowest confidence at which exiting loses no accuracy.
+
+    Each record has `gold` (intent or None), `has_entities` (bool or None), `model_correct`
+    (bool or None) and `{tier: {"name", "confidence"}}` for every tier. Tiers are tuned in
+    order on the records the earlier tiers did not already take. An exit is wrong if the
+    intent is wrong or, for an entityless intent, the text has entities or `has_entities`
+    is unknown; for a threshold to be accepted, the exits above it must make no more mistakes than the full
+    model makes on the same records.
+    """
+    thresholds: Dict[str, Dict[str, float]] = {}
+    remaining = list(records)
+    for tier in tiers:
+        chosen: Dict[str, float] = {}
+        by_intent: Dict[str, List[Dict[str, Any]]] = {}
+        for record in remaining:
+            if record.get(tier):
+                by_intent.setdefault(record[tier]["name"], []).append(record)
+        for intent, group in by_intent.items():
+            group.sort(key=lambda r: -r[tier]["confidence"])
+            exit_errors = model_errors = 0
+            best = None
+            for i, record in enumerate(group):
+                exit_errors += _exit_wrong(record, intent, entityless)
+                model_errors += record.get("model_correct") is False
+                # Thresholds can only fall between distinct confidences.
+                next_confidence = group[i + 1][tier]["confidence"] if i + 1 < len(group) else None
+                if next_confidence == record[tier]["confidence"]:
+                    continue
+                if exit_errors <= model_errors:
+                    best = record[tier]["confidence"]
+            if best is not None:
+                chosen[intent] = math.floor(best * 1e6) / 1e6  # rounded down, so `best` still exits
+        thresholds[tier] = chosen
+        remaining = [
+            r for r in remaining
+            if not (r.get(tier) and r[tier]["name"] in chosen and r[tier]["confidence"] >= chosen[r[tier]["name"]])
+        ]
+    return thresholds
+
+
+def _exit_wrong(record: Dict[str, Any], intent: str, entityless: frozenset) -> bool:
+    if record.get("gold") is not None and record["gold"] != intent:
+        return True
+    # An entityless exit drops the entities, so it is only right when there are none.
+    return intent in entityless and record.get("has_entities") is not False
@@ -0,0 +1,294 @@
+"""In-memory inverted index over the product catalog.
+
+`/query` extracts PRODUCT / CATEGORY / CONDITION spans; this index turns them into
+ranked candidate `product_id`s so the Node side can fetch those rows by id instead
+of running `ILIKE '%term%'` scans over `"Product"`.
+
+The index holds the active products of the `"Product"` table with their
+`"Categories"` names:
+
+- product name, category name and description words are posting lists
+  (`term -> {product_id: field weight}`), scored TF-IDF style
+- a CATEGORY span matches categories by name; products in them (or in their
+  subcategories) get a boost, and are the candidates when there is no PRODUCT span
+- words are lowercased and plural endings stripped on both sides, so "textbooks"
+  finds "Textbook"
+
+Sources: Postgres through `psycopg2` (`NLP_CATALOG_DSN`, default `DATABASE_URL`) or a
+JSON fixture (`NLP_CATALOG_FIXTURE`, e.g. `catalog_fixture.json`) with the same
+columns. `refresh()` only re-reads products whose `updated_at` is not older than the
+newest one seen so far, plus the id list (to drop deleted rows) and the small
+categories table. Rows at the watermark itself come back on every refresh; those
+already applied with the same `updated_at` are skipped.
+"""
+
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Set
+import json
+import math
+import re
+import threading
+import time
+
+try:
+    import psycopg2
+except ImportError:  # optional dependency
+    psycopg2 = None
+
+
+WORD_RE = re.compile(r"[a-z0-9]+")
+
+# Weight of a term by the field it occurs in.
+FIELD_WEIGHTS = {"name": 3.0, "category": 2.0, "description": 1.0}
+# Query-side weight of a term by the entity label it came from.
+LABEL_WEIGHTS = {"PRODUCT": 1.0, "CONDITION": 0.5}
+CATEGORY_BOOST = 2.0
+ACTIVE_STATUS = "active"
+
+
+def stem(word: str) -> str:
+    """Crude plural stripping: 'accessories' -> 'accessory', 'boxes' -> 'box', 'pens' -> 'pen'."""
+    if len(word) > 4 and word.endswith("ies"):
+        return word[:-3] + "y"
+    if len(word) > 4 and word.endswith(("ches", "shes", "sses", "xes")):
+        return word[:-2]
+    if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+
+def terms(text: Optional[str]) -> List[str]:
+    return [stem(word) for word in WORD_RE.findall((text or "").lower())]
+
+
+class PostgresSource:
+    """Reads the catalog tables with psycopg2 (one short-lived connection per refresh)."""
+
+    PRODUCT_COLUMNS = "product_id, name, description, category_id, price, status, updated_at"
+
+    def __init__(self, dsn: str):
+        if psycopg2 is None:
+            raise RuntimeError("psycopg2 is not installed (pip install psycopg2-binary)")
+        self.dsn = dsn
+
+    def _rows(self, query: str, params: tuple = ()) -> List[Dict[str, Any]]:
+        conn = psycopg2.connect(self.dsn)
+        try:
+            with conn.cursor() as cur:
+                cur.execute(query, params)
+                names = [col[0] for col in cur.description]
+                return [dict(zip(names, row)) for row in cur.fetchall()]
+        finally:
+            conn.close()
+
+    def categories(self) -> List[Dict[str, Any]]:
+        return self._rows('SELECT category_id, name, parent_category_id FROM "Categories"')
+
+    def products_since(self, since: Optional[datetime]) -> List[Dict[str, Any]]:
+        # `>=`: rows committed later with the same timestamp as the watermark are not missed.
+        if since is None:
+            return self._rows(f'SELECT {self.PRODUCT_COLUMNS} FROM "Product"')
+        return self._rows(f'SELECT {self.PRODUCT_COLUMNS} FROM "Product" WHERE updated_at >= %s', (since,))
+
+    def product_ids(self) -> Set[int]:
+        return {row["product_id"] for row in self._rows('SELECT product_id FROM "Product"')}
+
+
+class FixtureSource:
+    """Reads `{"categories": [...], "products": [...]}` from a JSON file (re-read on every refresh)."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+
+    def _load(self) -> Dict[str, Any]:
+        data = json.loads(self.path.read_text())
+        for product in data.get("products", []):
+            if isinstance(product.get("updated_at"), str):
+                product["updated_at"] = datetime.fromisoformat(product["updated_at"])
+        return data
+
+    def categories(self) -> List[Dict[str, Any]]:
+        return self._load().get("categories", [])
+
+    def products_since(self, since: Optional[datetime]) -> List[Dict[str, Any]]:
+        products = self._load().get("products", [])
+        if since is None:
+            return products
+        return [p for p in products if p.get("updated_at") is None or p["updated_at"] >= since]
+
+    def product_ids(self) -> Set[int]:
+        return {p["product_id"] for p in self._load().get("products", [])}
+
+
+class CatalogIndex:
+    """Inverted index over active products; safe to search while another thread refreshes."""
+
+    def __init__(self, source):
+        self.source = source
+        self._lock = threading.Lock()
+        self._postings: Dict[str, Dict[int, float]] = {}
+        self._product_terms: Dict[int, Dict[str, float]] = {}
+        self._product_category: Dict[int, int] = {}
+        self._categories: Dict[int, Dict[str, Any]] = {}
+        self._category_terms: Dict[str, Set[int]] = {}
+        self.watermark: Optional[datetime] = None
+        # `updated_at` of every product as last applied, to skip rows re-read unchanged.
+        self._versions: Dict[int, Optional[datetime]] = {}
+        self.refreshes = 0
+        self.last_refresh: Optional[Dict[str, Any]] = None
+
+    # -- building ---------------------------------------------------------------
+
+    def _remove(self, product_id: int) -> None:
+        for term in self._product_terms.pop(product_id, {}):
+            posting = self._postings.get(term)
+            if posting is not None:
+                posting.pop(product_id, None)
+                if not posting:
+                    del self._postings[term]
+        self._product_category.pop(product_id, None)
+
+    def _add(self, product: Dict[str, Any]) -> None:
+        product_id = product["product_id"]
+        category = self._categories.get(product.get("category_id"), {})
+        weights: Dict[str, float] = {}
+        for field, text in (("name", product.get("name")), ("category", category.get("name")),
+                            ("description", product.get("description"))):
+            for term in terms(text):
+                weights[term] = weights.get(term, 0.0) + FIELD_WEIGHTS[field]
+        self._product_terms[product_id] = weights
+        self._product_category[product_id] = product.get("category_id")
+        for term, weight in weights.items():
+            self._postings.setdefault(term, {})[product_id] = weight
+
+    def _set_categories(self, rows: Iterable[Dict[str, Any]]) -> bool:
+        """Install the categories table; True if any name changed (product postings include it)."""
+        categories = {row["category_id"]: dict(row) for row in rows}
+        changed = {cid: c["name"] for cid, c in categories.items()} != {
+            cid: c["name"] for cid, c in self._categories.items()
+        }
+        self._categories = categories
+        self._category_terms = {}
+        for cid, category in categories.items():
+            for term in terms(category["name"]):
+                self._category_terms.setdefault(term, set()).add(cid)
+        return changed
+
+    def refresh(self) -> Dict[str, Any]:
+        """Apply catalog changes since the last refresh (everything on the first call)."""
+        started = time.perf_counter()
+        categories = self.source.categories()
+        # A renamed category changes the postings of all its products: re-read them all.
+        with self._lock:
+            renamed = self._set_categories(categories)
+            full = self.watermark is None or renamed
+        changed = self.source.products_since(None if full else self.watermark)
+        live_ids = self.source.product_ids()
+
+        with self._lock:
+            if full:
+                self._postings.clear()
+                self._product_terms.clear()
+                self._product_category.clear()
+                self._versions.clear()
+            else:
+                changed = [p for p in changed if self._versions.get(p["product_id"], p) != p.get("updated_at")]
+            removed = [pid for pid in self._product_terms if pid not in live_ids]
+            for pid in removed:
+                self._remove(pid)
+            for pid in [pid for pid in self._versions if pid not in live_ids]:
+                del self._versions[pid]
+            added = 0
+            for product in changed:
+                self._versions[product["product_id"]] = product.get("updated_at")
+                self._remove(product["product_id"])
+                if product.get("status", ACTIVE_STATUS) == ACTIVE_STATUS and product["product_id"] in live_ids:
+                    self._add(product)
+                    added += 1
+                updated_at = product.get("updated_at")
+                if updated_at is not None and (self.watermark is None or updated_at > self.watermark):
+                    self.watermark = updated_at
+            self.refreshes += 1
+            self.last_refresh = {
+                "full": full,
+                "changed": len(changed),
+                "indexed": added,
+                "removed": len(removed),
+                "duration_s": round(time.perf_counter() - started, 4),
+                "at": time.time(),
+            }
+            return dict(self.last_refresh)
+
+    # -- searching --------------------------------------------------------------
+
+    def _category_ids(self, text: str) -> Set[int]:
+        """Categories whose name contains all words of `text`, plus their descendants."""
+        words = terms(text)
+        if not words:
+            return set()
+        matched = set.intersection(*(self._category_terms.get(word, set()) for word in words))
+        children: Dict[int, List[int]] = {}
+        for cid, category in self._categories.items():
+            if category.get("parent_category_id") is not None:
+                children.setdefault(category["parent_category_id"], []).append(cid)
+        stack = list(matched)
+        while stack:
+            for child in children.get(stack.pop(), []):
+                if child not in matched:
+                    matched.add(child)
+                    stack.append(child)
+        return matched
+
+    def search(self, entities: List[Dict[str, Any]], limit: int = 20) -> List[Dict[str, Any]]:
+        """Rank products for `/query` entities; returns `[{"product_id", "score"}]`, best first."""
+        with self._lock:
+            total = len(self._product_terms)
+            if not total:
+                return []
+            scores: Dict[int, float] = {}
+            category_ids: Set[int] = set()
+            for ent in entities:
+                label = ent.get("label")
+                if label == "CATEGORY":
+                    category_ids |= self._category_ids(ent.get("text", ""))
+                elif label in LABEL_WEIGHTS:
+                    for term in set(terms(ent.get("text"))):
+                        posting = self._postings.get(term)
+                        if not posting:
+                            continue
+                        idf = math.log(1 + total / len(posting))
+                        for pid, weight in posting.items():
+                            scores[pid] = scores.get(pid, 0.0) + LABEL_WEIGHTS[label] * idf * weight
+
+            if category_ids:
+                in_category = [pid for pid, cid in self._product_category.items() if cid in category_ids]
+                if scores:
+                    for pid in in_category:
+                        if pid in scores:
+                            scores[pid] += CATEGORY_BOOST
+                else:
+                    scores = {pid: CATEGORY_BOOST for pid in in_category}
+
+        ranked = sorted(scores.items(), key=lambda kv: (-kv[1], kv[0]))[:limit]
+        return [{"product_id": pid, "score": round(score, 4)} for pid, score in ranked]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "products": len(self._product_terms),
+                "categories": len(self._categories),
+                "terms": len(self._postings),
+                "watermark": self.watermark.isoformat() if self.watermark else None,
+                "refreshes": self.refreshes,
+                "last_refresh": self.last_refresh,
+            }
+
+
+def create_catalog_index(dsn: Optional[str] = None, fixture: Optional[str] = None) -> Optional[CatalogIndex]:
+    """Index over the fixture if given, else over Postgres at `dsn`; None if neither is configured."""
+    if fixture:
+        return CatalogIndex(FixtureSource(fixture))
+    if dsn:
+        return CatalogIndex(PostgresSource(dsn))
+    return None
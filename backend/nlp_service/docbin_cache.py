@@ -0,0 +1,181 @@
+"""Binary `.spacy` (DocBin) cache of the training data.
+
+`train_model.py` used to rebuild every `Example` from the raw tuples in
+`training_data.py` on every run. Here each dataset ("ner", "textcat") is compiled
+once into DocBin shards holding the gold (reference) docs, and later runs stream
+the shards back instead of re-aligning annotations.
+
+Every example is keyed by a content hash of `(kind, text, annotations)`. A manifest
+maps hashes to shards, so a later run only encodes examples whose hash is new; the
+hashes of removed or edited examples simply stop being requested. The manifest also
+records the order of hashes inside each shard (storing them as per-doc user data
+would make decoding an order of magnitude slower). Shards whose
+examples are all gone are deleted, and a dataset is rewritten into one shard once
+more than half of its stored docs are dead.
+
+Layout:
+    <cache_dir>/<kind>/manifest.json
+    <cache_dir>/<kind>/shard-0000.spacy, shard-0001.spacy, ...
+"""
+
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Tuple
+import hashlib
+import json
+import os
+
+import spacy
+from spacy.tokens import DocBin
+from spacy.training import Example
+
+
+MANIFEST_VERSION = 1
+
+
+def example_hash(kind: str, text: str, annotations: Dict[str, Any]) -> str:
+    payload = json.dumps([kind, text, annotations], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+class DocBinCache:
+    """Content-addressed DocBin shards for one dataset kind."""
+
+    def __init__(self, cache_dir, kind: str, lang: str = "en"):
+        self.kind = kind
+        self.lang = lang
+        self.dir = Path(cache_dir) / kind
+        self.manifest_path = self.dir / "manifest.json"
+        self.manifest = self._load_manifest()
+
+    def _empty_manifest(self) -> Dict[str, Any]:
+        return {
+            "version": MANIFEST_VERSION,
+            "kind": self.kind,
+            "lang": self.lang,
+            "spacy_version": spacy.__version__,
+            "entries": {},  # hash -> shard file name
+            "shards": {},   # shard file name -> hashes of its docs, in order
+        }
+
+    def _load_manifest(self) -> Dict[str, Any]:
+        if self.manifest_path.exists():
+            manifest = json.loads(self.manifest_path.read_text())
+            # Tokenization can change between spaCy versions: start over if it might have.
+            if (manifest.get("version") == MANIFEST_VERSION and manifest.get("lang") == self.lang
+                    and manifest.get("spacy_version") == spacy.__version__):
+                return manifest
+        return self._empty_manifest()
+
+    def _save_manifest(self) -> None:
+        self.dir.mkdir(parents=True, exist_ok=True)
+        tmp = self.manifest_path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(self.manifest, indent=1, sort_keys=True))
+        os.replace(tmp, self.manifest_path)
+
+    def _next_shard_name(self) -> str:
+        taken = {int(name.split("-")[1].split(".")[0]) for name in self.manifest["shards"]}
+        index = max(taken, default=-1) + 1
+        return f"shard-{index:04d}.spacy"
+
+    @staticmethod
+    def _encode(nlp, items: List[Tuple[str, str, Dict[str, Any]]]) -> DocBin:
+        doc_bin = DocBin()
+        for _, text, annotations in items:
+            doc_bin.add(Example.from_dict(nlp.make_doc(text), annotations).reference)
+        return doc_bin
+
+    def compile(self, nlp, data: List[Tuple[str, Dict[str, Any]]]) -> Dict[str, int]:
+        """Make sure every example in `data` is stored; return what was (re)encoded.
+
+        Returns `{"total", "new", "reused", "removed"}` counts.
+        """
+        keyed = [(example_hash(self.kind, text, ann), text, ann) for text, ann in data]
+        live = {digest for digest, _, _ in keyed}
+        entries = self.manifest["entries"]
+
+        fresh, seen = [], set()
+        for digest, text, ann in keyed:
+            if digest not in entries and digest not in seen:
+                fresh.append((digest, text, ann))
+                seen.add(digest)
+
+        removed = [digest for digest in entries if digest not in live]
+        for digest in removed:
+            del entries[digest]
+
+        if fresh:
+            name = self._next_shard_name()
+            self.dir.mkdir(parents=True, exist_ok=True)
+            self._encode(nlp, fresh).to_disk(self.dir / name)
+            self.manifest["shards"][name] = [digest for digest, _, _ in fresh]
+            for digest, _, _ in fresh:
+                entries[digest] = name
+
+        self._drop_dead_shards()
+        stored = sum(len(hashes) for hashes in self.manifest["shards"].values())
+        if stored and len(entries) < stored / 2:
+            self._compact(nlp)
+        if fresh or removed:
+            self._save_manifest()
+        return {"total": len(keyed), "new": len(fresh), "reused": len(keyed) - len(fresh), "removed": len(removed)}
+
+    def _drop_dead_shards(self) -> None:
+        used = set(self.manifest["entries"].values())
+        for name in list(self.manifest["shards"]):
+            if name not in used:
+                (self.dir / name).unlink(missing_ok=True)
+                del self.manifest["shards"][name]
+
+    def _compact(self, nlp) -> None:
+        """Rewrite all live docs into a single shard."""
+        entries = self.manifest["entries"]
+        doc_bin, order = DocBin(), []
+        for digest, doc in self._iter_docs(nlp.vocab, set(entries)):
+            doc_bin.add(doc)
+            order.append(digest)
+        old = list(self.manifest["shards"])
+        name = self._next_shard_name()
+        doc_bin.to_disk(self.dir / name)
+        for path in old:
+            (self.dir / path).unlink(missing_ok=True)
+        self.manifest["shards"] = {name: order}
+        for digest in entries:
+            entries[digest] = name
+        self._save_manifest()
+
+    def _iter_docs(self, vocab, wanted: set) -> Iterator[Tuple[str, Any]]:
+        """Yield `(hash, reference_doc)` for stored docs whose hash is in `wanted`."""
+        for name, hashes in sorted(self.manifest["shards"].items()):
+            if wanted.isdisjoint(hashes):
+                continue
+            doc_bin = DocBin().from_disk(self.dir / name)
+            for digest, doc in zip(hashes, doc_bin.get_docs(vocab)):
+                if digest in wanted:
+                    yield digest, doc
+
+    def stream(self, nlp, data: List[Tuple[str, Dict[str, Any]]]) -> Iterator[Example]:
+        """Yield one `Example` per item of `data` (already compiled), shard by shard.
+
+        Only one shard is decoded at a time. Duplicated examples in `data` are
+        yielded as often as they occur.
+        """
+        wanted = Counter(example_hash(self.kind, text, ann) for text, ann in data)
+        missing = [digest for digest in wanted if digest not in self.manifest["entries"]]
+        if missing:
+            raise KeyError(f"{len(missing)} example(s) not compiled into the {self.kind} cache")
+        for digest, reference in self._iter_docs(nlp.vocab, set(wanted)):
+            for _ in range(wanted[digest]):
+                yield Example(nlp.make_doc(reference.text), reference)
+
+
+def open_cache(nlp, data: List[Tuple[str, Dict[str, Any]]], kind: str, cache_dir) -> DocBinCache:
+    """Compile the full dataset `data` into the cache (incrementally) and return the cache.
+
+    Compile the whole dataset, then `stream` any subset of it (e.g. the train and
+    held-out sides), so a split never looks like removed examples.
+    """
+    cache = DocBinCache(cache_dir, kind, lang=nlp.lang)
+    stats = cache.compile(nlp, data)
+    print(f"  {kind} cache: {stats['new']} encoded, {stats['reused']} reused, {stats['removed']} removed")
+    return cache
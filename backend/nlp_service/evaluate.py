@@ -0,0 +1,361 @@
+"""
+Evaluation harness for a trained Campus Shop NLP model.
+
+Runs a labeled set through `nlp.pipe` in batches and reports:
+
+- intents: per-intent precision / recall / F1 of the top `doc.cats` label, accuracy
+  and macro F1 (and the same for `intent_linear.npz` when the model directory has one)
+- entities: per-label exact-span precision / recall / F1 and the micro average
+- speed: docs/sec of the batched run, and p50/p95/p99 latency of single `nlp(text)` calls
+
+The default data is the held-out side of `train_model.holdout_split` (the split
+`train_model.py` and `sweep.py` hold out), or any JSONL in the `augment.py` format via
+`--data`. With `--gate metric=threshold` the exit status says whether the model is
+good and fast enough, so a promotion can be made conditional on it:
+
+Usage:
+    python evaluate.py models/campus_shop_nlp --output eval.json
+    python evaluate.py models/best.staging --gate intent_macro_f1=0.8 --gate p95_ms=5 \\
+        && mv models/best.staging models/best && curl -X POST localhost:5001/reload
+    python evaluate.py models/best --data synthetic.jsonl --batch-size 256
+
+Gate metrics: intent_accuracy, intent_macro_f1, ents_f (higher is better) and
+docs_per_sec (higher), p50_ms, p95_ms, p99_ms (lower).
+
+`--tune-cascade` also picks the early-exit thresholds of the inference cascade (see
+`cascade.py`) on the same data and saves them as `cascade.json` in the model
+directory; the report then compares the cascade with the full model (exit share,
+intent accuracy, single-call latency). Tune on data the model did not train on.
+"""
+
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+import argparse
+import json
+import sys
+import time
+
+import spacy
+
+from cascade import FILENAME as CASCADE_FILENAME, Cascade, load_thresholds, tune_thresholds
+from intent_linear import MODEL_FILENAME, LinearIntentModel
+from intent_rules import default_engine
+from profiling import percentile
+from query_rules import QueryRules
+
+
+# Gate metric -> "min" (value must be >= threshold) or "max" (value must be <= threshold).
+GATES = {
+    "intent_accuracy": "min",
+    "intent_macro_f1": "min",
+    "ents_f": "min",
+    "docs_per_sec": "min",
+    "p50_ms": "max",
+    "p95_ms": "max",
+    "p99_ms": "max",
+}
+
+
+def prf(tp: int, fp: int, fn: int) -> Dict[str, float]:
+    precision = tp / (tp + fp) if tp + fp else 0.0
+    recall = tp / (tp + fn) if tp + fn else 0.0
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+    return {"p": round(precision, 4), "r": round(recall, 4), "f": round(f1, 4), "support": tp + fn}
+
+
+def top_label(cats: Dict[str, float]) -> Optional[str]:
+    return max(cats.items(), key=lambda kv: kv[1])[0] if cats else None
+
+
+def intent_scores(pairs: List[Tuple[str, Optional[str]]]) -> Dict[str, Any]:
+    """Per-intent P/R/F1 from `(gold, predicted)` pairs."""
+    tp, fp, fn = Counter(), Counter(), Counter()
+    for gold, predicted in pairs:
+        if predicted == gold:
+            tp[gold] += 1
+        else:
+            fn[gold] += 1
+            if predicted is not None:
+                fp[predicted] += 1
+    labels = sorted(set(tp) | set(fp) | set(fn))
+    per_label = {label: prf(tp[label], fp[label], fn[label]) for label in labels}
+    return {
+        "examples": len(pairs),
+        "accuracy": round(sum(tp.values()) / len(pairs), 4) if pairs else 0.0,
+        "macro_f1": round(sum(s["f"] for s in per_label.values()) / len(per_label), 4) if per_label else 0.0,
+        "per_label": per_label,
+    }
+
+
+def entity_scores(pairs: List[Tuple[set, set]]) -> Dict[str, Any]:
+    """Per-label exact-span P/R/F1 from `(gold_spans, predicted_spans)` pairs of (start, end, label)."""
+    tp, fp, fn = Counter(), Counter(), Counter()
+    for gold, predicted in pairs:
+        for span in predicted & gold:
+            tp[span[2]] += 1
+        for span in predicted - gold:
+            fp[span[2]] += 1
+        for span in gold - predicted:
+            fn[span[2]] += 1
+    labels = sorted(set(tp) | set(fp) | set(fn))
+    micro = prf(sum(tp.values()), sum(fp.values()), sum(fn.values()))
+    return {
+        "examples": len(pairs),
+        "p": micro["p"],
+        "r": micro["r"],
+        "f": micro["f"],
+        "per_label": {label: prf(tp[label], fp[label], fn[label]) for label in labels},
+    }
+
+
+def load_eval_data(holdout: float = 0.2, data_file: Optional[str] = None) -> List[Tuple[str, Dict[str, Any]]]:
+    """Labeled `(text, annotations)` pairs; annotations hold "cats" and/or "entities"."""
+    if data_file:
+        from augment import read_jsonl
+
+        return list(read_jsonl(data_file))
+
+    from train_model import holdout_split
+    from training_data import NER_TRAINING_DATA, TEXTCAT_TRAINING_DATA
+
+    _, cat_dev = holdout_split(TEXTCAT_TRAINING_DATA, holdout)
+    _, ner_dev = holdout_split(NER_TRAINING_DATA, holdout)
+    return cat_dev + ner_dev
+
+
+def measure_speed(nlp, texts: List[str], batch_size: int = 64, repeats: int = 3) -> Dict[str, float]:
+    """Batched throughput and single-call latency percentiles (ms)."""
+    for _ in nlp.pipe(texts[:batch_size]):  # warm-up
+        pass
+    started = time.perf_counter()
+    for _ in range(repeats):
+        for _ in nlp.pipe(texts, batch_size=batch_size):
+            pass
+    elapsed = time.perf_counter() - started
+
+    singles = []
+    for text in texts:
+        started = time.perf_counter()
+        nlp(text)
+        singles.append(time.perf_counter() - started)
+    singles.sort()
+    return {
+        "docs": len(texts),
+        "batch_size": batch_size,
+        "docs_per_sec": round(repeats * len(texts) / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(1000 * percentile(singles, 50), 4),
+        "p95_ms": round(1000 * percentile(singles, 95), 4),
+        "p99_ms": round(1000 * percentile(singles, 99), 4),
+    }
+
+
+def cascade_records(data, model_intents: List[Optional[str]], linear: Optional[LinearIntentModel],
+                    model_entities: Optional[List[bool]] = None):
+    """Per-example tier predictions and model correctness, as `cascade.tune_thresholds` expects.
+
+    Textcat rows carry no gold entities; for them `has_entities` falls back to whether the
+    model (`model_entities`) or the keyword lists find any, and is None without either.
+    """
+    keywords = QueryRules()
+    records = []
+    for i, ((text, annotations), model_intent) in enumerate(zip(data, model_intents)):
+        gold = top_label(annotations["cats"]) if annotations.get("cats") else None
+        if "entities" in annotations:
+            has_entities = bool(annotations["entities"])
+        elif model_entities is not None:
+            has_entities = model_entities[i] or keywords.mentions_keyword(text)
+        else:
+            has_entities = True if keywords.mentions_keyword(text) else None
+        records.append({
+            "gold": gold,
+            "has_entities": has_entities,
+            "model_correct": (model_intent == gold) if gold is not None and model_intent is not None else None,
+            "rules": default_engine().classify(text),
+            "linear": linear.classify(text) if linear is not None else None,
+        })
+    return records
+
+
+def evaluate_cascade(nlp, data, model_intents: List[Optional[str]], linear: Optional[LinearIntentModel],
+                     thresholds: Dict[str, Dict[str, float]]) -> Dict[str, Any]:
+    """Replay `/query` through the cascade: exit share per tier, intent accuracy and latency vs the model alone."""
+    cascade = Cascade(thresholds, QueryRules())
+    fields = ("entities", "intent")
+    cascade_correct = model_correct = labeled = 0
+    cascade_times, model_times = [], []
+    for (text, annotations), model_intent in zip(data, model_intents):
+        started = time.perf_counter()
+        result = cascade.answer(text, fields, linear)
+        if result is None:
+            doc = nlp(text)
+            result = cascade.record_model({"intent": {"name": top_label(doc.cats), "confidence": None}})
+        cascade_times.append(time.perf_counter() - started)
+        started = time.perf_counter()
+        nlp(text)
+        model_times.append(time.perf_counter() - started)
+        if annotations.get("cats"):
+            gold = top_label(annotations["cats"])
+            labeled += 1
+            cascade_correct += result["intent"]["name"] == gold
+            model_correct += model_intent == gold
+    cascade_times.sort()
+    model_times.sort()
+    stats = cascade.stats()
+    return {
+        "thresholds": thresholds,
+        "answered": stats["answered"],
+        "early_exit_share": stats["early_exit_share"],
+        "intent_accuracy": round(cascade_correct / labeled, 4) if labeled else None,
+        "model_intent_accuracy": round(model_correct / labeled, 4) if labeled else None,
+        "p50_ms": round(1000 * percentile(cascade_times, 50), 4),
+        "model_p50_ms": round(1000 * percentile(model_times, 50), 4),
+    }
+
+
+def evaluate(model_dir, data: List[Tuple[str, Dict[str, Any]]], batch_size: int = 64,
+             tune_cascade: bool = False) -> Dict[str, Any]:
+    """Score the model in `model_dir` on `data` and time it."""
+    nlp = spacy.load(model_dir)
+    texts = [text for text, _ in data]
+
+    intent_pairs, entity_pairs, model_intents, model_entities = [], [], [], []
+    for doc, (_, annotations) in zip(nlp.pipe(texts, batch_size=batch_size), data):
+        model_intents.append(top_label(doc.cats))
+        model_entities.append(bool(doc.ents))
+        if annotations.get("cats") and "textcat" in nlp.pipe_names:
+            intent_pairs.append((top_label(annotations["cats"]), top_label(doc.cats)))
+        if "entities" in annotations and "ner" in nlp.pipe_names:
+            gold = {tuple(ent) for ent in annotations["entities"]}
+            predicted = {(ent.start_char, ent.end_char, ent.label_) for ent in doc.ents}
+            entity_pairs.append((gold, predicted))
+
+    report: Dict[str, Any] = {
+        "model": str(model_dir),
+        "meta": {"name": nlp.meta.get("name"), "version": nlp.meta.get("version"),
+                 "pipeline": nlp.pipe_names, "spacy_version": spacy.__version__},
+        "intents": intent_scores(intent_pairs) if intent_pairs else None,
+        "entities": entity_scores(entity_pairs) if entity_pairs else None,
+        "speed": measure_speed(nlp, texts, batch_size=batch_size),
+    }
+
+    linear_path = Path(model_dir) / MODEL_FILENAME
+    linear = LinearIntentModel.load(linear_path) if linear_path.exists() else None
+    if linear is not None:
+        labeled = [(text, top_label(ann["cats"])) for text, ann in data if ann.get("cats")]
+        report["intents_linear"] = intent_scores([(gold, linear.predict(text)[0]) for text, gold in labeled])
+
+    if "textcat" in nlp.pipe_names:
+        if tune_cascade:
+            thresholds = tune_thresholds(
+                cascade_records(data, model_intents, linear, model_entities if "ner" in nlp.pipe_names else None)
+            )
+            path = Path(model_dir) / CASCADE_FILENAME
+            path.write_text(json.dumps({"thresholds": thresholds, "examples": len(data)}, indent=2) + "\n")
+            report["cascade_saved_to"] = str(path)
+        else:
+            thresholds = load_thresholds(model_dir)
+        report["cascade"] = evaluate_cascade(nlp, data, model_intents, linear, thresholds)
+    return report
+
+
+def metric_values(report: Dict[str, Any]) -> Dict[str, float]:
+    """Flat view of the gateable metrics."""
+    values = dict(report["speed"])
+    if report["intents"]:
+        values["intent_accuracy"] = report["intents"]["accuracy"]
+        values["intent_macro_f1"] = report["intents"]["macro_f1"]
+    if report["entities"]:
+        values["ents_f"] = report["entities"]["f"]
+    return {name: values[name] for name in GATES if name in values}
+
+
+def parse_gate(value: str) -> Tuple[str, float]:
+    """'p95_ms=5' -> ("p95_ms", 5.0)."""
+    name, _, threshold = value.partition("=")
+    if name not in GATES or not threshold:
+        raise argparse.ArgumentTypeError(f"expected metric=threshold with metric in {sorted(GATES)}")
+    return name, float(threshold)
+
+
+def check_gates(report: Dict[str, Any], gates: Dict[str, float]) -> Dict[str, Any]:
+    """Compare metrics with thresholds; a metric the data cannot produce fails its gate."""
+    values = metric_values(report)
+    results = {}
+    for name, threshold in gates.items():
+        value = values.get(name)
+        if value is None:
+            passed = False
+        elif GATES[name] == "min":
+            passed = value >= threshold
+        else:
+            passed = value <= threshold
+        results[name] = {"value": value, "threshold": threshold, "kind": GATES[name], "passed": passed}
+    return {"passed": all(r["passed"] for r in results.values()), "gates": results}
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    print("\n" + "=" * 60)
+    print(f"Evaluation of {report['model']}")
+    print("=" * 60)
+    for key, title in (("intents", "Intents (textcat)"), ("intents_linear", "Intents (linear)"),
+                       ("entities", "Entities")):
+        section = report.get(key)
+        if not section:
+            continue
+        summary = (f"accuracy {section['accuracy']:.3f}, macro F1 {section['macro_f1']:.3f}"
+                   if "accuracy" in section else f"P {section['p']:.3f}  R {section['r']:.3f}  F {section['f']:.3f}")
+        print(f"\n{title}: {section['examples']} examples, {summary}")
+        for label, s in section["per_label"].items():
+            print(f"  {label:<22} P {s['p']:.3f}  R {s['r']:.3f}  F {s['f']:.3f}  ({s['support']})")
+    if report.get("cascade"):
+        c = report["cascade"]
+        print(f"\nCascade: {c['early_exit_share']:.1%} answered early {c['answered']}, intent accuracy "
+              f"{c['intent_accuracy']} (model {c['model_intent_accuracy']}), p50 {c['p50_ms']:.2f} ms "
+              f"(model {c['model_p50_ms']:.2f} ms)")
+        print(f"  thresholds: {c['thresholds']}")
+        if report.get("cascade_saved_to"):
+            print(f"  ✅ saved to {report['cascade_saved_to']}")
+    speed = report["speed"]
+    print(f"\nSpeed: {speed['docs_per_sec']:.0f} docs/s (batch {speed['batch_size']}), single-call "
+          f"p50 {speed['p50_ms']:.2f} ms, p95 {speed['p95_ms']:.2f} ms, p99 {speed['p99_ms']:.2f} ms")
+    if "gating" in report:
+        print()
+        for name, gate in report["gating"]["gates"].items():
+            op = ">=" if gate["kind"] == "min" else "<="
+            print(f"  {'✅' if gate['passed'] else '❌'} {name} {gate['value']} {op} {gate['threshold']}")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Evaluate a Campus Shop NLP model")
+    parser.add_argument("model", help="model directory")
+    parser.add_argument("--data", help="labeled JSONL (augment.py format); default: the training holdout")
+    parser.add_argument("--holdout", type=float, default=0.2)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--gate", type=parse_gate, action="append", default=[],
+                        help="metric=threshold, repeatable; non-zero exit if any gate fails")
+    parser.add_argument("--output", help="write the JSON report here")
+    parser.add_argument("--tune-cascade", action="store_true",
+                        help="tune the cascade thresholds on this data and save cascade.json in the model directory")
+    args = parser.parse_args(argv)
+
+    data = load_eval_data(args.holdout, args.data)
+    if not data:
+        print("❌ No evaluation data")
+        return 1
+    report = evaluate(args.model, data, batch_size=args.batch_size, tune_cascade=args.tune_cascade)
+    if args.gate:
+        report["gating"] = check_gates(report, dict(args.gate))
+
+    print_report(report)
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2) + "\n")
+        print(f"\nReport written to {args.output}")
+    if args.gate and not report["gating"]["passed"]:
+        print("\n❌ Gates failed")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
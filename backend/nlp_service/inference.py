@@ -0,0 +1,296 @@
+"""Pipeline execution helpers shared by the API process and inference workers.
+
+Everything in here works on an explicit `nlp` argument and has no FastAPI or
+global-state dependencies, so the same code runs in the API's thread pool and
+inside process-pool workers (see `backends.py`).
+"""
+
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+import logging
+import time
+
+from intent_rules import default_engine
+
+
+logger = logging.getLogger("nlp_service")
+
+
+# Fields a caller can request from /parse. Each maps to the pipeline components
+# (by factory name) that have to run to produce it; everything else is disabled
+# for that call. `tok2vec`/`transformer` are shared embedding layers that other
+# components listen to, so they are never disabled.
+PARSE_FIELDS = ("tokens", "entities", "noun_chunks", "sentences", "deps", "intent")
+FIELD_COMPONENTS = {
+    "tokens": {"tagger", "morphologizer", "attribute_ruler", "lemmatizer", "parser", "senter"},
+    "entities": {"ner", "entity_ruler", "span_ruler", "entity_linker"},
+    "noun_chunks": {"tagger", "morphologizer", "attribute_ruler", "parser"},
+    "sentences": {"parser", "senter", "sentencizer"},
+    "deps": {"parser"},
+    "intent": {"textcat", "textcat_multilabel"},
+}
+SHARED_COMPONENTS = {"tok2vec", "transformer"}
+# Compact endpoints only need these; they default to the lean path.
+QUERY_FIELDS = ("entities", "intent")
+CLASSIFY_FIELDS = ("intent",)
+
+
+def resolve_fields(fields: Optional[List[str]], served: tuple = PARSE_FIELDS) -> tuple:
+    """Validate requested fields and return them as a canonical, hashable tuple.
+
+    `None` or an empty list means "everything" (the historical `/parse` output), limited
+    to the `served` fields whose components were loaded (see `load_pipeline`).
+    """
+    if not fields:
+        return served
+    unknown = sorted(set(fields) - set(PARSE_FIELDS))
+    if unknown:
+        raise ValueError(f"Unknown field(s) {unknown}; expected a subset of {list(PARSE_FIELDS)}")
+    not_served = sorted(set(fields) - set(served))
+    if not_served:
+        raise ValueError(f"Field(s) {not_served} are not served by this instance (NLP_SERVE_FIELDS)")
+    return tuple(f for f in PARSE_FIELDS if f in fields)
+
+
+def _skippable(factories: Dict[str, Optional[str]], fields: tuple) -> List[str]:
+    """Component names (from a name -> factory mapping) that no field in `fields` needs."""
+    needed = set(SHARED_COMPONENTS)
+    for field in fields:
+        needed |= FIELD_COMPONENTS[field]
+    known = set().union(*FIELD_COMPONENTS.values())
+    # Custom components we know nothing about always run.
+    return [name for name, factory in factories.items() if factory in known and factory not in needed]
+
+
+def disabled_components(nlp, fields: tuple) -> List[str]:
+    """Names of pipeline components that can be skipped when only `fields` are needed.
+
+    Passed to `nlp(text, disable=...)` / `nlp.pipe(..., disable=...)`, which disables the
+    components for that call only. (`nlp.select_pipes` would toggle them on the shared
+    `nlp` object, which is unsafe while other executor threads are using it.)
+    """
+    return _skippable({name: nlp.get_pipe_meta(name).factory for name in nlp.pipe_names}, fields)
+
+
+def load_pipeline(model_path: str, fields: tuple = PARSE_FIELDS):
+    """`spacy.load` the model, excluding components none of the served `fields` need.
+
+    Excluded components are never deserialized, which shortens startup and saves memory
+    when an instance only serves e.g. `/query` and `/classify`. Installed packages (no
+    `config.cfg` on disk) are loaded whole.
+    """
+    import spacy
+
+    exclude: List[str] = []
+    config_path = Path(model_path) / "config.cfg"
+    if fields != PARSE_FIELDS and config_path.exists():
+        config = spacy.util.load_config(config_path)
+        factories = {
+            name: config["components"].get(name, {}).get("factory")
+            for name in config["nlp"]["pipeline"]
+        }
+        exclude = _skippable(factories, fields)
+    return spacy.load(model_path, exclude=exclude)
+
+
+def load_vocab(model_path: str, fields: tuple = PARSE_FIELDS):
+    """Only the tokenizer and vocab, for a process that never runs the pipeline itself.
+
+    With the process backend the API process needs the model for its fingerprint and
+    `/query`'s `features`, not its weights. The components `load_pipeline` would load
+    are listed in `meta["served_components"]` for `pipeline_features`. Installed
+    packages fall back to `load_pipeline`.
+    """
+    import spacy
+
+    config_path = Path(model_path) / "config.cfg"
+    if not config_path.exists():
+        return load_pipeline(model_path, fields)
+    config = spacy.util.load_config(config_path)
+    pipeline = list(config["nlp"]["pipeline"])
+    skipped = set(_skippable({name: config["components"].get(name, {}).get("factory") for name in pipeline}, fields))
+    nlp = spacy.load(model_path, exclude=pipeline)
+    nlp.meta["served_components"] = [name for name in pipeline if name not in skipped]
+    return nlp
+
+
+def warmup_texts(limit: int = 64) -> List[str]:
+    """Realistic sample texts from `training_data.py` (intent and NER examples interleaved)."""
+    from training_data import NER_TRAINING_DATA, TEXTCAT_TRAINING_DATA
+
+    intent_texts = [text for text, _ in TEXTCAT_TRAINING_DATA]
+    ner_texts = [text for text, _ in NER_TRAINING_DATA]
+    texts = [text for pair in zip(intent_texts, ner_texts) for text in pair]
+    return texts[:limit]
+
+
+def warm_up(nlp, fields: tuple = PARSE_FIELDS, limit: int = 64, batch_size: int = 64) -> None:
+    """Run sample texts through both the batched and the single-text code paths.
+
+    Pays for lazy initialization (vectors, model weights, tokenizer caches) before the
+    pipeline serves real traffic.
+    """
+    texts = warmup_texts(limit)
+    if not texts:
+        return
+    run_pipeline(nlp, texts, fields, batch_size)
+    for text in texts[:8]:
+        run_pipeline(nlp, [text], fields, 1)
+
+
+def guess_intent_from_text(text: str) -> Dict[str, Any]:
+    """Rule-based intent detector used when no trained textcat is available.
+
+    Backed by the compiled keyword table in `intent_rules.json` (see `intent_rules.py`).
+    Returns {'name': str, 'confidence': float, 'action': optional_action}
+    """
+    return default_engine().classify(text)
+
+
+def build_parse_result(nlp, doc, text: str, fields: tuple = PARSE_FIELDS) -> Dict[str, Any]:
+    """Turn a processed spaCy `Doc` into the JSON-serializable `/parse` result.
+
+    Shared by the single-text and batch code paths so both return the same shape.
+    Only the keys listed in `fields` are built, so lean callers skip the per-token dicts.
+    """
+    result: Dict[str, Any] = {}
+    has_parser = "parser" in nlp.pipe_names
+    has_senter = has_parser or "senter" in nlp.pipe_names
+
+    # tokens
+    if "tokens" in fields:
+        result["tokens"] = [
+            {
+                "text": token.text,
+                "lemma": token.lemma_,
+                "pos": token.pos_,
+                "tag": token.tag_,
+                "dep": token.dep_,
+                "is_stop": token.is_stop,
+            }
+            for token in doc
+        ]
+
+    # entities
+    if "entities" in fields:
+        result["entities"] = [
+            {"text": ent.text, "label": ent.label_, "start_char": ent.start_char, "end_char": ent.end_char}
+            for ent in doc.ents
+        ]
+
+    # noun chunks (requires a parser or senter in the pipeline)
+    if "noun_chunks" in fields:
+        noun_chunks = []
+        if has_senter:
+            try:
+                noun_chunks = [nc.text for nc in doc.noun_chunks]
+            except Exception:
+                noun_chunks = []
+        result["noun_chunks"] = noun_chunks
+
+    # sentences (requires parser or senter); fall back to the whole text
+    if "sentences" in fields:
+        sentences = [doc.text]
+        if has_senter:
+            try:
+                sentences = [sent.text for sent in doc.sents]
+            except Exception:
+                sentences = [doc.text]
+        result["sentences"] = sentences
+
+    # dependency information (requires parser)
+    if "deps" in fields:
+        deps = []
+        if has_parser:
+            try:
+                deps = [
+                    {"token": token.text, "head": token.head.text, "dep": token.dep_}
+                    for token in doc
+                ]
+            except Exception:
+                deps = []
+        result["deps"] = deps
+
+    # If the loaded model includes a trained textcat, use its scores for intent.
+    # Otherwise, fall back to the rule-based guess.
+    if "intent" in fields:
+        if getattr(doc, "cats", None):
+            try:
+                best_label, best_score = max(doc.cats.items(), key=lambda kv: kv[1])
+                intent = {"name": best_label, "confidence": float(best_score)}
+            except Exception:
+                intent = guess_intent_from_text(text.lower())
+        else:
+            intent = guess_intent_from_text(text.lower())
+        result["intent"] = intent
+
+    return result
+
+
+def _run_profiled(nlp, texts: List[str], fields: tuple, batch_size: int, disable: List[str],
+                  timings: list) -> List[Dict[str, Any]]:
+    """`nlp.pipe` unrolled by hand so each stage can be timed (see `profiling.py`)."""
+    n = len(texts)
+    started = time.perf_counter()
+    docs = [nlp.make_doc(text) for text in texts]
+    timings.append(("tokenizer", time.perf_counter() - started, n))
+
+    for name, proc in nlp.pipeline:
+        if name in disable:
+            continue
+        started = time.perf_counter()
+        if hasattr(proc, "pipe"):
+            docs = list(proc.pipe(docs, batch_size=batch_size))
+        else:
+            docs = [proc(doc) for doc in docs]
+        timings.append((f"component:{name}", time.perf_counter() - started, n))
+
+    started = time.perf_counter()
+    items = [{"ok": True, "result": build_parse_result(nlp, doc, text, fields)} for doc, text in zip(docs, texts)]
+    timings.append(("serialize", time.perf_counter() - started, n))
+    return items
+
+
+def run_pipeline(nlp, texts: List[str], fields: tuple = PARSE_FIELDS, batch_size: int = 64,
+                 timings: Optional[list] = None) -> List[Dict[str, Any]]:
+    """Process non-empty `texts` with `nlp.pipe` and build one result item per text.
+
+    Each item is `{"ok": True, "result": {...}}` or `{"ok": False, "error": "..."}`.
+    If one text breaks the batch, the unfinished texts are redone one by one so the
+    error is reported against the text that caused it.
+
+    When a `timings` list is passed, per-stage `(stage, seconds, n_docs)` tuples are
+    appended to it (profiling mode).
+    """
+    disable = disabled_components(nlp, fields)
+    if timings is not None:
+        try:
+            return _run_profiled(nlp, texts, fields, batch_size, disable, timings)
+        except Exception:
+            # Fall through to the regular path, which isolates the failing text.
+            timings.clear()
+    items: List[Optional[Dict[str, Any]]] = [None] * len(texts)
+    try:
+        docs = nlp.pipe(texts, batch_size=batch_size, disable=disable)
+        for i, doc in enumerate(docs):
+            items[i] = {"ok": True, "result": build_parse_result(nlp, doc, texts[i], fields)}
+    except Exception:
+        logger.exception("nlp.pipe failed, retrying batch item by item")
+        for i, text in enumerate(texts):
+            if items[i] is not None:
+                continue
+            try:
+                doc = nlp(text, disable=disable)
+                items[i] = {"ok": True, "result": build_parse_result(nlp, doc, text, fields)}
+            except Exception as e:
+                items[i] = {"ok": False, "error": str(e)}
+    return items
+
+
+def pipeline_features(nlp) -> Dict[str, bool]:
+    """Capabilities of the loaded pipeline, reported by `/query`."""
+    pipe_names: Iterable[str] = nlp.meta.get("served_components", nlp.pipe_names) if nlp is not None else []
+    return {
+        "has_parser": "parser" in pipe_names,
+        "has_textcat": "textcat" in pipe_names,
+    }
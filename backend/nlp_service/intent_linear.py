@@ -0,0 +1,141 @@
+"""Compact linear intent classifier distilled from the textcat training set.
+
+A multinomial logistic regression over hashed features:
+- word unigrams and bigrams
+- character 3-5 grams of each word (with boundary markers)
+
+Weights are a single NumPy array saved as `intent_linear.npz` next to the spaCy
+model. Prediction is a handful of row lookups and a softmax, well under a
+millisecond, and this module imports only NumPy so `/classify` can serve from it
+without touching spaCy.
+"""
+
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import json
+import re
+import zlib
+
+import numpy as np
+
+
+MODEL_FILENAME = "intent_linear.npz"
+
+_WORD_RE = re.compile(r"\w+")
+
+
+def extract_features(text: str, n_features: int) -> np.ndarray:
+    """Hashed feature indices for `text` (unique, unsorted)."""
+    words = _WORD_RE.findall(text.lower())
+    keys = [f"w:{w}" for w in words]
+    keys.extend(f"b:{a} {b}" for a, b in zip(words, words[1:]))
+    for word in words:
+        padded = f"<{word}>"
+        for n in (3, 4, 5):
+            keys.extend(f"c:{padded[i:i + n]}" for i in range(len(padded) - n + 1))
+    if not keys:
+        keys = ["<empty>"]
+    return np.fromiter({zlib.crc32(k.encode("utf-8")) % n_features for k in keys}, dtype=np.int64)
+
+
+class LinearIntentModel:
+    """Hashed-feature softmax classifier."""
+
+    def __init__(self, labels: Sequence[str], weights: np.ndarray, bias: np.ndarray,
+                 meta: Optional[Dict[str, Any]] = None):
+        self.labels = list(labels)
+        self.weights = weights
+        self.bias = bias
+        self.n_features = weights.shape[0]
+        self.meta = meta or {}
+
+    def scores(self, text: str) -> np.ndarray:
+        idx = extract_features(text, self.n_features)
+        logits = self.weights[idx].sum(axis=0) / np.sqrt(len(idx)) + self.bias
+        logits = logits - logits.max()
+        exp = np.exp(logits)
+        return exp / exp.sum()
+
+    def predict(self, text: str) -> Tuple[str, float]:
+        probs = self.scores(text)
+        best = int(probs.argmax())
+        return self.labels[best], float(probs[best])
+
+    def classify(self, text: str) -> Dict[str, Any]:
+        """Same shape as the textcat-derived intent: {'name': str, 'confidence': float}."""
+        name, confidence = self.predict(text)
+        return {"name": name, "confidence": confidence}
+
+    def save(self, path) -> Path:
+        path = Path(path)
+        if path.is_dir():
+            path = path / MODEL_FILENAME
+        np.savez_compressed(
+            path,
+            weights=self.weights.astype(np.float32),
+            bias=self.bias.astype(np.float32),
+            labels=np.array(self.labels),
+            meta=np.array(json.dumps(self.meta)),
+        )
+        return path
+
+    @classmethod
+    def load(cls, path) -> "LinearIntentModel":
+        path = Path(path)
+        if path.is_dir():
+            path = path / MODEL_FILENAME
+        with np.load(path, allow_pickle=False) as data:
+            return cls(
+                labels=[str(label) for label in data["labels"]],
+                weights=data["weights"],
+                bias=data["bias"],
+                meta=json.loads(str(data["meta"])),
+            )
+
+
+def train_linear_intent(data: List[Tuple[str, Dict[str, Any]]], n_features: int = 2 ** 16, epochs: int = 30,
+                        learning_rate: float = 0.5, l2: float = 1e-6, seed: int = 0) -> LinearIntentModel:
+    """Fit the classifier with plain SGD on `TEXTCAT_TRAINING_DATA`-style tuples.
+
+    The label for each example is the category with the highest score in `cats`.
+    """
+    labels = sorted({label for _, annotations in data for label in annotations["cats"]})
+    label_index = {label: i for i, label in enumerate(labels)}
+    examples = [
+        (extract_features(text, n_features), label_index[max(ann["cats"].items(), key=lambda kv: kv[1])[0]])
+        for text, ann in data
+    ]
+
+    rng = np.random.default_rng(seed)
+    weights = np.zeros((n_features, len(labels)), dtype=np.float32)
+    bias = np.zeros(len(labels), dtype=np.float32)
+    order = np.arange(len(examples))
+
+    for epoch in range(epochs):
+        rng.shuffle(order)
+        lr = learning_rate / (1 + epoch * 0.1)
+        for i in order:
+            idx, y = examples[i]
+            scale = 1 / np.sqrt(len(idx))
+            logits = weights[idx].sum(axis=0) * scale + bias
+            logits -= logits.max()
+            probs = np.exp(logits)
+            probs /= probs.sum()
+            probs[y] -= 1.0  # gradient of cross-entropy w.r.t. logits
+            if l2:
+                weights[idx] *= (1 - lr * l2)
+            weights[idx] -= lr * scale * probs
+            bias -= lr * probs
+
+    meta = {"n_features": n_features, "epochs": epochs, "train_examples": len(examples)}
+    return LinearIntentModel(labels, weights, bias, meta)
+
+
+def accuracy(predict, data: List[Tuple[str, Dict[str, Any]]]) -> float:
+    """Share of `data` for which `predict(text)` returns the gold (highest-scoring) label."""
+    if not data:
+        return 0.0
+    correct = sum(
+        1 for text, ann in data if predict(text) == max(ann["cats"].items(), key=lambda kv: kv[1])[0]
+    )
+    return correct / len(data)
@@ -0,0 +1,124 @@
+"""Rule-based intent detection compiled into a single token automaton.
+
+The keyword table lives in `intent_rules.json` (override the path with
+`NLP_INTENT_RULES`). At load time every phrase of every rule is tokenized and
+inserted into one trie keyed by lowercase tokens, so classifying a text is a
+single pass over its tokens no matter how many rules or phrases there are.
+Matching is on whole tokens, so "hi" no longer fires inside "this" and
+"order" no longer fires inside "border".
+
+Rules can also pull phrases from the vocabulary lists in `training_data.py`
+via `phrases_from`, so the fallback grows together with the training data.
+"""
+
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+import json
+import os
+import re
+
+
+DEFAULT_RULES_PATH = Path(__file__).resolve().parent / "intent_rules.json"
+
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word/punctuation tokens; phrases and input are split the same way."""
+    return _TOKEN_RE.findall(text.lower())
+
+
+class IntentRuleEngine:
+    """Compiled keyword rules with priorities and confidences."""
+
+    # Key in a trie node marking "a phrase ends here"; value is the best rule index.
+    _END = ""
+
+    def __init__(self, rules: List[Dict[str, Any]], fallback: Optional[Dict[str, Any]] = None):
+        self.rules = rules
+        self.fallback = fallback or {"name": "unknown", "confidence": 0.5}
+        self._trie: Dict[str, Any] = {}
+        self.phrase_count = 0
+        for index, rule in enumerate(rules):
+            for phrase in rule.get("phrases", []):
+                self._insert(tokenize(phrase), index)
+
+    def _insert(self, tokens: List[str], rule_index: int) -> None:
+        if not tokens:
+            return
+        node = self._trie
+        for token in tokens:
+            node = node.setdefault(token, {})
+        current = node.get(self._END)
+        # The same phrase in several rules: keep the higher-priority one.
+        if current is None or self.rules[rule_index]["priority"] > self.rules[current]["priority"]:
+            node[self._END] = rule_index
+        self.phrase_count += 1
+
+    def _matched(self, text: str) -> List[int]:
+        """Indices of the rules matching `text`, in order of first match."""
+        tokens = tokenize(text)
+        found: List[int] = []
+        for start in range(len(tokens)):
+            node = self._trie
+            for token in tokens[start:]:
+                node = node.get(token)
+                if node is None:
+                    break
+                index = node.get(self._END)
+                if index is not None and index not in found:
+                    found.append(index)
+        return found
+
+    def match(self, text: str) -> Optional[Dict[str, Any]]:
+        """Return the winning rule for `text`, or None when nothing matches."""
+        found = self._matched(text)
+        if not found:
+            return None
+        # `max` keeps the first of equal priorities, i.e. the earliest match.
+        return self.rules[max(found, key=lambda index: self.rules[index]["priority"])]
+
+    def match_all(self, text: str) -> List[Dict[str, Any]]:
+        """Every rule matching `text`, highest priority first."""
+        return sorted((self.rules[index] for index in self._matched(text)), key=lambda rule: -rule["priority"])
+
+    def classify(self, text: str) -> Dict[str, Any]:
+        """Returns {'name': str, 'confidence': float, 'action': optional_action}."""
+        rule = self.match(text)
+        if rule is None:
+            return dict(self.fallback)
+        intent = {"name": rule["intent"], "confidence": rule["confidence"]}
+        if rule.get("action"):
+            intent["action"] = rule["action"]
+        return intent
+
+
+def load_rule_engine(path: Optional[str] = None) -> IntentRuleEngine:
+    """Load the keyword table from JSON and compile it."""
+    path = Path(path or os.environ.get("NLP_INTENT_RULES") or DEFAULT_RULES_PATH)
+    with open(path, encoding="utf-8") as f:
+        table = json.load(f)
+
+    rules = []
+    for rule in table["rules"]:
+        rule = dict(rule)
+        phrases = list(rule.get("phrases", []))
+        if rule.get("phrases_from"):
+            import training_data
+
+            for name in rule["phrases_from"]:
+                phrases.extend(getattr(training_data, name))
+        rule["phrases"] = phrases
+        rules.append(rule)
+    return IntentRuleEngine(rules, table.get("fallback"))
+
+
+_default_engine: Optional[IntentRuleEngine] = None
+
+
+def default_engine() -> IntentRuleEngine:
+    """The process-wide engine, compiled on first use."""
+    global _default_engine
+    if _default_engine is None:
+        _default_engine = load_rule_engine()
+    return _default_engine
@@ -0,0 +1,89 @@
+"""Prometheus metrics for the NLP service, exposed by `GET /metrics`.
+
+Request counts/latency are recorded by an HTTP middleware in `app.py` and
+labelled by route template (e.g. `/parse/batch`), never by raw URL, so label
+cardinality stays bounded. Gauges that mirror live state (in-flight inference,
+executor queue depth, cache size) are evaluated lazily at scrape time.
+"""
+
+from typing import Callable
+import time
+
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+
+
+REQUESTS = Counter(
+    "nlp_requests_total", "HTTP requests handled, by endpoint and status code", ["endpoint", "method", "status"]
+)
+REQUEST_LATENCY = Histogram(
+    "nlp_request_duration_seconds",
+    "HTTP request latency by endpoint",
+    ["endpoint"],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+)
+INPUT_LENGTH = Histogram(
+    "nlp_input_length_chars",
+    "Length of texts sent for inference, in characters",
+    buckets=(8, 16, 32, 64, 128, 256, 512, 1024, 4096, 16384),
+)
+ERRORS = Counter("nlp_errors_total", "Failed requests and batch items, by endpoint and error type", ["endpoint", "type"])
+MODEL_LOAD_SECONDS = Histogram(
+    "nlp_model_load_seconds",
+    "Time to load and warm a pipeline, by trigger",
+    ["trigger"],
+    buckets=(0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0),
+)
+STARTUP_STAGE_SECONDS = Gauge(
+    "nlp_startup_stage_seconds", "Duration of each startup stage (backend start, load, warm-up)", ["stage"]
+)
+READY = Gauge("nlp_ready", "1 once the model is loaded and warmed up (see GET /ready)")
+MODEL_GENERATION = Gauge("nlp_model_generation", "Number of successful model (re)loads since start")
+INFERENCE_IN_FLIGHT = Gauge("nlp_inference_in_flight", "Inference calls currently running or queued in the backend")
+EXECUTOR_QUEUE_DEPTH = Gauge("nlp_executor_queue_depth", "Inference calls waiting for a free executor slot")
+CACHE_ENTRIES = Gauge("nlp_cache_entries", "Entries in the result cache")
+CACHE_HITS = Counter("nlp_cache_hits", "Result cache lookups that found an entry")
+CACHE_MISSES = Counter("nlp_cache_misses", "Result cache lookups that found nothing (absent or expired)")
+SINGLEFLIGHT_COLLAPSED = Counter(
+    "nlp_singleflight_collapsed", "Requests that joined an identical in-flight inference instead of starting one"
+)
+SINGLEFLIGHT_IN_FLIGHT = Gauge("nlp_singleflight_in_flight", "Distinct inferences currently shared by single-flight")
+CASCADE_ANSWERS = Counter(
+    "nlp_cascade_answers_total", "Entity/intent requests by the cascade tier that answered (rules, linear, model)",
+    ["tier"],
+)
+CATALOG_PRODUCTS = Gauge("nlp_catalog_products", "Products in the catalog index")
+CATALOG_REFRESHES = Counter("nlp_catalog_refreshes_total", "Catalog index refreshes by outcome", ["outcome"])
+CATALOG_REFRESH_SECONDS = Histogram("nlp_catalog_refresh_seconds", "Duration of catalog index refreshes")
+PIPELINE_RECYCLES = Counter(
+    "nlp_pipeline_recycles_total", "Pipelines replaced by a fresh copy, by the limit that triggered it (docs, strings, rss)",
+    ["reason"],
+)
+PIPELINE_DOCS = Counter("nlp_pipeline_docs_total", "Docs run through the pipeline, warm-up excluded")
+PIPELINE_RECYCLE_SECONDS = Histogram("nlp_pipeline_recycle_seconds", "Time to build the replacement pipeline")
+VOCAB_STRINGS = Gauge("nlp_vocab_strings", "Strings interned in the serving pipeline's StringStore")
+PROCESS_RSS_MB = Gauge("nlp_process_rss_mb", "Resident set size of the API process in MB")
+
+
+def bind_gauge(gauge: Gauge, fn: Callable[[], float]) -> None:
+    """Evaluate `fn` whenever the gauge is scraped."""
+    gauge.set_function(fn)
+
+
+def observe_request(endpoint: str, method: str, status: int, started: float) -> None:
+    REQUESTS.labels(endpoint, method, str(status)).inc()
+    REQUEST_LATENCY.labels(endpoint).observe(time.perf_counter() - started)
+
+
+def observe_input(text: str) -> None:
+    INPUT_LENGTH.observe(len(text))
+
+
+def observe_error(endpoint: str, error) -> None:
+    """Count an error; `error` is an exception or an error type name."""
+    kind = error if isinstance(error, str) else type(error).__name__
+    ERRORS.labels(endpoint, kind).inc()
+
+
+def render():
+    """Return `(body, content_type)` for the `/metrics` response."""
+    return generate_latest(), CONTENT_TYPE_LATEST
@@ -0,0 +1,93 @@
+"""Micro-batching dispatcher for single-text requests.
+
+Under load many `/query` calls arrive within a few milliseconds of each other.
+Instead of running `nlp(text)` for each one, `MicroBatcher` holds a request for
+at most `max_wait_us` microseconds (or until `max_batch_size` requests are
+waiting), runs the whole group with one `nlp.pipe` call and hands every caller
+its own result.
+
+Requests are grouped by their requested fields, since one `nlp.pipe` call can
+only disable one set of components.
+"""
+
+from typing import Any, Awaitable, Callable, Dict, List, Set, Tuple
+import asyncio
+import logging
+
+
+logger = logging.getLogger("nlp_service")
+
+RunBatch = Callable[[List[str], tuple, int], Awaitable[List[Dict[str, Any]]]]
+
+
+class MicroBatcher:
+    """Coalesce concurrent single-text requests into small `nlp.pipe` batches."""
+
+    def __init__(self, run_batch: RunBatch, max_batch_size: int = 32, max_wait_us: int = 2000):
+        self._run_batch = run_batch
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait_us = max(0, max_wait_us)
+        self._pending: Dict[tuple, List[Tuple[str, asyncio.Future]]] = {}
+        self._timers: Dict[tuple, asyncio.TimerHandle] = {}
+        # Dispatches in progress; the event loop only keeps weak references to tasks.
+        self._tasks: Set[asyncio.Task] = set()
+        self.batches = 0
+        self.items = 0
+        self.largest_batch = 0
+
+    async def submit(self, text: str, fields: tuple) -> Dict[str, Any]:
+        """Queue `text` and wait for its result item (`{"ok": ..., "result"/"error": ...}`)."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        queue = self._pending.setdefault(fields, [])
+        queue.append((text, future))
+
+        if len(queue) >= self.max_batch_size:
+            self._flush(fields)
+        elif fields not in self._timers:
+            self._timers[fields] = loop.call_later(self.max_wait_us / 1_000_000, self._flush, fields)
+
+        return await future
+
+    def _flush(self, fields: tuple) -> None:
+        timer = self._timers.pop(fields, None)
+        if timer is not None:
+            timer.cancel()
+        queue = self._pending.pop(fields, [])
+        # Drop callers that gave up while waiting; no point computing for them.
+        queue = [(text, fut) for text, fut in queue if not fut.done()]
+        if not queue:
+            return
+        for start in range(0, len(queue), self.max_batch_size):
+            chunk = queue[start:start + self.max_batch_size]
+            task = asyncio.ensure_future(self._dispatch(chunk, fields))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _dispatch(self, chunk: List[Tuple[str, asyncio.Future]], fields: tuple) -> None:
+        self.batches += 1
+        self.items += len(chunk)
+        self.largest_batch = max(self.largest_batch, len(chunk))
+        texts = [text for text, _ in chunk]
+        try:
+            items = await self._run_batch(texts, fields, len(texts))
+        except Exception as e:
+            for _, fut in chunk:
+                if not fut.done():
+                    fut.set_exception(e)
+            return
+        for (_, fut), item in zip(chunk, items):
+            if not fut.done():
+                fut.set_result(item)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": True,
+            "max_batch_size": self.max_batch_size,
+            "max_wait_us": self.max_wait_us,
+            "batches": self.batches,
+            "items": self.items,
+            "avg_batch_size": (self.items / self.batches) if self.batches else 0.0,
+            "largest_batch": self.largest_batch,
+            "waiting": sum(len(q) for q in self._pending.values()),
+        }
@@ -0,0 +1,52 @@
+"""Process-level helpers shared by the service and its scripts: memory readings from
+/proc and the math libraries' thread caps.
+
+Imports nothing heavy, so scripts can use `limit_blas_threads` before numpy / thinc
+are loaded (the caps only apply to libraries imported afterwards).
+"""
+
+from typing import Dict, Optional
+import os
+
+
+# Env vars that cap the math libraries' own thread pools.
+BLAS_THREAD_VARS = ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS", "BLIS_NUM_THREADS")
+
+
+def limit_blas_threads(threads: int) -> None:
+    """Cap OpenMP/BLAS threads unless the environment already sets a cap."""
+    for var in BLAS_THREAD_VARS:
+        os.environ.setdefault(var, str(threads))
+
+
+def rss_mb(pid: Optional[int] = None) -> Optional[float]:
+    """Resident set size of `pid` (default: this process) in MB (Linux; None elsewhere)."""
+    try:
+        with open(f"/proc/{pid or 'self'}/statm") as f:
+            resident_pages = int(f.read().split()[1])
+    except (OSError, IndexError, ValueError):
+        return None
+    return round(resident_pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024), 1)
+
+
+def smaps_rollup(pid: int) -> Optional[Dict[str, float]]:
+    """RSS, PSS and private (unshared) memory of `pid` in MB, from /proc (Linux only).
+
+    `private_mb` is what the process costs on its own; `pss_mb` charges shared pages
+    proportionally, so summing PSS over all processes gives their true total.
+    """
+    values: Dict[str, int] = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) >= 2 and parts[0].endswith(":") and parts[1].isdigit():
+                    values[parts[0][:-1]] = int(parts[1])
+    except OSError:
+        return None
+    return {
+        "rss_mb": round(values.get("Rss", 0) / 1024, 1),
+        "pss_mb": round(values.get("Pss", 0) / 1024, 1),
+        "shared_mb": round((values.get("Shared_Clean", 0) + values.get("Shared_Dirty", 0)) / 1024, 1),
+        "private_mb": round((values.get("Private_Clean", 0) + values.get("Private_Dirty", 0)) / 1024, 1),
+    }
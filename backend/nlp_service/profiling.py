@@ -0,0 +1,81 @@
+"""Opt-in per-stage profiling of the inference hot path.
+
+When enabled (`NLP_PROFILE=1` or `POST /debug/profile`), `run_pipeline` drives the
+pipeline by hand: the tokenizer, each component in `nlp.pipeline` and the
+result-building ("serialize") step are timed separately. Timings are kept in a
+rolling window per stage and summarized as p50/p95/p99 at `GET /debug/profile`.
+
+For batches a stage is timed once and the time is divided evenly across its docs,
+so the numbers are per-doc costs either way.
+
+`cprofile_snapshot` runs a sample workload under cProfile for a one-off,
+function-level view of the same loop.
+"""
+
+from collections import deque
+from typing import Any, Dict, Iterable, List, Tuple
+import cProfile
+import io
+import pstats
+import threading
+
+
+class StageProfiler:
+    """Rolling window of per-doc timings (seconds) per pipeline stage."""
+
+    def __init__(self, window: int = 2000):
+        self.window = window
+        self.enabled = False
+        self._stages: Dict[str, deque] = {}
+        self._lock = threading.Lock()
+
+    def record(self, timings: Iterable[Tuple[str, float, int]]) -> None:
+        """Record `(stage, seconds, n_docs)` tuples as produced by `run_pipeline`."""
+        with self._lock:
+            for stage, seconds, n_docs in timings:
+                window = self._stages.get(stage)
+                if window is None:
+                    window = self._stages[stage] = deque(maxlen=self.window)
+                per_doc = seconds / max(1, n_docs)
+                window.extend([per_doc] * min(n_docs, self.window))
+
+    def reset(self) -> None:
+        with self._lock:
+            self._stages.clear()
+
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            snapshot = {stage: sorted(values) for stage, values in self._stages.items()}
+        stages = {}
+        for stage, values in snapshot.items():
+            if not values:
+                continue
+            stages[stage] = {
+                "count": len(values),
+                "mean_ms": round(1000 * sum(values) / len(values), 4),
+                "p50_ms": round(1000 * percentile(values, 50), 4),
+                "p95_ms": round(1000 * percentile(values, 95), 4),
+                "p99_ms": round(1000 * percentile(values, 99), 4),
+            }
+        return {"enabled": self.enabled, "window": self.window, "stages": stages}
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, int(round(pct / 100 * len(sorted_values))) - 1))
+    return sorted_values[rank]
+
+
+def cprofile_snapshot(fn, *args, sort: str = "cumulative", limit: int = 40) -> str:
+    """Run `fn(*args)` under cProfile and return the formatted top-`limit` stats."""
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        fn(*args)
+    finally:
+        profiler.disable()
+    out = io.StringIO()
+    pstats.Stats(profiler, stream=out).strip_dirs().sort_stats(sort).print_stats(limit)
+    return out.getvalue()
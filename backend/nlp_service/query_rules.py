@@ -0,0 +1,136 @@
+"""Rule layer that answers pattern-shaped search queries without running the model.
+
+Much of the traffic is strict patterns like "laptops under 500" or "find used
+textbooks below 30". Their entities are fully determined by the keyword lists in
+`training_data.py` plus a small price grammar, so `QueryRules.match` recognizes
+them in one pass over the tokens and returns `/query`-shaped entities and a
+`search_product` intent.
+
+A text is short-circuited only when every token is accounted for: a keyword
+(PRODUCT / CATEGORY / CONDITION, longest match wins), a price (a number after a
+price word such as "under" / "between" / "$", or before "dollars"), or one of the
+search filler words ("find", "show", "me", "in", ...). Anything else - an unknown
+product name, a question word, a stray number - returns None and the caller runs
+the model as before. Adjacent product keywords form one span ("usb cable"), and a
+word that is both a product and a category ("books") is a CATEGORY only after
+"in" / "browse" or before "category" / "section", as in the training data.
+"""
+
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import re
+
+from training_data import CATEGORY_KEYWORDS, CONDITION_KEYWORDS, PRODUCT_KEYWORDS
+
+
+RULE_CONFIDENCE = 0.95
+
+_TOKEN_RE = re.compile(r"\d+(?:\.\d+)?|\w+|\$|[^\w\s]")
+_NUMBER_RE = re.compile(r"\d+(?:\.\d+)?$")
+
+# Words a number may follow to be a PRICE ("under 50", "less than 50", "budget of 50", "$50").
+PRICE_BEFORE = {"under", "below", "over", "above", "around", "about", "max", "maximum", "min", "minimum",
+                "than", "to", "most", "least", "of", "between", "for", "$"}
+# Words a number may precede to be a PRICE ("50 dollars").
+PRICE_AFTER = {"dollars", "dollar", "bucks", "usd"}
+SEARCH_WORDS = {
+    "find", "show", "me", "looking", "look", "search", "searching", "browse", "get", "i", "need", "want",
+    "a", "an", "the", "any", "some", "do", "you", "have", "in", "for", "cheap", "items", "item", "products",
+    "product", "category", "section", "condition", "and", "please", "less", "more", "cheaper", "budget",
+    "up", "at", "with", ",", ".", "!", "?",
+} | PRICE_BEFORE | PRICE_AFTER
+CATEGORY_BEFORE = {"in", "browse"}
+CATEGORY_AFTER = {"category", "section"}
+
+
+def tokenize(text: str) -> List[Tuple[str, int, int]]:
+    """Lowercase tokens with their character offsets."""
+    return [(m.group().lower(), m.start(), m.end()) for m in _TOKEN_RE.finditer(text)]
+
+
+class QueryRules:
+    """Keyword trie plus price grammar; counts how often it short-circuits."""
+
+    _END = ""
+
+    def __init__(self, products: Iterable[str] = PRODUCT_KEYWORDS, categories: Iterable[str] = CATEGORY_KEYWORDS,
+                 conditions: Iterable[str] = CONDITION_KEYWORDS):
+        self._trie: Dict[str, Any] = {}
+        for label, phrases in (("PRODUCT", products), ("CATEGORY", categories), ("CONDITION", conditions)):
+            for phrase in phrases:
+                node = self._trie
+                for token, _, _ in tokenize(phrase):
+                    node = node.setdefault(token, {})
+                node.setdefault(self._END, set()).add(label)
+        self.checked = 0
+        self.short_circuited = 0
+
+    def _longest_keyword(self, tokens, start: int) -> Tuple[int, Optional[set]]:
+        node, end, labels = self._trie, start, None
+        for i in range(start, len(tokens)):
+            node = node.get(tokens[i][0])
+            if node is None:
+                break
+            if self._END in node:
+                end, labels = i + 1, node[self._END]
+        return end, labels
+
+    def _entities(self, text: str) -> Optional[List[Dict[str, Any]]]:
+        tokens = tokenize(text)
+        words = [token for token, _, _ in tokens]
+        spans: List[List[Any]] = []  # [label, start_char, end_char]
+        i = 0
+        while i < len(tokens):
+            end, labels = self._longest_keyword(tokens, i)
+            if labels is not None:
+                label = next(iter(labels))
+                if len(labels) > 1:
+                    before = words[i - 1] if i else None
+                    after = words[end] if end < len(words) else None
+                    label = "CATEGORY" if before in CATEGORY_BEFORE or after in CATEGORY_AFTER else "PRODUCT"
+                start_char, end_char = tokens[i][1], tokens[end - 1][2]
+                previous = spans[-1] if spans else None
+                if (label == "PRODUCT" and previous and previous[0] == "PRODUCT"
+                        and text[previous[2]:start_char].isspace()):
+                    previous[2] = end_char
+                else:
+                    spans.append([label, start_char, end_char])
+                i = end
+                continue
+            word = words[i]
+            if _NUMBER_RE.match(word):
+                before = words[i - 1] if i else None
+                after = words[i + 1] if i + 1 < len(words) else None
+                after_price = before == "and" and spans and spans[-1][0] == "PRICE"
+                if before not in PRICE_BEFORE and after not in PRICE_AFTER and not after_price:
+                    return None
+                spans.append(["PRICE", tokens[i][1], tokens[i][2]])
+            elif word not in SEARCH_WORDS:
+                return None
+            i += 1
+        if not spans:
+            return None
+        return [
+            {"text": text[start:end], "label": label, "start_char": start, "end_char": end}
+            for label, start, end in spans
+        ]
+
+    def mentions_keyword(self, text: str) -> bool:
+        """True if `text` contains any PRODUCT / CATEGORY / CONDITION keyword."""
+        tokens = tokenize(text)
+        return any(self._longest_keyword(tokens, i)[1] is not None for i in range(len(tokens)))
+
+    def match(self, text: str) -> Optional[Dict[str, Any]]:
+        """`{"entities": [...], "intent": {...}}` if the rules fully cover `text`, else None."""
+        self.checked += 1
+        entities = self._entities(text)
+        if entities is None:
+            return None
+        self.short_circuited += 1
+        return {"entities": entities, "intent": {"name": "search_product", "confidence": RULE_CONFIDENCE}}
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "checked": self.checked,
+            "short_circuited": self.short_circuited,
+            "share": round(self.short_circuited / self.checked, 4) if self.checked else 0.0,
+        }
@@ -0,0 +1,125 @@
+"""Bounded-memory serving: recycle a pipeline before it grows without bound.
+
+spaCy interns every new token string in `nlp.vocab.strings` and never forgets it,
+so a long-running process that sees free-text queries grows its StringStore (and
+RSS) forever. `RecyclePolicy` counts the docs a pipeline has processed and, every
+`check_every` docs, looks at the StringStore size and the process RSS; once a limit
+is crossed the caller replaces the pipeline with a fresh copy:
+
+- `snapshot` (default): rebuilt from `nlp.to_bytes()` taken right after loading, so
+  a recycle never picks up a different model from disk behind `/reload`'s back
+- `disk`: loaded again from `SPACY_MODEL`
+
+Limits (0 = off): `NLP_RECYCLE_DOCS`, `NLP_RECYCLE_STRINGS`, `NLP_RECYCLE_RSS_MB`.
+`NLP_RECYCLE_MIN_INTERVAL_S` stops an RSS limit that a fresh pipeline cannot get
+under from recycling in a loop.
+"""
+
+from typing import Any, Dict, Optional, Tuple
+import os
+import time
+
+import spacy
+
+from procstats import rss_mb
+
+
+def memory_usage(nlp) -> Dict[str, Any]:
+    return {"strings": len(nlp.vocab.strings), "rss_mb": rss_mb()}
+
+
+def take_snapshot(nlp) -> Tuple[Any, bytes]:
+    return nlp.config, nlp.to_bytes()
+
+
+def restore_snapshot(snapshot: Tuple[Any, bytes]):
+    """A new pipeline (with a fresh vocab) from `take_snapshot`."""
+    config, data = snapshot
+    nlp = spacy.util.load_model_from_config(config, auto_fill=False, validate=False)
+    return nlp.from_bytes(data)
+
+
+class RecyclePolicy:
+    """Decides when a pipeline has grown enough to be replaced."""
+
+    def __init__(self, max_docs: int = 0, max_strings: int = 0, max_rss_mb: float = 0,
+                 check_every: int = 256, min_interval_s: float = 60.0, source: str = "snapshot"):
+        if source not in ("snapshot", "disk"):
+            raise ValueError(f"Unknown recycle source '{source}'; expected 'snapshot' or 'disk'")
+        self.max_docs = max_docs
+        self.max_strings = max_strings
+        self.max_rss_mb = max_rss_mb
+        self.check_every = max(1, check_every)
+        self.min_interval_s = min_interval_s
+        self.source = source
+        self.docs = 0
+        self._next_check = self.check_every
+        self.last_recycle_at = time.monotonic()
+        self.recycles = 0
+        self.last_event: Optional[Dict[str, Any]] = None
+
+    @classmethod
+    def from_env(cls) -> "RecyclePolicy":
+        return cls(
+            max_docs=int(os.environ.get("NLP_RECYCLE_DOCS", 0)),
+            max_strings=int(os.environ.get("NLP_RECYCLE_STRINGS", 0)),
+            max_rss_mb=float(os.environ.get("NLP_RECYCLE_RSS_MB", 0)),
+            check_every=int(os.environ.get("NLP_RECYCLE_CHECK_EVERY", 256)),
+            min_interval_s=float(os.environ.get("NLP_RECYCLE_MIN_INTERVAL_S", 60)),
+            source=os.environ.get("NLP_RECYCLE_SOURCE", "snapshot"),
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.max_docs or self.max_strings or self.max_rss_mb)
+
+    def note(self, docs: int) -> None:
+        self.docs += docs
+
+    def due(self, nlp) -> Optional[str]:
+        """The limit `nlp` has crossed ("docs", "strings" or "rss"), or None."""
+        if not self.enabled or nlp is None:
+            return None
+        if self.max_docs and self.docs >= self.max_docs:
+            return "docs"
+        if self.docs < self._next_check:
+            return None
+        self._next_check = self.docs + self.check_every
+        if self.max_strings and len(nlp.vocab.strings) >= self.max_strings:
+            return "strings"
+        if self.max_rss_mb and time.monotonic() - self.last_recycle_at >= self.min_interval_s:
+            rss = rss_mb()
+            if rss is not None and rss >= self.max_rss_mb:
+                return "rss"
+        return None
+
+    def recycled(self, reason: str, before: Dict[str, Any], after: Dict[str, Any], duration_s: float) -> Dict[str, Any]:
+        """Record a finished recycle and start counting again."""
+        self.recycles += 1
+        self.last_recycle_at = time.monotonic()
+        self.last_event = {
+            "reason": reason,
+            "docs": self.docs,
+            "before": before,
+            "after": after,
+            "duration_s": round(duration_s, 4),
+            "at": time.time(),
+        }
+        self.reset()
+        return self.last_event
+
+    def reset(self) -> None:
+        """Start counting for a freshly loaded pipeline."""
+        self.docs = 0
+        self._next_check = self.check_every
+
+    def stats(self, nlp=None) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "source": self.source,
+            "limits": {"docs": self.max_docs, "strings": self.max_strings, "rss_mb": self.max_rss_mb},
+            "docs_since_recycle": self.docs,
+            **(memory_usage(nlp) if nlp is not None else {}),
+            "recycles": self.recycles,
+            "last_recycle": self.last_event,
+        }
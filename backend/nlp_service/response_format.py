@@ -0,0 +1,77 @@
+"""Content negotiation for `/parse` and `/parse/batch` responses.
+
+Clients that do not opt in get the historical JSON shape through FastAPI as before.
+Opting in is two independent choices:
+
+- layout (`?layout=columnar`): tokens become parallel arrays per attribute
+  (`{"text": [...], "lemma": [...], ...}`), and `deps` drops the token text that
+  `tokens` already carries, keeping `{"head": [...], "dep": [...]}` in token order.
+- encoding (`Accept` header): `application/msgpack` (or `application/x-msgpack`) for
+  MessagePack, otherwise JSON. Opted-in responses are encoded directly (orjson when
+  installed) instead of going through FastAPI's `jsonable_encoder`.
+
+`msgpack` and `orjson` are optional; without them MessagePack is refused with 406
+and JSON falls back to the standard library.
+"""
+
+from typing import Any, Dict, Optional
+import json
+
+from fastapi import Response
+
+try:
+    import msgpack
+except ImportError:  # optional dependency
+    msgpack = None
+
+try:
+    import orjson
+except ImportError:  # optional dependency
+    orjson = None
+
+
+LAYOUTS = ("rows", "columnar")
+MSGPACK_TYPES = ("application/msgpack", "application/x-msgpack")
+TOKEN_ATTRS = ("text", "lemma", "pos", "tag", "dep", "is_stop")
+
+
+class NotAcceptable(ValueError):
+    """The client asked for an encoding this process cannot produce."""
+
+
+def to_columnar(result: Dict[str, Any]) -> Dict[str, Any]:
+    """Convert one row-oriented `/parse` result to the columnar layout."""
+    out = dict(result)
+    if "tokens" in result:
+        tokens = result["tokens"]
+        out["tokens"] = {attr: [token[attr] for token in tokens] for attr in TOKEN_ATTRS}
+    if "deps" in result:
+        deps = result["deps"]
+        out["deps"] = {"head": [d["head"] for d in deps], "dep": [d["dep"] for d in deps]}
+    return out
+
+
+def wants_msgpack(accept: Optional[str]) -> bool:
+    if not accept:
+        return False
+    return any(part.split(";")[0].strip().lower() in MSGPACK_TYPES for part in accept.split(","))
+
+
+def negotiated(accept: Optional[str], layout: Optional[str]) -> bool:
+    """True if the client opted in to a non-default layout or encoding."""
+    if layout is not None and layout not in LAYOUTS:
+        raise ValueError(f"Unknown layout '{layout}'; expected one of {list(LAYOUTS)}")
+    return layout == "columnar" or wants_msgpack(accept)
+
+
+def encode(body: Dict[str, Any], accept: Optional[str]) -> Response:
+    """Encode an already-shaped response body as MessagePack or JSON."""
+    if wants_msgpack(accept):
+        if msgpack is None:
+            raise NotAcceptable("MessagePack is not available (pip install msgpack)")
+        return Response(content=msgpack.packb(body, use_bin_type=True), media_type="application/msgpack")
+    if orjson is not None:
+        content = orjson.dumps(body)
+    else:
+        content = json.dumps(body, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+    return Response(content=content, media_type="application/json")
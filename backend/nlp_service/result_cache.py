@@ -0,0 +1,126 @@
+"""Bounded LRU + TTL result cache for the NLP service.
+
+The Node client keeps its own small per-process cache, but every Node replica
+misses separately. This cache lives next to the model so identical queries are
+computed once per service process no matter which replica sent them.
+
+Keys combine the endpoint kind, the normalized text and a fingerprint of the
+loaded model, so results computed by an older model can never be served after
+a reload even if a request races with `clear()`.
+"""
+
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Hashable, Optional
+import hashlib
+import json
+import threading
+import time
+import unicodedata
+
+
+def normalize_text(text: str) -> str:
+    """Normalization for offset-bearing results (`/parse`, `/query`).
+
+    Only applies Unicode NFC, so decomposed and composed input share one entry. The
+    model runs on the NFC text and character offsets index that text, not the
+    caller's: `/query` echoes it back as `text` so offsets can be sliced from it.
+    """
+    return unicodedata.normalize("NFC", text)
+
+
+def normalize_for_classify(text: str) -> str:
+    """Aggressive normalization for intent-only results (`/classify`).
+
+    Case and whitespace do not change the intent, so "Find  Laptops" and
+    "find laptops" share one cache entry.
+    """
+    return " ".join(unicodedata.normalize("NFC", text).lower().split())
+
+
+def model_fingerprint(nlp, model_path: str) -> str:
+    """Return a short, stable identifier for the loaded pipeline.
+
+    Combines the pipeline meta and component names with the size and mtime of the
+    files in the model directory (when `model_path` is a directory), so retraining
+    into the same `models/best` folder yields a new fingerprint.
+    """
+    h = hashlib.sha1()
+    h.update(model_path.encode("utf-8"))
+    h.update(json.dumps(getattr(nlp, "meta", {}), sort_keys=True, default=str).encode("utf-8"))
+    h.update(",".join(getattr(nlp, "pipe_names", [])).encode("utf-8"))
+
+    path = Path(model_path)
+    if path.is_dir():
+        for f in sorted(p for p in path.rglob("*") if p.is_file()):
+            stat = f.stat()
+            h.update(f"{f.relative_to(path)}:{stat.st_size}:{stat.st_mtime_ns}".encode("utf-8"))
+
+    return h.hexdigest()[:12]
+
+
+class ResultCache:
+    """Thread-safe LRU cache with a per-entry time-to-live.
+
+    `max_size <= 0` disables the cache (every lookup is a miss, nothing is stored).
+    Values are shared between callers and must be treated as read-only.
+    """
+
+    def __init__(self, max_size: int = 10000, ttl_seconds: float = 300.0):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_size > 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, expire_at = entry
+            if time.monotonic() > expire_at:
+                del self._data[key]
+                self.misses += 1
+                return None
+            # Mark as most recently used
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl_seconds)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "size": len(self._data),
+                "max_size": self.max_size,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": (self.hits / lookups) if lookups else 0.0,
+            }
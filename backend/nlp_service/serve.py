@@ -0,0 +1,280 @@
+"""
+Pre-fork production server for the NLP service.
+
+The master process imports `app.py`, loads and warms the spaCy pipeline once, freezes
+the garbage collector's view of it (`gc.freeze`, so collections in the workers do not
+touch - and copy - the shared pages) and then forks N uvicorn workers that accept on
+one shared listening socket. The model weights, vocab and string store stay shared
+copy-on-write between all workers instead of being loaded N times.
+
+Signals (to the master):
+    SIGHUP   reload the model in the master, then replace workers one at a time
+             (a new worker is started and ready before the old one is stopped)
+    SIGUSR1  log per-worker memory (RSS / PSS / private) from /proc/<pid>/smaps_rollup
+    SIGTERM, SIGINT  graceful shutdown (workers get `--graceful-timeout` seconds)
+
+Usage:
+    python serve.py --workers 4 --threads 2 --port 5001
+
+Settings also come from the environment: NLP_SERVE_WORKERS, NLP_SERVE_THREADS,
+NLP_SERVE_BLAS_THREADS, NLP_GRACEFUL_TIMEOUT_S, HOST, PORT. Only the thread inference
+backend makes sense here (each worker already is a process). Prometheus metrics are
+per worker.
+
+Linux/macOS only (uses `os.fork`).
+"""
+
+from typing import Any, Dict, List, Optional
+import argparse
+import gc
+import logging
+import os
+import select
+import signal
+import socket
+import sys
+import time
+
+from procstats import limit_blas_threads, smaps_rollup
+
+
+logger = logging.getLogger("nlp_service")
+
+
+class PreforkServer:
+    """Master process: owns the socket and the preloaded app, supervises the workers."""
+
+    def __init__(self, host: str, port: int, workers: int, threads: Optional[int], graceful_timeout: float,
+                 ready_timeout: float = 120.0):
+        self.host = host
+        self.port = port
+        self.size = max(1, workers)
+        self.threads = threads
+        self.graceful_timeout = graceful_timeout
+        self.ready_timeout = ready_timeout
+        self.workers: Dict[int, int] = {}  # pid -> slot index
+        self.socket: Optional[socket.socket] = None
+        self._stopping = False
+        self._pending: List[int] = []
+
+    # -- master ----------------------------------------------------------------
+
+    def preload(self) -> None:
+        import app
+
+        started = time.perf_counter()
+        app.preload_model()
+        # Everything allocated so far is long-lived: move it out of the collector's
+        # generations so worker GCs never write to (and un-share) those pages.
+        gc.collect()
+        gc.freeze()
+        logger.info(
+            f"Master preloaded '{app.SPACY_MODEL}' (fingerprint {app.MODEL_FINGERPRINT}) in "
+            f"{time.perf_counter() - started:.2f}s; master memory {smaps_rollup(os.getpid())}"
+        )
+
+    def bind(self) -> None:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind((self.host, self.port))
+        sock.listen(2048)
+        sock.set_inheritable(True)
+        self.socket = sock
+
+    def run(self) -> int:
+        self.preload()
+        self.bind()
+        for signum in (signal.SIGTERM, signal.SIGINT, signal.SIGHUP, signal.SIGUSR1, signal.SIGCHLD):
+            signal.signal(signum, self._on_signal)
+
+        for slot in range(self.size):
+            self.spawn(slot)
+        logger.info(f"Serving on http://{self.host}:{self.port} with {self.size} worker(s)")
+        self.report_memory()
+
+        while not self._stopping:
+            if self._pending:
+                self._handle(self._pending.pop(0))
+            else:
+                time.sleep(0.2)
+        self.stop()
+        return 0
+
+    def _on_signal(self, signum, frame) -> None:
+        # Keep the handler trivial; the main loop does the work.
+        if signum in (signal.SIGTERM, signal.SIGINT):
+            self._stopping = True
+        else:
+            self._pending.append(signum)
+
+    def _handle(self, signum: int) -> None:
+        if signum == signal.SIGCHLD:
+            self.reap()
+        elif signum == signal.SIGHUP:
+            self.rolling_restart()
+        elif signum == signal.SIGUSR1:
+            self.report_memory()
+
+    def spawn(self, slot: int) -> int:
+        """Fork one worker and wait until it has started serving."""
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_fd)
+            code = 1
+            try:
+                self._worker_main(write_fd)
+                code = 0
+            except BaseException:
+                logger.exception("Worker crashed")
+            finally:
+                os._exit(code)
+
+        os.close(write_fd)
+        self.workers[pid] = slot
+        ready, _, _ = select.select([read_fd], [], [], self.ready_timeout)
+        if ready and os.read(read_fd, 1):
+            logger.info(f"Worker {slot} (pid {pid}) ready")
+        else:
+            logger.error(f"Worker {slot} (pid {pid}) did not become ready within {self.ready_timeout}s")
+        os.close(read_fd)
+        return pid
+
+    def reap(self) -> None:
+        """Collect exited workers and replace the ones that died unexpectedly."""
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            slot = self.workers.pop(pid, None)
+            if slot is not None and not self._stopping:
+                logger.error(f"Worker {slot} (pid {pid}) exited with status {status}; restarting it")
+                self.spawn(slot)
+
+    def rolling_restart(self) -> None:
+        """Reload the model in the master, then swap workers one by one."""
+        import app
+
+        gc.unfreeze()
+        try:
+            self.preload()
+        except Exception:
+            logger.exception("Reload failed; keeping the current workers")
+            gc.freeze()
+            return
+        for old_pid, slot in list(self.workers.items()):
+            self.spawn(slot)
+            self.workers.pop(old_pid, None)
+            self._terminate([old_pid])
+        logger.info(f"Rolling restart done (fingerprint {app.MODEL_FINGERPRINT})")
+        self.report_memory()
+
+    def _terminate(self, pids: List[int]) -> None:
+        for pid in pids:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        deadline = time.monotonic() + self.graceful_timeout
+        remaining = set(pids)
+        while remaining and time.monotonic() < deadline:
+            for pid in list(remaining):
+                try:
+                    done, _ = os.waitpid(pid, os.WNOHANG)
+                except ChildProcessError:
+                    done = pid
+                if done:
+                    remaining.discard(pid)
+            time.sleep(0.05)
+        for pid in remaining:
+            logger.warning(f"Worker pid {pid} did not exit within {self.graceful_timeout}s; killing it")
+            try:
+                os.kill(pid, signal.SIGKILL)
+                os.waitpid(pid, 0)
+            except (ProcessLookupError, ChildProcessError):
+                pass
+
+    def stop(self) -> None:
+        logger.info("Shutting down workers...")
+        pids = list(self.workers)
+        self.workers.clear()
+        self._terminate(pids)
+        if self.socket is not None:
+            self.socket.close()
+
+    def memory_report(self) -> Dict[str, Any]:
+        per_worker = []
+        for pid, slot in sorted(self.workers.items(), key=lambda kv: kv[1]):
+            per_worker.append({"slot": slot, "pid": pid, **(smaps_rollup(pid) or {})})
+        private = [w["private_mb"] for w in per_worker if "private_mb" in w]
+        return {
+            "master": smaps_rollup(os.getpid()),
+            "workers": per_worker,
+            # What one more worker costs: its unshared pages.
+            "per_extra_worker_mb": round(sum(private) / len(private), 1) if private else None,
+            "total_pss_mb": round(
+                sum(w.get("pss_mb", 0) for w in per_worker) + ((smaps_rollup(os.getpid()) or {}).get("pss_mb", 0)), 1
+            ),
+        }
+
+    def report_memory(self) -> None:
+        report = self.memory_report()
+        logger.info(
+            f"Memory: master {report['master']}, per extra worker ~{report['per_extra_worker_mb']} MB private, "
+            f"total PSS {report['total_pss_mb']} MB"
+        )
+        for worker in report["workers"]:
+            logger.info(f"  worker {worker['slot']} (pid {worker['pid']}): {worker}")
+
+    # -- worker ----------------------------------------------------------------
+
+    def _worker_main(self, ready_fd: int) -> None:
+        import uvicorn
+
+        for signum in (signal.SIGHUP, signal.SIGUSR1, signal.SIGCHLD):
+            signal.signal(signum, signal.SIG_DFL)
+        import app
+
+        # The master never submits work to the inference thread pool, so each worker
+        # starts with an empty pool of its own (sized by NLP_WORKERS, see `main`).
+        class WorkerServer(uvicorn.Server):
+            async def startup(self, sockets=None):
+                await super().startup(sockets=sockets)
+                if self.started:
+                    os.write(ready_fd, b"1")
+                    os.close(ready_fd)
+
+        config = uvicorn.Config(app.app, log_level=os.environ.get("LOG_LEVEL", "info").lower(), lifespan="on")
+        WorkerServer(config).run(sockets=[self.socket])
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Pre-fork server for the Campus Shop NLP service")
+    parser.add_argument("--host", default=os.environ.get("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.environ.get("PORT", 5001)))
+    parser.add_argument("--workers", type=int, default=int(os.environ.get("NLP_SERVE_WORKERS", os.cpu_count() or 1)))
+    parser.add_argument("--threads", type=int,
+                        default=int(os.environ["NLP_SERVE_THREADS"]) if os.environ.get("NLP_SERVE_THREADS") else None,
+                        help="inference threads per worker (default: executor default)")
+    parser.add_argument("--blas-threads", type=int, default=int(os.environ.get("NLP_SERVE_BLAS_THREADS", 1)),
+                        help="OpenMP/BLAS threads per worker")
+    parser.add_argument("--graceful-timeout", type=float, default=float(os.environ.get("NLP_GRACEFUL_TIMEOUT_S", 30)))
+    args = parser.parse_args(argv)
+
+    if os.environ.get("NLP_BACKEND", "thread") != "thread":
+        parser.error("serve.py forks its own worker processes; use NLP_BACKEND=thread")
+    # Before numpy / thinc are imported, i.e. before `app` is.
+    limit_blas_threads(args.blas_threads)
+    if args.threads:
+        os.environ["NLP_WORKERS"] = str(args.threads)
+
+    logging.basicConfig(level=os.environ.get("LOG_LEVEL", "INFO"))
+    server = PreforkServer(args.host, args.port, args.workers, args.threads, args.graceful_timeout)
+    return server.run()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
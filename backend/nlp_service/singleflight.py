@@ -0,0 +1,57 @@
+"""Single-flight deduplication of identical concurrent requests.
+
+When many users send the same text at the same moment, every copy would become its
+own inference call before the first result reaches the result cache. `SingleFlight`
+keys in-flight work (normalized text, fields, model fingerprint): the first caller
+starts a task, later callers with the same key await that same task. The key is
+dropped as soon as the task finishes, so later requests go through the result
+cache as usual.
+
+The shared task is awaited through `asyncio.shield`: a caller that disconnects or
+times out is cancelled on its own, without cancelling the work the other callers
+are waiting for.
+"""
+
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+import asyncio
+
+
+class SingleFlight:
+    """Share one in-flight task between concurrent callers with the same key."""
+
+    def __init__(self, on_collapse: Optional[Callable[[], None]] = None):
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        self.leaders = 0
+        self.collapsed = 0
+        # Called whenever a caller joins an in-flight task (e.g. a Prometheus counter's `inc`).
+        self.on_collapse = on_collapse
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Return `await fn()`, or the result of an identical call already in flight."""
+        task = self._inflight.get(key)
+        if task is not None:
+            self.collapsed += 1
+            if self.on_collapse is not None:
+                self.on_collapse()
+        else:
+            self.leaders += 1
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+        return await asyncio.shield(task)
+
+    def _forget(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # Mark the exception as retrieved even if every caller has gone away.
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.leaders + self.collapsed
+        return {
+            "in_flight": len(self._inflight),
+            "leaders": self.leaders,
+            "collapsed": self.collapsed,
+            "collapsed_share": round(self.collapsed / total, 4) if total else 0.0,
+        }
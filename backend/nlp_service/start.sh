@@ -26,5 +26,11 @@ else
     export SPACY_MODEL=en_core_web_sm
 fi
 
+# NLP_PREFORK=1: production mode, model loaded once and shared by forked workers (serve.py)
+if [ "$NLP_PREFORK" = "1" ]; then
+    echo "Starting NLP service (pre-fork, ${NLP_SERVE_WORKERS:-auto} workers) on http://127.0.0.1:5001..."
+    exec python serve.py --host 127.0.0.1 --port 5001
+fi
+
 echo "Starting NLP service on http://127.0.0.1:5001..."
 uvicorn app:app --host 127.0.0.1 --port 5001 --reload
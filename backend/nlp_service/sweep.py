@@ -0,0 +1,319 @@
+"""
+Hyperparameter sweep for the Campus Shop Assistant NLP model.
+
+Trains one candidate per combination of network width, dropout, epochs and
+batch-size schedule with `train_model.train_joint`, several at a time in a process
+pool. Every candidate is scored on:
+
+- accuracy: held-out intent accuracy and NER F1 (combined score as in training)
+- latency: per-doc time of `nlp.pipe` over the held-out texts, plus p95 of single-text calls
+  (measured one candidate at a time after training, so parallel jobs do not skew it)
+- size: bytes on disk
+
+and the report marks the Pareto front (no other candidate is at least as good on all
+three and strictly better on one). `--promote` copies a candidate to `models/best`,
+which `start.sh` and `app.py` prefer, and builds its linear intent model.
+
+Usage:
+    python sweep.py --width 64,96 --dropout 0.0,0.2 --epochs 10,20 --jobs 4
+    python sweep.py --batch 4:32:1.001,8:64:1.01 --promote best
+    python sweep.py --report-only sweeps/latest/report.json --promote cand-03
+    python sweep.py --report-only sweeps/latest/report.json --promote best --gate intent_macro_f1=0.8
+"""
+
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import random
+import shutil
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from procstats import limit_blas_threads
+
+
+def parse_batch_schedule(value: str) -> tuple:
+    """'4:32:1.001' -> (4.0, 32.0, 1.001)."""
+    start, stop, compound = (float(part) for part in value.split(":"))
+    return start, stop, compound
+
+
+def build_grid(widths, dropouts, epochs, batches) -> List[Dict[str, Any]]:
+    return [
+        {"id": f"cand-{i:02d}", "width": w, "dropout": d, "epochs": e, "batch": list(b)}
+        for i, (w, d, e, b) in enumerate(itertools.product(widths, dropouts, epochs, batches))
+    ]
+
+
+def dir_size(path: Path) -> int:
+    return sum(f.stat().st_size for f in Path(path).rglob("*") if f.is_file())
+
+
+def measure_latency(nlp, texts: List[str], repeats: int = 5) -> Dict[str, float]:
+    """Per-doc `nlp.pipe` time and single-call p50/p95, in milliseconds."""
+    from profiling import percentile
+
+    for _ in nlp.pipe(texts):  # warm-up
+        pass
+    started = time.perf_counter()
+    for _ in range(repeats):
+        for _ in nlp.pipe(texts, batch_size=64):
+            pass
+    pipe_ms = 1000 * (time.perf_counter() - started) / (repeats * len(texts))
+
+    singles = []
+    for text in texts:
+        started = time.perf_counter()
+        nlp(text)
+        singles.append(time.perf_counter() - started)
+    singles.sort()
+    return {
+        "pipe_ms_per_doc": round(pipe_ms, 4),
+        "single_p50_ms": round(1000 * percentile(singles, 50), 4),
+        "single_p95_ms": round(1000 * percentile(singles, 95), 4),
+    }
+
+
+def train_candidate(candidate: Dict[str, Any], out_dir: str, holdout: float, patience: int,
+                    seed: int, cache_dir: Optional[str] = None) -> Dict[str, Any]:
+    """Train, save and score one candidate. Runs in a pool worker."""
+    import contextlib
+    import io
+
+    import spacy
+    from train_model import build_pipeline, held_out_score, holdout_split, train_joint
+    from training_data import NER_TRAINING_DATA, TEXTCAT_TRAINING_DATA
+    from spacy.training import Example
+
+    random.seed(seed)
+    spacy.util.fix_random_seed(seed)
+    started = time.perf_counter()
+    nlp = build_pipeline(width=candidate["width"])
+    log = io.StringIO()
+    with contextlib.redirect_stdout(log):
+        train_joint(
+            nlp, NER_TRAINING_DATA, TEXTCAT_TRAINING_DATA,
+            max_epochs=candidate["epochs"], patience=patience, holdout=holdout,
+            dropout=candidate["dropout"], batch_schedule=tuple(candidate["batch"]),
+            cache_dir=cache_dir,
+        )
+    train_s = time.perf_counter() - started
+
+    path = Path(out_dir) / candidate["id"]
+    nlp.to_disk(path)
+
+    _, ner_dev = holdout_split(NER_TRAINING_DATA, holdout)
+    _, cat_dev = holdout_split(TEXTCAT_TRAINING_DATA, holdout)
+    ner_examples = [Example.from_dict(nlp.make_doc(t), a) for t, a in ner_dev]
+    correct = 0
+    for doc, (_, ann) in zip(nlp.pipe(t for t, _ in cat_dev), cat_dev):
+        gold = max(ann["cats"].items(), key=lambda kv: kv[1])[0]
+        correct += bool(doc.cats) and max(doc.cats.items(), key=lambda kv: kv[1])[0] == gold
+    intent_accuracy = correct / len(cat_dev) if cat_dev else 0.0
+    ents_f = held_out_score(nlp, ner_examples, "ents_f")
+
+    return {
+        **candidate,
+        "path": str(path),
+        "train_s": round(train_s, 2),
+        "best_epoch": nlp.meta.get("training", {}).get("best_epoch"),
+        "intent_accuracy": round(intent_accuracy, 4),
+        "ents_f": round(ents_f, 4),
+        "score": round((intent_accuracy + ents_f) / 2, 4),
+        "size_bytes": dir_size(path),
+    }
+
+
+def held_out_texts(holdout: float) -> List[str]:
+    from train_model import holdout_split
+    from training_data import NER_TRAINING_DATA, TEXTCAT_TRAINING_DATA
+
+    _, ner_dev = holdout_split(NER_TRAINING_DATA, holdout)
+    _, cat_dev = holdout_split(TEXTCAT_TRAINING_DATA, holdout)
+    return [t for t, _ in cat_dev] + [t for t, _ in ner_dev]
+
+
+def pareto_front(results: List[Dict[str, Any]]) -> List[str]:
+    """Ids of candidates not dominated on (score up, pipe latency down, size down)."""
+    def key(r):
+        return (-r["score"], r["latency"]["pipe_ms_per_doc"], r["size_bytes"])
+
+    front = []
+    for r in results:
+        kr = key(r)
+        dominated = any(
+            all(a <= b for a, b in zip(key(o), kr)) and key(o) != kr for o in results if o is not r
+        )
+        if not dominated:
+            front.append(r["id"])
+    return front
+
+
+def choose(results: List[Dict[str, Any]], front: List[str]) -> Dict[str, Any]:
+    """Best-scoring Pareto candidate; ties go to the faster one."""
+    on_front = [r for r in results if r["id"] in front]
+    return min(on_front, key=lambda r: (-r["score"], r["latency"]["pipe_ms_per_doc"], r["size_bytes"]))
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    print("\n" + "=" * 60)
+    print("Sweep results (* = Pareto front)")
+    print("=" * 60)
+    print(f"  {'id':<8} {'width':>5} {'drop':>5} {'ep':>4} {'batch':<16} {'intent':>6} {'ents_f':>6} "
+          f"{'score':>6} {'ms/doc':>7} {'p95':>7} {'MB':>6}")
+    for r in sorted(report["results"], key=lambda r: -r["score"]):
+        mark = "*" if r["id"] in report["pareto_front"] else " "
+        batch = ":".join(f"{v:g}" for v in r["batch"])
+        print(
+            f"{mark} {r['id']:<8} {r['width'] or '-':>5} {r['dropout']:>5} {r['epochs']:>4} {batch:<16} "
+            f"{r['intent_accuracy']:>6.3f} {r['ents_f']:>6.3f} {r['score']:>6.3f} "
+            f"{r['latency']['pipe_ms_per_doc']:>7.3f} {r['latency']['single_p95_ms']:>7.3f} "
+            f"{r['size_bytes'] / 1e6:>6.2f}"
+        )
+
+
+def promote(report: Dict[str, Any], which: str, target: Path, holdout: float,
+            gates: Optional[Dict[str, float]] = None) -> Optional[Path]:
+    """Copy the chosen candidate to `target` (swapped in by rename) and distill its intent model.
+
+    With `gates`, the staged copy is first checked with `evaluate.py` on the holdout and
+    not promoted if any gate fails.
+    """
+    from train_model import distill_intent_model
+
+    if which == "best":
+        chosen = choose(report["results"], report["pareto_front"])
+    else:
+        matches = [r for r in report["results"] if r["id"] == which]
+        if not matches:
+            raise SystemExit(f"Unknown candidate '{which}'")
+        chosen = matches[0]
+
+    staging = target.with_name(target.name + ".staging")
+    if staging.exists():
+        shutil.rmtree(staging)
+    shutil.copytree(chosen["path"], staging)
+    (staging / "sweep.json").write_text(json.dumps({"candidate": chosen, "sweep": report["meta"]}, indent=2))
+    distill_intent_model(staging, holdout)
+
+    if gates:
+        from evaluate import check_gates, evaluate, load_eval_data, print_report
+
+        evaluation = evaluate(staging, load_eval_data(holdout))
+        evaluation["gating"] = check_gates(evaluation, gates)
+        print_report(evaluation)
+        if not evaluation["gating"]["passed"]:
+            print(f"\n❌ {chosen['id']} failed its gates; {target} left unchanged (staged in {staging})")
+            return None
+
+    if target.exists():
+        previous = target.with_name(target.name + ".previous")
+        if previous.exists():
+            shutil.rmtree(previous)
+        target.rename(previous)
+    staging.rename(target)
+    print(f"\n✅ Promoted {chosen['id']} to {target} (POST /reload to pick it up)")
+    return target
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Hyperparameter sweep for the Campus Shop NLP model")
+    parser.add_argument("--width", default="64,96", help="tok2vec widths (0 = spaCy default)")
+    parser.add_argument("--dropout", default="0.0,0.2")
+    parser.add_argument("--epochs", default="20", help="maximum epochs per candidate")
+    parser.add_argument("--batch", default="4:32:1.001", help="compounding batch schedules start:stop:compound")
+    parser.add_argument("--patience", type=int, default=5)
+    parser.add_argument("--holdout", type=float, default=0.2)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--jobs", type=int, default=max(1, (os.cpu_count() or 2) // 2))
+    parser.add_argument("--out", default="sweeps/latest", help="where candidates and report.json go")
+    parser.add_argument("--report-only", help="skip training; load this report.json")
+    parser.add_argument("--promote", help="'best' or a candidate id to copy to --target")
+    parser.add_argument("--target", default="models/best")
+    parser.add_argument("--gate", action="append", default=[],
+                        help="with --promote: metric=threshold that the candidate must meet (see evaluate.py)")
+    parser.add_argument("--cache-dir", default=".cache/training", help="DocBin training-data cache ('' to disable)")
+    args = parser.parse_args(argv)
+
+    if args.report_only:
+        report = json.loads(Path(args.report_only).read_text())
+    else:
+        grid = build_grid(
+            [int(w) or None for w in args.width.split(",")],
+            [float(d) for d in args.dropout.split(",")],
+            [int(e) for e in args.epochs.split(",")],
+            [parse_batch_schedule(b) for b in args.batch.split(",")],
+        )
+        out_dir = Path(args.out)
+        out_dir.mkdir(parents=True, exist_ok=True)
+        # One BLAS/OpenMP thread per candidate so `--jobs` candidates do not oversubscribe.
+        limit_blas_threads(1)
+
+        import spacy
+
+        if args.cache_dir:
+            # Compile once up front; the workers then only read the cache.
+            from docbin_cache import open_cache
+            from training_data import NER_TRAINING_DATA
+
+            open_cache(spacy.blank("en"), NER_TRAINING_DATA, "ner", args.cache_dir)
+
+        print(f"Training {len(grid)} candidate(s) with {args.jobs} job(s)...")
+        started = time.perf_counter()
+        results = []
+        with ProcessPoolExecutor(max_workers=args.jobs, mp_context=multiprocessing.get_context("spawn")) as pool:
+            futures = {
+                pool.submit(
+                    train_candidate, c, str(out_dir), args.holdout, args.patience, args.seed, args.cache_dir or None
+                ): c
+                for c in grid
+            }
+            for future in as_completed(futures):
+                candidate = futures[future]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    print(f"  ❌ {candidate['id']} failed: {e}")
+                    continue
+                results.append(result)
+                print(f"  {result['id']}: score {result['score']:.3f}, trained in {result['train_s']}s")
+
+        results.sort(key=lambda r: r["id"])
+        texts = held_out_texts(args.holdout)
+        print("Measuring latency...")
+        for result in results:
+            result["latency"] = measure_latency(spacy.load(result["path"]), texts)
+        report = {
+            "meta": {
+                "timestamp": time.time(),
+                "duration_s": round(time.perf_counter() - started, 1),
+                "holdout": args.holdout,
+                "patience": args.patience,
+                "seed": args.seed,
+            },
+            "results": results,
+            "pareto_front": pareto_front(results),
+        }
+        (out_dir / "report.json").write_text(json.dumps(report, indent=2) + "\n")
+        print(f"Report written to {out_dir / 'report.json'}")
+
+    if not report["results"]:
+        print("No candidates trained")
+        return 1
+    print_report(report)
+    if args.promote:
+        from evaluate import parse_gate  # imports spaCy: not before the thread limits above
+
+        gates = dict(parse_gate(gate) for gate in args.gate)
+        if promote(report, args.promote, Path(args.target), args.holdout, gates) is None:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
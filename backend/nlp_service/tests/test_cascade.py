@@ -0,0 +1,117 @@
+import pytest
+
+from cascade import Cascade, tune_thresholds
+from query_rules import QueryRules
+
+BOTH = ("entities", "intent")
+
+
+class FixedIntentModel:
+    def __init__(self, name, confidence):
+        self.intent = {"name": name, "confidence": confidence}
+
+    def classify(self, text):
+        return dict(self.intent)
+
+
+@pytest.fixture
+def cascade():
+    return Cascade({"rules": {"greeting": 0.9, "ask_price": 0.7}, "linear": {"help": 0.8}}, QueryRules())
+
+
+def test_covered_query_exits_at_the_rule_layer(cascade):
+    result = cascade.answer("laptops under 500", BOTH)
+    assert [ent["label"] for ent in result["entities"]] == ["PRODUCT", "PRICE"]
+    assert result["intent"]["name"] == "search_product"
+    assert result["cascade"] == {"tier": "rules", "confidence": 0.95}
+
+
+def test_entityless_intent_exits_without_entities(cascade):
+    result = cascade.answer("hi there", BOTH)
+    assert result == {"entities": [], "intent": {"name": "greeting", "confidence": 0.9},
+                      "cascade": {"tier": "rules", "confidence": 0.9}}
+
+
+@pytest.mark.parametrize("text", ["hi, I need a used calculator", "hello, where is my order"])
+def test_mixed_greetings_go_to_the_model(cascade, text):
+    assert cascade.answer(text, BOTH) is None
+
+
+def test_intent_with_entities_exits_only_when_entities_are_not_requested(cascade):
+    assert cascade.answer("how much is it", BOTH) is None
+    assert cascade.answer("how much is it", ("intent",))["cascade"]["tier"] == "rules"
+
+
+def test_linear_tier_needs_its_own_threshold(cascade):
+    assert cascade.answer("can you assist", BOTH, FixedIntentModel("help", 0.85))["cascade"]["tier"] == "linear"
+    assert cascade.answer("can you assist", BOTH, FixedIntentModel("help", 0.75)) is None
+    assert cascade.answer("can you assist", BOTH, FixedIntentModel("greeting", 0.99)) is None
+
+
+def test_no_thresholds_only_covered_queries_exit():
+    cascade = Cascade({}, QueryRules())
+    assert cascade.answer("hi there", BOTH) is None
+    assert cascade.answer("laptops under 500", BOTH) is not None
+
+
+def test_fields_the_cheap_tiers_cannot_produce_go_to_the_model(cascade):
+    assert cascade.answer("laptops under 500", ("tokens", "entities")) is None
+
+
+def test_stats_count_answers_per_tier(cascade):
+    cascade.answer("hi there", BOTH)
+    cascade.record_model({"intent": {"name": "ask_price", "confidence": 0.6}})
+    assert cascade.stats()["answered"] == {"rules": 1, "linear": 0, "model": 1}
+    assert cascade.stats()["early_exit_share"] == 0.5
+
+
+def record(gold, rules=None, linear=None, has_entities=False, model_correct=True):
+    return {"gold": gold, "has_entities": has_entities, "model_correct": model_correct,
+            "rules": rules and {"name": rules[0], "confidence": rules[1]},
+            "linear": linear and {"name": linear[0], "confidence": linear[1]}}
+
+
+def test_tune_picks_lowest_confidence_without_extra_errors():
+    records = [
+        record("greeting", rules=("greeting", 0.9)),
+        record("greeting", rules=("greeting", 0.8)),
+        record("help", rules=("greeting", 0.6)),  # wrong intent below 0.8
+    ]
+    assert tune_thresholds(records)["rules"] == {"greeting": 0.8}
+
+
+def test_tune_accepts_exit_errors_the_model_also_makes():
+    records = [
+        record("greeting", rules=("greeting", 0.9)),
+        record("help", rules=("greeting", 0.6), model_correct=False),
+    ]
+    assert tune_thresholds(records)["rules"] == {"greeting": 0.6}
+
+
+def test_tune_entityless_exit_needs_known_absent_entities():
+    records = [
+        record("greeting", rules=("greeting", 0.9)),
+        record("greeting", rules=("greeting", 0.7), has_entities=None),
+        record("greeting", rules=("greeting", 0.5), has_entities=True),
+    ]
+    assert tune_thresholds(records)["rules"] == {"greeting": 0.9}
+
+
+def test_tune_never_splits_equal_confidences():
+    records = [
+        record("ask_price", rules=("ask_price", 0.7)),
+        record("search_product", rules=("ask_price", 0.7)),
+    ]
+    assert tune_thresholds(records)["rules"] == {}
+
+
+def test_tune_later_tiers_only_see_what_earlier_tiers_left():
+    records = [
+        record("greeting", rules=("greeting", 0.9), linear=("greeting", 0.45)),
+        record("help", rules=("greeting", 0.5), linear=("help", 0.95)),
+        record("help", linear=("greeting", 0.4)),
+    ]
+    thresholds = tune_thresholds(records)
+    assert thresholds["rules"] == {"greeting": 0.9}
+    # The first record already exited at the rules tier, so it cannot vouch for a linear greeting at 0.45.
+    assert thresholds["linear"] == {"help": 0.95}
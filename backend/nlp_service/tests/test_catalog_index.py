@@ -0,0 +1,125 @@
+import json
+
+import pytest
+
+from catalog_index import CATEGORY_BOOST, CatalogIndex, FixtureSource, stem
+
+T0 = "2025-01-01T00:00:00+00:00"
+T1 = "2025-01-02T00:00:00+00:00"
+
+
+def product(product_id, name, category_id, description="", status="active", updated_at=T0):
+    return {"product_id": product_id, "name": name, "description": description, "category_id": category_id,
+            "price": 10.0, "status": status, "updated_at": updated_at}
+
+
+@pytest.fixture
+def catalog(tmp_path):
+    data = {
+        "categories": [
+            {"category_id": 1, "name": "Electronics", "parent_category_id": None},
+            {"category_id": 2, "name": "Laptops", "parent_category_id": 1},
+            {"category_id": 3, "name": "Books", "parent_category_id": None},
+        ],
+        "products": [
+            product(1, "Gaming Laptop", 2, "Fast and light"),
+            product(2, "Laptop Sleeve", 1, "Fits 15 inch laptops"),
+            product(3, "Used Textbook", 3, "Calculus, some highlighting"),
+            product(4, "Old Laptop", 2, status="sold"),
+        ],
+    }
+    path = tmp_path / "catalog.json"
+
+    def write():
+        path.write_text(json.dumps(data))
+
+    write()
+    return data, write, CatalogIndex(FixtureSource(path))
+
+
+def ids(results):
+    return [result["product_id"] for result in results]
+
+
+def test_stem():
+    assert [stem(w) for w in ("textbooks", "accessories", "boxes", "pens", "glass")] == [
+        "textbook", "accessory", "box", "pen", "glass"]
+
+
+def test_search_ranks_name_and_category_matches_first(catalog):
+    _, _, index = catalog
+    index.refresh()
+    # Product 1 has "laptop" in its name and its category, product 2 in its name and description;
+    # the sold product 4 is not indexed.
+    assert ids(index.search([{"text": "laptops", "label": "PRODUCT"}])) == [1, 2]
+
+
+def test_category_alone_returns_products_of_it_and_its_subcategories(catalog):
+    _, _, index = catalog
+    index.refresh()
+    results = index.search([{"text": "electronics", "label": "CATEGORY"}])
+    assert sorted(ids(results)) == [1, 2]
+    assert {result["score"] for result in results} == {CATEGORY_BOOST}
+
+
+def test_category_boosts_matching_products(catalog):
+    _, _, index = catalog
+    index.refresh()
+    plain = index.search([{"text": "laptop", "label": "PRODUCT"}])
+    boosted = index.search([{"text": "laptop", "label": "PRODUCT"}, {"text": "electronics", "label": "CATEGORY"}])
+    assert ids(boosted) == ids(plain)
+    assert [b["score"] - p["score"] for b, p in zip(boosted, plain)] == pytest.approx([CATEGORY_BOOST] * 2)
+
+
+def test_search_unknown_terms_and_limit(catalog):
+    _, _, index = catalog
+    assert index.search([{"text": "laptop", "label": "PRODUCT"}]) == []  # not refreshed yet
+    index.refresh()
+    assert index.search([{"text": "bicycle", "label": "PRODUCT"}]) == []
+    assert len(index.search([{"text": "laptop", "label": "PRODUCT"}], limit=1)) == 1
+
+
+def test_refresh_skips_rows_already_applied_at_the_watermark(catalog):
+    _, _, index = catalog
+    first = index.refresh()
+    assert (first["full"], first["changed"], first["indexed"]) == (True, 4, 3)
+    assert index.watermark.isoformat() == T0
+
+    again = index.refresh()
+    assert (again["full"], again["changed"], again["indexed"], again["removed"]) == (False, 0, 0, 0)
+
+
+def test_refresh_applies_updates_inserts_and_deletes(catalog):
+    data, write, index = catalog
+    index.refresh()
+    data["products"] = [p for p in data["products"] if p["product_id"] != 2]
+    data["products"][0] = product(1, "Gaming Laptop", 2, status="sold", updated_at=T1)
+    data["products"].append(product(5, "Laptop Stand", 1, updated_at=T1))
+    write()
+
+    stats = index.refresh()
+    assert (stats["full"], stats["changed"], stats["indexed"], stats["removed"]) == (False, 2, 1, 1)
+    assert index.watermark.isoformat() == T1
+    assert ids(index.search([{"text": "laptop", "label": "PRODUCT"}])) == [5]
+
+
+def test_refresh_picks_up_late_rows_with_the_watermark_timestamp(catalog):
+    data, write, index = catalog
+    index.refresh()
+    # Committed after the refresh but stamped with the same updated_at as the watermark.
+    data["products"].append(product(6, "Laptop Charger", 1, updated_at=T0))
+    write()
+
+    stats = index.refresh()
+    assert (stats["changed"], stats["indexed"]) == (1, 1)
+    assert 6 in ids(index.search([{"text": "charger", "label": "PRODUCT"}]))
+
+
+def test_category_rename_triggers_a_full_refresh(catalog):
+    data, write, index = catalog
+    index.refresh()
+    data["categories"][2]["name"] = "Textbooks"
+    write()
+
+    assert index.refresh()["full"] is True
+    assert ids(index.search([{"text": "textbooks", "label": "CATEGORY"}])) == [3]
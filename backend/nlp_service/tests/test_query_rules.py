@@ -0,0 +1,55 @@
+import pytest
+
+from query_rules import RULE_CONFIDENCE, QueryRules
+
+
+@pytest.fixture
+def rules():
+    return QueryRules(products=["laptop", "laptops", "textbooks", "books", "usb", "cable"],
+                      categories=["books", "electronics"], conditions=["used"])
+
+
+def spans(match):
+    return [(ent["label"], ent["text"], ent["start_char"], ent["end_char"]) for ent in match["entities"]]
+
+
+def test_keywords_and_price_short_circuit(rules):
+    match = rules.match("find used textbooks below 30")
+    assert spans(match) == [("CONDITION", "used", 5, 9), ("PRODUCT", "textbooks", 10, 19), ("PRICE", "30", 26, 28)]
+    assert match["intent"] == {"name": "search_product", "confidence": RULE_CONFIDENCE}
+
+
+def test_price_range_and_trailing_currency(rules):
+    match = rules.match("laptops between 200 and 500 dollars")
+    assert spans(match) == [("PRODUCT", "laptops", 0, 7), ("PRICE", "200", 16, 19), ("PRICE", "500", 24, 27)]
+
+
+def test_adjacent_products_form_one_span(rules):
+    assert spans(rules.match("find usb cable")) == [("PRODUCT", "usb cable", 5, 14)]
+
+
+def test_product_or_category_depends_on_context(rules):
+    assert spans(rules.match("find books")) == [("PRODUCT", "books", 5, 10)]
+    assert spans(rules.match("browse books")) == [("CATEGORY", "books", 7, 12)]
+    assert spans(rules.match("show me the books section")) == [("CATEGORY", "books", 12, 17)]
+
+
+@pytest.mark.parametrize("text", [
+    "what is the price of a laptop",  # question words: not a pure search
+    "find a gizmo",                   # unknown product
+    "find laptop 3",                  # number that is not a price
+    "show me",                        # nothing to search for
+])
+def test_uncovered_texts_fall_through_to_the_model(rules, text):
+    assert rules.match(text) is None
+
+
+def test_stats_count_short_circuits(rules):
+    rules.match("find laptops")
+    rules.match("find a gizmo")
+    assert rules.stats() == {"checked": 2, "short_circuited": 1, "share": 0.5}
+
+
+def test_mentions_keyword(rules):
+    assert rules.mentions_keyword("hi, do you sell used stuff")
+    assert not rules.mentions_keyword("hello there")
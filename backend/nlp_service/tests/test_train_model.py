@@ -0,0 +1,62 @@
+import pytest
+import spacy
+from spacy.training import Example
+
+from intent_linear import accuracy
+from train_model import add_labels, holdout_split, train_joint, update_joint
+from training_data import NER_TRAINING_DATA, TEXTCAT_TRAINING_DATA, make_cats
+
+EPOCHS = 5
+
+
+def textcat_scores(nlp):
+    """Held-out accuracy and mean probability of the gold intent."""
+    _, held_out = holdout_split(TEXTCAT_TRAINING_DATA)
+    predicted = accuracy(lambda text: max(nlp(text).cats.items(), key=lambda kv: kv[1])[0], held_out)
+    gold = [nlp(text).cats[max(annotations["cats"], key=annotations["cats"].get)] for text, annotations in held_out]
+    return predicted, sum(gold) / len(gold)
+
+
+def train(ner_data, **kwargs):
+    spacy.util.fix_random_seed(0)
+    return train_joint(spacy.blank("en"), ner_data, TEXTCAT_TRAINING_DATA,
+                       max_epochs=EPOCHS, patience=EPOCHS, **kwargs)
+
+
+@pytest.fixture(scope="module")
+def textcat_only():
+    return textcat_scores(train([]))
+
+
+def test_update_joint_routes_examples_by_annotation():
+    nlp = spacy.blank("en")
+    ner_row = ("find a used laptop", {"entities": [(7, 11, "CONDITION"), (12, 18, "PRODUCT")]})
+    cat_row = ("hello there", {"cats": make_cats("greeting")})
+    add_labels(nlp, [ner_row], [cat_row])
+    ner_example = Example.from_dict(nlp.make_doc(ner_row[0]), ner_row[1])
+    cat_example = Example.from_dict(nlp.make_doc(cat_row[0]), cat_row[1])
+    optimizer = nlp.initialize(lambda: [ner_example, cat_example])
+
+    losses = {}
+    update_joint(nlp, [ner_example], optimizer, losses=losses)
+    assert set(losses) == {"ner"}
+
+    losses = {}
+    update_joint(nlp, [cat_example], optimizer, losses=losses)
+    assert set(losses) == {"textcat"}
+
+
+def test_joint_training_keeps_textcat_accuracy(textcat_only):
+    # NER rows have no cats; if they reached the textcat they would pull every intent
+    # towards 0 and the gold intent's probability down with it.
+    accuracy_alone, gold_alone = textcat_only
+    accuracy_joint, gold_joint = textcat_scores(train(NER_TRAINING_DATA))
+    assert accuracy_joint >= accuracy_alone - 0.04
+    assert gold_joint >= gold_alone - 0.05
+
+
+def test_augmented_joint_training_keeps_textcat_accuracy(textcat_only):
+    accuracy_alone, gold_alone = textcat_only
+    accuracy_joint, gold_joint = textcat_scores(train(NER_TRAINING_DATA, augment=200))
+    assert accuracy_joint >= accuracy_alone - 0.04
+    assert gold_joint >= gold_alone - 0.05
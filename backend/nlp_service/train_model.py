@@ -5,18 +5,38 @@ This script trains a spaCy model with:
 1. Text Classification (textcat) for intent detection
 2. Named Entity Recognition (NER) for entity extraction
 
+By default both components are trained together (`--mode joint`): one loop, one
+optimizer, and early stopping on the combined held-out score (NER F1 and textcat
+macro score). `--mode sequential` keeps the original two fixed 50-iteration stages.
+
+It also distills the intent data into a compact linear classifier (hashed word and
+character n-grams, NumPy weights, see `intent_linear.py`) saved next to the spaCy
+model, and compares its accuracy with the textcat on a held-out split.
+
 Usage:
     python train_model.py
+    python train_model.py --mode joint --max-epochs 50 --patience 5
+    python train_model.py --mode sequential
+    python train_model.py --no-cache       # build NER examples from the raw tuples
+    python train_model.py --augment 20000  # add synthetic NER examples (augment.py)
+    python train_model.py --distill-only   # rebuild only the linear intent model
 
 Output:
     models/campus_shop_nlp - Trained model directory
+    models/campus_shop_nlp/intent_linear.npz - Linear intent model
 """
 
 import spacy
 from spacy.training import Example
 from spacy.util import minibatch, compounding
+import argparse
 import random
+import time
+import zlib
 from pathlib import Path
+from augment import mix, synthetic_stream
+from docbin_cache import open_cache
+from intent_linear import MODEL_FILENAME, accuracy, train_linear_intent
 from training_data import TEXTCAT_TRAINING_DATA, NER_TRAINING_DATA
 
 
@@ -130,13 +150,162 @@ def train_ner(nlp, train_data, n_iter=30):
     return nlp
 
 
+def build_pipeline(width=None):
+    """Blank English pipeline with `ner` and `textcat`, optionally overriding the
+    embedding/encoding width of both components' tok2vec layers."""
+    nlp = spacy.blank("en")
+    ner_config, textcat_config = {}, {}
+    if width:
+        ner_config = {"model": {"tok2vec": {"width": width}}}
+        textcat_config = {"model": {"tok2vec": {"embed": {"width": width}, "encode": {"width": width}}}}
+    nlp.add_pipe("ner", config=ner_config)
+    nlp.add_pipe("textcat", config=textcat_config, last=True)
+    return nlp
+
+
+def add_labels(nlp, ner_data, textcat_data):
+    """Add `ner` and `textcat` (if missing) with every label found in the data."""
+    ner = nlp.get_pipe("ner") if "ner" in nlp.pipe_names else nlp.add_pipe("ner")
+    textcat = nlp.get_pipe("textcat") if "textcat" in nlp.pipe_names else nlp.add_pipe("textcat", last=True)
+    for _, annotations in ner_data:
+        for _, _, label in annotations.get("entities", []):
+            ner.add_label(label)
+    for _, annotations in textcat_data:
+        for label in annotations["cats"]:
+            textcat.add_label(label)
+    return ner, textcat
+
+
+def held_out_score(nlp, examples, key):
+    """One score from `nlp.evaluate` (0.0 when there are no examples or no score)."""
+    if not examples:
+        return 0.0
+    return nlp.evaluate(examples).get(key) or 0.0
+
+
+def make_examples(nlp, data, kind, cache=None):
+    """`Example`s for `data`, streamed from a `DocBinCache` when one is given."""
+    if cache is not None:
+        return list(cache.stream(nlp, data))
+    if kind == "ner":
+        return create_training_examples_ner(nlp, data)
+    return create_training_examples_textcat(nlp, data)
+
+
+def update_joint(nlp, batch, sgd, drop=0.0, losses=None):
+    """Update each component only on the examples annotated for it, with one optimizer.
+
+    Examples without `cats` (NER rows) skip the textcat: it is exclusive, so it cannot
+    treat missing cats as missing and would learn all-zero targets from them. Examples
+    with `cats` (textcat rows) skip the NER.
+    """
+    ner_batch = [eg for eg in batch if not eg.reference.cats]
+    cat_batch = [eg for eg in batch if eg.reference.cats]
+    if ner_batch:
+        nlp.update(ner_batch, sgd=sgd, drop=drop, losses=losses, exclude=["textcat"])
+    if cat_batch:
+        nlp.update(cat_batch, sgd=sgd, drop=drop, losses=losses, exclude=["ner"])
+
+
+def train_joint(nlp, ner_data, textcat_data, max_epochs=50, patience=5, holdout=0.2,
+                dropout=0.0, batch_schedule=(4.0, 32.0, 1.001), cache_dir=None,
+                augment=0, augment_source=None):
+    """Train NER and textcat together with one optimizer and early stopping.
+
+    Each dataset is split with `holdout_split`; the two training sides are shuffled
+    together into one stream of examples, and every minibatch updates the NER on its
+    NER examples and the textcat on its textcat examples (see `update_joint`).
+    After every epoch the held-out sides are scored, and training stops once the
+    combined score (mean of NER F1 and textcat macro score) has not improved for
+    `patience` epochs. The best epoch's weights are restored.
+
+    `dropout` is passed to `nlp.update`; `batch_schedule` is the `(start, stop,
+    compound)` of the `compounding` batch-size schedule. With `cache_dir`, NER examples
+    come from the DocBin cache (see `docbin_cache.py`), which skips re-aligning entity
+    offsets to tokens; only new or changed examples are encoded. Textcat examples have
+    no token-level annotation, and decoding them is slower than building them directly.
+
+    With `augment`, every epoch also trains on that many synthetic NER examples from
+    `augment.py` (generated, or cycled from the `augment_source` JSONL export),
+    interleaved at random with the real ones. They are built into `Example`s one
+    minibatch at a time and never held in memory together. Their `cats` are dropped
+    (the templates only cover three of the five intents and would skew the textcat),
+    so they only ever update the NER.
+    """
+    print("\n=== Joint Training (NER + Text Classifier) ===")
+    add_labels(nlp, ner_data, textcat_data)
+
+    ner_cache = None
+    if cache_dir:
+        started = time.perf_counter()
+        ner_cache = open_cache(nlp, ner_data, "ner", cache_dir)
+        print(f"  Training data cache ready in {time.perf_counter() - started:.2f}s")
+
+    ner_train, ner_dev = holdout_split(ner_data, holdout)
+    cat_train, cat_dev = holdout_split(textcat_data, holdout)
+    started = time.perf_counter()
+    train_examples = (
+        make_examples(nlp, ner_train, "ner", ner_cache) + make_examples(nlp, cat_train, "textcat")
+    )
+    ner_dev_examples = make_examples(nlp, ner_dev, "ner", ner_cache)
+    cat_dev_examples = make_examples(nlp, cat_dev, "textcat")
+    print(f"  Examples built in {time.perf_counter() - started:.2f}s")
+    print(f"Examples: {len(train_examples)} train, {len(ner_dev_examples) + len(cat_dev_examples)} held out")
+
+    synthetic = None
+    if augment:
+        synthetic = (
+            Example.from_dict(nlp.make_doc(text), {"entities": annotations["entities"]})
+            for text, annotations in synthetic_stream(augment_source)
+        )
+        print(f"  + {augment} synthetic NER examples per epoch ({augment_source or 'generated'})")
+
+    optimizer = nlp.initialize(lambda: train_examples)
+
+    best_score, best_epoch, best_weights = -1.0, 0, None
+    training_started = time.perf_counter()
+    for epoch in range(1, max_epochs + 1):
+        random.shuffle(train_examples)
+        stream = mix(train_examples, synthetic, augment, seed=epoch) if synthetic else train_examples
+        losses = {}
+        seen = 0
+        started = time.perf_counter()
+        for batch in minibatch(stream, size=compounding(*batch_schedule)):
+            update_joint(nlp, batch, optimizer, drop=dropout, losses=losses)
+            seen += len(batch)
+        elapsed = time.perf_counter() - started
+
+        ents_f = held_out_score(nlp, ner_dev_examples, "ents_f")
+        cats_score = held_out_score(nlp, cat_dev_examples, "cats_score")
+        score = (ents_f + cats_score) / 2
+        improved = score > best_score
+        if improved:
+            best_score, best_epoch = score, epoch
+            best_weights = nlp.to_bytes()
+        print(
+            f"  Epoch {epoch:>3}  loss ner {losses.get('ner', 0):8.3f}  textcat {losses.get('textcat', 0):6.3f}  "
+            f"ents_f {ents_f:.3f}  cats {cats_score:.3f}  score {score:.3f}{' *' if improved else ''}  "
+            f"{elapsed:.2f}s  {seen / elapsed:.0f} ex/s"
+        )
+        if epoch - best_epoch >= patience:
+            print(f"  Early stop: no improvement for {patience} epochs")
+            break
+
+    if best_weights is not None:
+        nlp.from_bytes(best_weights)
+    print(
+        f"Best epoch {best_epoch} (score {best_score:.3f}), "
+        f"total {time.perf_counter() - training_started:.1f}s"
+    )
+    nlp.meta.setdefault("training", {}).update(best_epoch=best_epoch, best_score=round(best_score, 4))
+    return nlp
+
+
 def evaluate_model(nlp, test_texts):
     """Quick evaluation of the trained model."""
     print("\n=== Model Evaluation ===")
     
-    for text in test_texts:
-        doc = nlp(text)
-        
+    for text, doc in zip(test_texts, nlp.pipe(test_texts)):
         print(f"\nText: '{text}'")
         
         # Intent (textcat)
@@ -151,7 +320,88 @@ def evaluate_model(nlp, test_texts):
             print("  Entities: None")
 
 
+def holdout_split(data, fraction=0.2):
+    """Split `data` into (train, held_out) by a stable hash of each text.
+
+    The same text always lands on the same side, so the split does not change between
+    runs or when examples are appended.
+    """
+    train, held_out = [], []
+    for example in data:
+        bucket = zlib.crc32(example[0].encode("utf-8")) % 1000
+        (held_out if bucket < fraction * 1000 else train).append(example)
+    return train, held_out
+
+
+def distill_intent_model(model_dir, holdout=0.2):
+    """Train the linear intent model and save it next to the spaCy model in `model_dir`.
+
+    The linear model is fit on the training side of `holdout_split`; both it and the
+    textcat of the saved spaCy model are scored on the held-out side. (With
+    `--mode sequential` the textcat saw all examples, so its number is optimistic.)
+    """
+    print("\n=== Distilling Linear Intent Model ===")
+    train, held_out = holdout_split(TEXTCAT_TRAINING_DATA, holdout)
+    print(f"Examples: {len(train)} train, {len(held_out)} held out")
+
+    started = time.perf_counter()
+    linear = train_linear_intent(train)
+    print(f"  Trained in {time.perf_counter() - started:.2f}s")
+
+    linear_accuracy = accuracy(lambda text: linear.predict(text)[0], held_out)
+
+    textcat_accuracy = None
+    nlp = spacy.load(model_dir)
+    if "textcat" in nlp.pipe_names:
+        def textcat_predict(text):
+            cats = nlp(text).cats
+            return max(cats.items(), key=lambda kv: kv[1])[0]
+        textcat_accuracy = accuracy(textcat_predict, held_out)
+
+    texts = [text for text, _ in held_out] or ["hello"]
+    started = time.perf_counter()
+    for text in texts:
+        linear.predict(text)
+    linear_ms = 1000 * (time.perf_counter() - started) / len(texts)
+
+    linear.meta.update(
+        holdout_fraction=holdout,
+        holdout_examples=len(held_out),
+        holdout_accuracy=round(linear_accuracy, 4),
+        textcat_holdout_accuracy=round(textcat_accuracy, 4) if textcat_accuracy is not None else None,
+    )
+    path = linear.save(Path(model_dir) / MODEL_FILENAME)
+
+    print(f"  Linear held-out accuracy:  {linear_accuracy:.3f} ({linear_ms:.3f} ms/text)")
+    if textcat_accuracy is not None:
+        print(f"  Textcat held-out accuracy: {textcat_accuracy:.3f}")
+    print(f"✅ Linear intent model saved to: {path}")
+    return linear
+
+
 def main():
+    parser = argparse.ArgumentParser(description="Train the Campus Shop Assistant NLP model")
+    parser.add_argument("--output", default="models/campus_shop_nlp", help="model directory")
+    parser.add_argument("--distill-only", action="store_true",
+                        help="only (re)build the linear intent model for an existing spaCy model")
+    parser.add_argument("--holdout", type=float, default=0.2, help="held-out fraction for evaluation")
+    parser.add_argument("--mode", choices=["joint", "sequential"], default="joint",
+                        help="train NER and textcat together (default) or one after the other")
+    parser.add_argument("--max-epochs", type=int, default=50, help="joint mode: upper bound on epochs")
+    parser.add_argument("--patience", type=int, default=5, help="joint mode: epochs without improvement")
+    parser.add_argument("--cache-dir", default=".cache/training",
+                        help="joint mode: DocBin cache of the training data")
+    parser.add_argument("--no-cache", action="store_true", help="joint mode: build examples from the raw tuples")
+    parser.add_argument("--augment", type=int, default=0,
+                        help="joint mode: synthetic NER examples per epoch (see augment.py)")
+    parser.add_argument("--augment-source", help="JSONL written by augment.py (default: generate on the fly)")
+    args = parser.parse_args()
+    output_dir = Path(args.output)
+
+    if args.distill_only:
+        distill_intent_model(output_dir, args.holdout)
+        return
+
     print("=" * 60)
     print("Campus Shop Assistant - NLP Model Training")
     print("=" * 60)
@@ -159,17 +409,27 @@ def main():
     # Create a blank English model
     nlp = spacy.blank("en")
     
-    # Train NER first
-    nlp = train_ner(nlp, NER_TRAINING_DATA, n_iter=50)
-    
-    # Train textcat
-    nlp = train_textcat(nlp, TEXTCAT_TRAINING_DATA, n_iter=50)
+    if args.mode == "joint":
+        nlp = train_joint(
+            nlp, NER_TRAINING_DATA, TEXTCAT_TRAINING_DATA,
+            max_epochs=args.max_epochs, patience=args.patience, holdout=args.holdout,
+            cache_dir=None if args.no_cache else args.cache_dir,
+            augment=args.augment, augment_source=args.augment_source,
+        )
+    else:
+        # Train NER first
+        nlp = train_ner(nlp, NER_TRAINING_DATA, n_iter=50)
+
+        # Train textcat
+        nlp = train_textcat(nlp, TEXTCAT_TRAINING_DATA, n_iter=50)
     
     # Save model
-    output_dir = Path("models/campus_shop_nlp")
     output_dir.mkdir(parents=True, exist_ok=True)
     nlp.to_disk(output_dir)
     print(f"\n✅ Model saved to: {output_dir}")
+
+    # Compact linear intent model for /classify
+    distill_intent_model(output_dir, args.holdout)
     
     # Test the model with 5 core intents
     test_texts = [
@@ -214,9 +474,13 @@ def main():
     
     nlp_loaded = spacy.load(output_dir)
     evaluate_model(nlp_loaded, test_texts)
+
+    # Held-out metrics and speed (see evaluate.py)
+    from evaluate import evaluate, load_eval_data, print_report
+    print_report(evaluate(output_dir, load_eval_data(args.holdout)))
     
     print("\n✅ Training complete!")
-    print(f"\nTo use this model, set: SPACY_MODEL=models/campus_shop_nlp")
+    print(f"\nTo use this model, set: SPACY_MODEL={output_dir}")
 
 
 if __name__ == "__main__":
@@ -557,3 +557,7 @@ PRODUCT_KEYWORDS = [
 CATEGORY_KEYWORDS = [
     "electronics", "books", "clothing", "stationery", "accessories"
 ]
+
+CONDITION_KEYWORDS = [
+    "new", "used", "brand new", "second hand", "like new", "barely used", "refurbished"
+]